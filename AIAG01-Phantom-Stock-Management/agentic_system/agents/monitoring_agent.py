@@ -3,7 +3,8 @@ Monitoring Agent - Autonomous data validation agent
 """
 from agents.base_agent import BaseAgent
 from models.messages import AgentMessage, MonitoringOutput
-from datetime import datetime
+from analytics.anomalies import rollup_columns, rollup_records
+from analytics.quality import check_inventory_columns, check_inventory_records
 
 class MonitoringAgent(BaseAgent):
     """
@@ -17,54 +18,43 @@ class MonitoringAgent(BaseAgent):
     def __init__(self):
         super().__init__("MonitoringAgent", "Data Quality Validator")
         self.input_data = []
+        self.input_columns = None  # the same batch as InventoryColumns, when the source has them
+        self.input_fields = None
         self.processed_data = []
         self.anomalies = []
+        self.anomaly_count = 0
     
     def receive(self, message: AgentMessage) -> None:
         """Receive raw inventory data"""
-        self.input_data = message.data.get("inventory_data", [])
-        print(f"[{self.name}] Received {len(self.input_data)} records")
+        self.input_columns = message.data.get("inventory_columns")
+        self.input_fields = message.data.get("fields")
+        self.input_data = message.data.get("inventory_data")
+        if self.input_data is None and self.input_columns is None:
+            self.input_data = []
+        count = len(self.input_columns) if self.input_columns is not None else len(self.input_data)
+        print(f"[{self.name}] Received {count} records")
     
     def process(self) -> None:
         """Validate data quality and detect anomalies"""
         print(f"[{self.name}] Processing data quality checks...")
         
-        self.processed_data = []
-        self.anomalies = []
+        # Rules 1-3 (negative stock, invalid production rate, missing fields)
+        # are evaluated over the whole batch, with one run timestamp
+        if self.input_columns is not None:
+            quality = check_inventory_columns(self.input_columns)
+            rollup = rollup_columns(quality, self.input_columns)
+        else:
+            quality = check_inventory_records(self.input_data)
+            rollup = rollup_records(quality, self.input_data)
+        
+        # Flag anomalies, rolled up per (supplier, issue)
+        self.anomalies = [{**anomaly, "severity": "high"} for anomaly in rollup]
+        self.anomaly_count = quality.anomaly_count
         
-        for record in self.input_data:
-            quality_issues = []
-            
-            # Rule 1: Check for negative stock
-            if record.get("reported_stock", 0) < 0:
-                quality_issues.append("negative_stock")
-            
-            # Rule 2: Check for invalid production rate
-            if record.get("production_rate", 0) <= 0:
-                quality_issues.append("invalid_production_rate")
-            
-            # Rule 3: Check for missing critical fields
-            required_fields = ["supplier_id", "reported_stock", "production_rate"]
-            if not all(field in record for field in required_fields):
-                quality_issues.append("missing_fields")
-            
-            # Flag anomalies
-            if quality_issues:
-                self.anomalies.append({
-                    "supplier_id": record.get("supplier_id"),
-                    "issues": quality_issues,
-                    "severity": "high"
-                })
-            
-            # Add to processed data
-            self.processed_data.append({
-                **record,
-                "monitored_at": datetime.now().isoformat(),
-                "data_quality": "poor" if quality_issues else "good",
-                "quality_issues": quality_issues
-            })
+        # Processed data is a view over the input and the flag column (dicts are built when serialized)
+        self.processed_data = quality.lazy(self.input_data, self.input_columns, self.input_fields)
         
-        print(f"[{self.name}] Found {len(self.anomalies)} anomalies")
+        print(f"[{self.name}] Found {self.anomaly_count} anomalies across {len(self.anomalies)} supplier issues")
     
     def send(self) -> MonitoringOutput:
         """Send validated data to next agent"""
@@ -73,8 +63,8 @@ class MonitoringAgent(BaseAgent):
             anomalies=self.anomalies,
             stats={
                 "total_records": len(self.processed_data),
-                "anomaly_count": len(self.anomalies),
-                "quality_rate": (len(self.processed_data) - len(self.anomalies)) / len(self.processed_data) if self.processed_data else 0
+                "anomaly_count": self.anomaly_count,
+                "quality_rate": (len(self.processed_data) - self.anomaly_count) / len(self.processed_data) if self.processed_data else 0
             }
         )
         print(f"[{self.name}] Sending output to ValidationAgent")
@@ -1,7 +1,11 @@
 """
 Risk Agent - Autonomous phantom stock detection agent
 """
+from typing import Dict, Optional
 from agents.base_agent import BaseAgent
+from analytics.risk_index import RiskIndex
+from analytics.risk import CRITICAL_THRESHOLD, WARNING_THRESHOLD, score_risks, simulated_history, validation_arrays
+from analytics.rules import parse_dates
 from models.messages import AgentMessage, RiskOutput
 
 class RiskAgent(BaseAgent):
@@ -19,8 +23,9 @@ class RiskAgent(BaseAgent):
         self.risk_assessments = []
         self.critical_risks = []
         self.warnings = []
-        self.critical_threshold = 70
-        self.warning_threshold = 40
+        self.critical_threshold = CRITICAL_THRESHOLD
+        self.warning_threshold = WARNING_THRESHOLD
+        self.index = RiskIndex()  # latest run's scores by tier and level, for top-N queries
     
     def receive(self, message: AgentMessage) -> None:
         """Receive validations from ValidationAgent"""
@@ -31,64 +36,21 @@ class RiskAgent(BaseAgent):
         """Calculate risk scores and classify phantom stock"""
         print(f"[{self.name}] Calculating risk scores...")
         
-        self.risk_assessments = []
-        self.critical_risks = []
-        self.warnings = []
+        # Score and classify the whole batch as arrays
+        # (historical issues are simulated; in production, fetch from DB)
+        deviation, tier = validation_arrays(self.input_validations)
+        scores = score_risks(deviation, tier, simulated_history(deviation),
+                             self.critical_threshold, self.warning_threshold)
         
-        for validation in self.input_validations:
-            # Extract factors
-            deviation = validation.get("deviation", 0)
-            tier = validation.get("tier", 1)
-            
-            # Simulate historical issues (in production, fetch from DB)
-            historical_issues = 1 if deviation > 0.3 else 0
-            
-            # Calculate risk score components
-            deviation_score = min(deviation * 50, 50)  # Max 50 points
-            tier_score = tier * 6.67  # Tier-3 = 20 points
-            history_score = min(historical_issues * 10, 30)  # Max 30 points
-            
-            total_risk_score = deviation_score + tier_score + history_score
-            
-            # Rule: Classify risk level
-            if total_risk_score > self.critical_threshold:
-                risk_level = "CRITICAL"
-                classification = "phantom_stock_likely"
-                escalate = True
-            elif total_risk_score > self.warning_threshold:
-                risk_level = "WARNING"
-                classification = "monitor_closely"
-                escalate = True
-            else:
-                risk_level = "NORMAL"
-                classification = "normal"
-                escalate = False
-            
-            risk_assessment = {
-                "supplier_id": validation["supplier_id"],
-                "supplier_name": validation["supplier_name"],
-                "tier": tier,
-                "risk_score": round(total_risk_score, 2),
-                "risk_level": risk_level,
-                "classification": classification,
-                "deviation_percentage": validation.get("deviation_percentage", 0),
-                "reported_stock": validation.get("reported_stock", 0),
-                "expected_stock": validation.get("expected_stock", 0),
-                "escalate": escalate,
-                "components": {
-                    "deviation_score": round(deviation_score, 2),
-                    "tier_score": round(tier_score, 2),
-                    "history_score": round(history_score, 2)
-                }
-            }
-            
-            self.risk_assessments.append(risk_assessment)
-            
-            # Categorize by risk level
-            if risk_level == "CRITICAL":
-                self.critical_risks.append(risk_assessment)
-            elif risk_level == "WARNING":
-                self.warnings.append(risk_assessment)
+        # Assessment dicts are built when a consumer reads them
+        self.risk_assessments = scores.lazy(self.input_validations)
+        self.critical_risks = scores.lazy(self.input_validations, scores.critical_indices)
+        self.warnings = scores.lazy(self.input_validations, scores.warning_indices)
+        
+        # Keep this run's score per supplier-day indexed (unparsable dates index as undated)
+        days, _ = parse_dates([v.get("date") for v in self.input_validations])
+        self.index.clear()
+        self.index.add(scores, self.input_validations, [v["supplier_id"] for v in self.input_validations], days, tier)
         
         print(f"[{self.name}] Found {len(self.critical_risks)} critical risks, {len(self.warnings)} warnings")
     
@@ -108,6 +70,15 @@ class RiskAgent(BaseAgent):
         print(f"[{self.name}] Sending output to SupervisorAgent")
         return output
     
+    def query(self, limit: Optional[int] = None, tier: Optional[int] = None, level: Optional[str] = None,
+              min_score: Optional[float] = None, distinct: bool = False) -> Dict:
+        """Highest-scoring indexed assessments matching the filters, best first"""
+        slots = self.index.query(limit, tier, level, min_score, distinct)
+        return {
+            "risk_assessments": self.index.records(slots),
+            "matching": self.index.count(tier, level, min_score)
+        }
+    
     def get_reasoning(self) -> str:
         return """
         RiskAgent Decision Logic:
@@ -119,4 +90,5 @@ class RiskAgent(BaseAgent):
            - Score ≤ 40: NORMAL
         4. Categorize risks by severity
         5. Send risk assessments to SupervisorAgent
+        6. Keep the latest run's scores indexed by tier and level for top-N queries
         """
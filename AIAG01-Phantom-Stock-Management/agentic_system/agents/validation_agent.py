@@ -3,6 +3,7 @@ Validation Agent - Autonomous inventory prediction agent
 """
 from agents.base_agent import BaseAgent
 from models.messages import AgentMessage, ValidationOutput
+from analytics.validation import DEVIATION_THRESHOLD, describe_records, validate_records
 
 class ValidationAgent(BaseAgent):
     """
@@ -18,7 +19,7 @@ class ValidationAgent(BaseAgent):
         self.input_data = []
         self.validations = []
         self.high_deviations = []
-        self.deviation_threshold = 0.20
+        self.deviation_threshold = DEVIATION_THRESHOLD
     
     def receive(self, message: AgentMessage) -> None:
         """Receive validated data from MonitoringAgent"""
@@ -29,43 +30,10 @@ class ValidationAgent(BaseAgent):
         """Predict expected inventory and calculate deviations"""
         print(f"[{self.name}] Calculating inventory deviations...")
         
-        self.validations = []
-        self.high_deviations = []
-        
-        for record in self.input_data:
-            # Skip poor quality data
-            if record.get("data_quality") == "poor":
-                continue
-            
-            reported = record.get("reported_stock", 0)
-            expected = record.get("expected_stock", 0)
-            
-            # Calculate deviation
-            if expected > 0:
-                deviation = abs(reported - expected) / expected
-            else:
-                deviation = 0
-            
-            validation = {
-                "supplier_id": record.get("supplier_id"),
-                "supplier_name": record.get("supplier_name"),
-                "tier": record.get("tier"),
-                "reported_stock": reported,
-                "expected_stock": expected,
-                "deviation": round(deviation, 3),
-                "deviation_percentage": round(deviation * 100, 2)
-            }
-            
-            # Rule: Flag high deviations
-            if deviation > self.deviation_threshold:
-                validation["flag"] = "high_deviation"
-                validation["escalate"] = True
-                self.high_deviations.append(validation)
-            else:
-                validation["flag"] = "normal"
-                validation["escalate"] = False
-            
-            self.validations.append(validation)
+        # Deviation, masking and flagging run as array operations over the batch
+        result = validate_records(self.input_data, self.deviation_threshold)
+        self.validations = result.records(describe_records(self.input_data))
+        self.high_deviations = [self.validations[index] for index in result.high_indices.tolist()]
         
         print(f"[{self.name}] Found {len(self.high_deviations)} high deviations")
     
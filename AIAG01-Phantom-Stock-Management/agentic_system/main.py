@@ -2,15 +2,24 @@
 AIAG01 - Truly Agentic System (FastAPI)
 Each agent is autonomous with clear input/output contracts
 """
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Parent directory holds the shared simulation engine
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from orchestrator import AgentOrchestrator
+from alerting.lifecycle import SEVERITY_RANK
+from analytics.records import materialize
+from analytics.risk import RISK_LEVELS
 from models.messages import AgentMessage
+from simulation.columnar import SupplierCatalog, generate_inventory_columns, make_rng
+from simulation.dataset_file import DatasetReplay, record_dataset
+from storage.alert_history import time_window
 
 app = FastAPI(title="AIAG01 Agentic System", version="2.0.0")
 
@@ -26,39 +35,24 @@ app.add_middleware(
 orchestrator = AgentOrchestrator()
 
 # Supplier simulation data
+SAMPLE_SUPPLIERS = SupplierCatalog.from_suppliers([
+    {"id": "T1-001", "name": "Tier1 Electronics", "tier": 1, "capacity": 10000},
+    {"id": "T2-001", "name": "Tier2 Parts Co", "tier": 2, "capacity": 5000},
+    {"id": "T3-001", "name": "Tier3 Raw Materials", "tier": 3, "capacity": 3000},
+])
+SAMPLE_FIELDS = ("supplier_id", "supplier_name", "tier", "date", "reported_stock",
+                 "production_rate", "consumption_rate", "expected_stock")
+sample_rng = make_rng()
+
+def generate_sample_columns():
+    """Generate sample inventory data as columns"""
+    return generate_inventory_columns(
+        SAMPLE_SUPPLIERS, days_back=10, seed=sample_rng, phantom_rate=0.5, phantom_days=None
+    )
+
 def generate_sample_data():
     """Generate sample inventory data"""
-    import random
-    from datetime import datetime, timedelta
-    
-    suppliers = [
-        {"id": "T1-001", "name": "Tier1 Electronics", "tier": 1, "capacity": 10000},
-        {"id": "T2-001", "name": "Tier2 Parts Co", "tier": 2, "capacity": 5000},
-        {"id": "T3-001", "name": "Tier3 Raw Materials", "tier": 3, "capacity": 3000},
-    ]
-    
-    data = []
-    for supplier in suppliers:
-        production_rate = supplier["capacity"] * 0.7
-        consumption_rate = production_rate * 0.8
-        has_phantom = random.random() < 0.5
-        
-        for day in range(10):
-            expected = production_rate - consumption_rate + random.randint(-100, 100)
-            reported = expected * random.uniform(1.3, 1.8) if has_phantom else expected * random.uniform(0.95, 1.05)
-            
-            data.append({
-                "supplier_id": supplier["id"],
-                "supplier_name": supplier["name"],
-                "tier": supplier["tier"],
-                "date": (datetime.now() - timedelta(days=day)).strftime("%Y-%m-%d"),
-                "reported_stock": max(0, int(reported)),
-                "production_rate": int(production_rate),
-                "consumption_rate": int(consumption_rate),
-                "expected_stock": max(0, int(expected))
-            })
-    
-    return data
+    return generate_sample_columns().to_records(fields=SAMPLE_FIELDS)
 
 @app.get("/api/health")
 def health_check():
@@ -69,11 +63,19 @@ def health_check():
     }
 
 @app.post("/api/analysis/run")
-def run_analysis():
-    """Run the autonomous agent pipeline"""
-    inventory_data = generate_sample_data()
-    result = orchestrator.run_pipeline(inventory_data)
-    return result
+def run_analysis(replay: Optional[str] = None, record: Optional[str] = None):
+    """Run the autonomous agent pipeline (optionally recording or replaying a dataset)"""
+    try:
+        if replay:
+            inventory_data, columns = None, DatasetReplay(replay).inventory
+        else:
+            inventory_data, columns = None, generate_sample_columns()
+            if record:
+                record_dataset(record, columns)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=f"Dataset unavailable: {e}")
+    result = orchestrator.run_pipeline(inventory_data, columns, fields=SAMPLE_FIELDS)
+    return materialize(result)
 
 @app.get("/api/agents/reasoning")
 def get_reasoning():
@@ -93,6 +95,23 @@ def get_alerts():
         "total_alerts": supervisor_output["metadata"]["total_alerts"]
     }
 
+@app.get("/api/alerts/history")
+def get_alert_history(supplier_id: Optional[str] = None, severity: Optional[str] = None,
+                      tier: Optional[int] = None, run_id: Optional[int] = None, days: Optional[float] = None,
+                      since: Optional[str] = None, until: Optional[str] = None, limit: int = 100,
+                      cursor: Optional[str] = None):
+    """Get recorded alerts of every run, newest first; pass next_cursor back as cursor for the next page"""
+    if severity is not None and severity.upper() not in SEVERITY_RANK:
+        raise HTTPException(status_code=400, detail=f"Invalid severity: {severity}")
+    try:
+        since_time, until_time = time_window(days, since, until)
+        return orchestrator.alert_history.query(
+            supplier_id=supplier_id, severity=severity and severity.upper(), tier=tier, run_id=run_id,
+            since=since_time, until=until_time, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/suppliers")
 def get_suppliers():
     """Get all supplier data"""
@@ -143,13 +162,23 @@ def get_predicted_stock():
     }
 
 @app.get("/api/risk-scores")
-def get_risk_scores():
-    """Get risk scores for all suppliers"""
+def get_risk_scores(top: Optional[int] = None, tier: Optional[int] = None, level: Optional[str] = None,
+                    min_score: Optional[float] = None, distinct: bool = False):
+    """
+    Get risk scores for all suppliers
+    top / tier / level / min_score / distinct are answered from the risk index, best first
+    """
     if not orchestrator.agent_outputs:
         run_analysis()
     
     risk_output = orchestrator.agent_outputs.get("risk", {})
     risk_assessments = risk_output.get("data", {}).get("risk_assessments", [])
+    matching = len(risk_assessments)
+    if any(value is not None for value in (top, tier, level, min_score)) or distinct:
+        if level is not None and level.upper() not in RISK_LEVELS:
+            raise HTTPException(status_code=400, detail=f"Invalid level: {level}")
+        result = orchestrator.risk_agent.query(top, tier, level and level.upper(), min_score, distinct)
+        risk_assessments, matching = result["risk_assessments"], result["matching"]
     
     risk_scores = []
     for r in risk_assessments:
@@ -166,6 +195,7 @@ def get_risk_scores():
     return {
         "risk_scores": risk_scores,
         "total": len(risk_scores),
+        "matching": matching,
         "summary": {
             "critical": risk_output.get("metadata", {}).get("critical_count", 0),
             "warning": risk_output.get("metadata", {}).get("warning_count", 0),
@@ -183,7 +213,7 @@ def get_dashboard():
     risk_output = orchestrator.agent_outputs["risk"]
     validation_output = orchestrator.agent_outputs["validation"]
     
-    return {
+    return materialize({
         "summary": {
             "phantom_stock_detected": risk_output["metadata"]["critical_count"],
             "total_alerts": supervisor_output["metadata"]["total_alerts"],
@@ -194,14 +224,14 @@ def get_dashboard():
         "alerts": supervisor_output["data"]["alerts"],
         "critical_risks": risk_output["data"]["critical_risks"],
         "warnings": risk_output["data"]["warnings"]
-    }
+    })
 
 @app.get("/api/pipeline/trace")
 def get_pipeline_trace():
     """Get full pipeline execution trace"""
     return {
         "pipeline": "MonitoringAgent → ValidationAgent → RiskAgent → SupervisorAgent",
-        "agent_outputs": orchestrator.agent_outputs,
+        "agent_outputs": materialize(orchestrator.agent_outputs),
         "communication_flow": [
             {
                 "step": 1,
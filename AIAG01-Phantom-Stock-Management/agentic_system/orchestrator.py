@@ -1,11 +1,14 @@
 """
 Agent Orchestrator - Manages agent communication pipeline
 """
+from typing import Optional, Sequence
 from agents.monitoring_agent import MonitoringAgent
 from agents.validation_agent import ValidationAgent
 from agents.risk_agent import RiskAgent
 from agents.supervisor_agent import SupervisorAgent
 from models.messages import AgentMessage
+from simulation.columnar import InventoryColumns
+from storage.alert_history import ALERT_HISTORY_PATH, AlertHistory
 
 class AgentOrchestrator:
     """
@@ -23,10 +26,14 @@ class AgentOrchestrator:
         
         # Store agent outputs for transparency
         self.agent_outputs = {}
+        # Every run's alerts, kept after the next run replaces agent_outputs
+        self.alert_history = AlertHistory(ALERT_HISTORY_PATH, source="agentic")
     
-    def run_pipeline(self, inventory_data: list) -> dict:
+    def run_pipeline(self, inventory_data: Optional[list] = None, columns: Optional[InventoryColumns] = None,
+                     fields: Optional[Sequence[str]] = None) -> dict:
         """
         Execute the full agent pipeline
+        Input is record dicts, or InventoryColumns (materialized with `fields` only when serialized)
         
         Flow:
         1. Raw data → MonitoringAgent
@@ -44,7 +51,7 @@ class AgentOrchestrator:
         print("-" * 60)
         initial_message = AgentMessage(
             sender="DataSource",
-            data={"inventory_data": inventory_data}
+            data={"inventory_data": inventory_data, "inventory_columns": columns, "fields": fields}
         )
         monitoring_output = self.monitoring_agent.execute(initial_message)
         self.agent_outputs["monitoring"] = monitoring_output.to_dict()
@@ -66,6 +73,7 @@ class AgentOrchestrator:
         print("-" * 60)
         supervisor_output = self.supervisor_agent.execute(risk_output)
         self.agent_outputs["supervisor"] = supervisor_output.to_dict()
+        self.alert_history.record(supervisor_output.data["alerts"], supervisor_output.data["recommendations"])
         
         print("\n" + "="*60)
         print("PIPELINE COMPLETE")
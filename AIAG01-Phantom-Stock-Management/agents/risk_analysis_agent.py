@@ -2,90 +2,155 @@
 Risk Analysis Agent
 Calculates phantom stock probability and risk scores
 """
-from typing import Dict, List
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from analytics.propagation import RiskPropagator
+from analytics.risk import CRITICAL_THRESHOLD, WARNING_THRESHOLD, score_risks, validation_arrays
+from analytics.risk_index import RiskIndex
+from analytics.rules import parse_dates
+from analytics.risk_rollup import ROLLUP_WINDOWS, RiskWindows, SupplierRisks, peak_positions
+from analytics.threshold_sweep import ThresholdSweep
+from simulation.supplier_graph import SupplierGraph
+from storage.issue_history import EVENT_WEIGHTS, IssueHistory
 
 class RiskAnalysisAgent:
-    def __init__(self):
+    def __init__(self, issue_history: Optional[IssueHistory] = None, rollup_windows: Sequence[int] = ROLLUP_WINDOWS):
         self.name = "Risk Analysis Agent"
         self.role = "Phantom Stock Detector"
-        self.critical_threshold = 70
-        self.warning_threshold = 40
+        self.critical_threshold = CRITICAL_THRESHOLD
+        self.warning_threshold = WARNING_THRESHOLD
+        # Past CRITICAL/WARNING days per supplier (in memory unless given a persistent store)
+        self.issue_history = issue_history if issue_history is not None else IssueHistory()
+        # Event weight per risk level code (NORMAL, WARNING, CRITICAL)
+        self._event_weights = np.array([EVENT_WEIGHTS["NORMAL"], EVENT_WEIGHTS["WARNING"], EVENT_WEIGHTS["CRITICAL"]])
+        # Rolling per-supplier risk over day windows, for one-row-per-supplier consumers
+        self.rollup = RiskWindows(rollup_windows)
+        # Latest run's score per supplier-day, sorted within (tier, level) buckets for top-N queries
+        self.index = RiskIndex()
+        # Risk propagated downstream over the supplier graph (created for the first graph seen)
+        self.propagator: Optional[RiskPropagator] = None
         
-    def calculate_risk_score(self, validation: Dict, historical_issues: int = 0) -> Dict:
+    def calculate_risk_score(self, validation: Dict, historical_issues: float = 0) -> Dict:
         """
         Calculate risk score based on multiple factors
         Risk Score = (deviation * 50) + (tier_depth * 20) + (historical_issues * 30)
         """
-        deviation = validation.get("deviation", 0)
-        tier = validation.get("tier", 1)
+        deviation, tier = validation_arrays([validation])
+        scores = score_risks(deviation, tier, [historical_issues], self.critical_threshold, self.warning_threshold)
+        return scores.records([validation], np.array([0]))[0]
+    
+    def analyze_risks(self, validations: List[Dict]) -> Dict:
+        """
+        Analyze all validations and generate risk assessments
+        Scores and levels are computed as arrays; assessment dicts are built
+        lazily, when a list is read or serialized
+        """
+        # Decayed count of each supplier's issue days before the record's date.
+        # Days are scored in order, one batch lookup each, and recorded before the
+        # next day is looked up: a record sees every earlier issue day, whether it
+        # came from an earlier run or from this batch, so a re-run scores the same
+        supplier_ids = [validation["supplier_id"] for validation in validations]
+        days, _ = parse_dates([validation.get("date") for validation in validations])  # unparsable -> NaT
+        rows = np.flatnonzero(~np.isnat(days))  # undated records score without history
+        deviation, tier = validation_arrays(validations)
+        history = np.zeros(len(validations))
         
-        # Risk components
-        deviation_score = min(deviation * 50, 50)  # Max 50 points
-        tier_score = tier * 6.67  # Tier 3 = 20 points
-        history_score = min(historical_issues * 10, 30)  # Max 30 points
+        codes = self.issue_history.supplier_codes([supplier_ids[row] for row in rows.tolist()])
+        day_numbers = days[rows].astype(np.int64)
+        order = np.argsort(day_numbers, kind="stable")
+        for group in np.split(order, np.flatnonzero(np.diff(day_numbers[order])) + 1):
+            history[rows[group]] = self.issue_history.lookup(codes[group], day_numbers[group])
+            level = score_risks(deviation[rows[group]], tier[rows[group]], history[rows[group]],
+                                self.critical_threshold, self.warning_threshold).level
+            self.issue_history.record(codes[group], day_numbers[group], self._event_weights[level], persist=False)
+        self.issue_history.save(np.unique(codes))
         
-        total_risk_score = deviation_score + tier_score + history_score
+        scores = score_risks(deviation, tier, history, self.critical_threshold, self.warning_threshold)
         
-        # Classify risk level
-        if total_risk_score > self.critical_threshold:
-            risk_level = "CRITICAL"
-            classification = "phantom_stock_likely"
-            escalate = True
-        elif total_risk_score > self.warning_threshold:
-            risk_level = "WARNING"
-            classification = "monitor_closely"
-            escalate = True
-        else:
-            risk_level = "NORMAL"
-            classification = "normal"
-            escalate = False
+        # Index this run's scores for top-N / tier / level queries; like the
+        # unfiltered assessments, the index only holds the latest run
+        self.index.clear()
+        self.index.add(scores, validations, supplier_ids, days, tier)
+        
+        # Roll supplier-days up to one row per supplier
+        rollup_codes = self.rollup.supplier_codes(supplier_ids)
+        self.rollup.add_batch(rollup_codes[rows], days[rows].astype(np.int64),
+                              scores.risk_score[rows], scores.level[rows])
+        peaks = peak_positions(rollup_codes, scores.risk_score)
+        suppliers = SupplierRisks(self.rollup, rollup_codes[peaks], peaks,
+                                  self.critical_threshold, self.warning_threshold)
+        supplier_counts = suppliers.counts()
         
+        counts = scores.counts()
         return {
-            "supplier_id": validation["supplier_id"],
-            "supplier_name": validation["supplier_name"],
-            "tier": tier,
-            "risk_score": round(total_risk_score, 2),
-            "risk_level": risk_level,
-            "classification": classification,
-            "deviation_percentage": validation.get("deviation_percentage", 0),
-            "reported_stock": validation.get("reported_stock", 0),
-            "expected_stock": validation.get("expected_stock", 0),
-            "escalate": escalate,
-            "components": {
-                "deviation_score": round(deviation_score, 2),
-                "tier_score": round(tier_score, 2),
-                "history_score": round(history_score, 2)
-            }
+            "agent": self.name,
+            "scores": scores,
+            "risk_assessments": scores.lazy(validations),
+            "critical_risks": scores.lazy(validations, scores.critical_indices),
+            "warnings": scores.lazy(validations, scores.warning_indices),
+            "total_assessed": len(scores),
+            "critical_count": counts["CRITICAL"],
+            "warning_count": counts["WARNING"],
+            "supplier_rollup": suppliers,
+            "supplier_risks": suppliers.lazy(scores, validations),
+            "suppliers_assessed": len(suppliers),
+            "supplier_critical_count": supplier_counts["CRITICAL"],
+            "supplier_warning_count": supplier_counts["WARNING"],
+            # What-if counts at other critical/warning thresholds, without rescoring
+            "threshold_sweep": ThresholdSweep(scores.risk_score, rollup_codes, self.rollup.supplier_ids)
         }
     
-    def analyze_risks(self, validations: List[Dict]) -> Dict:
+    def query_risks(self, limit: Optional[int] = None, tier: Optional[int] = None, level: Optional[str] = None,
+                    min_score: Optional[float] = None, distinct: bool = False) -> Dict:
         """
-        Analyze all validations and generate risk assessments
+        Highest-scoring indexed assessments matching the filters, best first
+        (only the returned assessments are built)
         """
-        risk_assessments = []
-        critical_risks = []
-        warnings = []
-        
-        for validation in validations:
-            # Simulate historical issues (in real system, fetch from database)
-            historical_issues = 1 if validation.get("deviation", 0) > 0.3 else 0
-            
-            risk_assessment = self.calculate_risk_score(validation, historical_issues)
-            risk_assessments.append(risk_assessment)
-            
-            if risk_assessment["risk_level"] == "CRITICAL":
-                critical_risks.append(risk_assessment)
-            elif risk_assessment["risk_level"] == "WARNING":
-                warnings.append(risk_assessment)
+        slots = self.index.query(limit, tier, level, min_score, distinct)
+        return {
+            "agent": self.name,
+            "risk_assessments": self.index.records(slots),
+            "returned": len(slots),
+            "matching": self.index.count(tier, level, min_score),
+            "indexed": len(self.index)
+        }
+    
+    def propagate_risk(self, graph: SupplierGraph, suppliers: SupplierRisks) -> Dict:
+        """
+        Propagate each supplier's current risk (its peak over the shortest
+        roll-up window) downstream along supplies_to links. The first call for
+        a graph solves from scratch; later calls only push the node risks that
+        changed.
+        """
+        codes = np.array([graph.catalog.code_of(self.rollup.supplier_ids[code]) for code in suppliers.codes.tolist()],
+                         dtype=np.int64)
+        current = np.nan_to_num(suppliers.stats["max_risk"][:, 0])
+        if self.propagator is None or self.propagator.graph is not graph:
+            self.propagator = RiskPropagator(graph)
+            risk = np.zeros(graph.n_suppliers)
+            risk[codes] = current
+            self.propagator.propagate(risk)
+            mode, updated = "full", graph.n_suppliers
+        else:
+            changed = np.abs(current - self.propagator.risk[codes]) > self.propagator.tolerance
+            self.propagator.update(codes[changed], current[changed])
+            mode, updated = "incremental", self.propagator.touched
         
+        propagator = self.propagator
+        at_risk = np.flatnonzero(propagator.propagated > self.warning_threshold)
+        # Suppliers pushed over a threshold only by what they inherit
+        elevated = at_risk[propagator.risk[at_risk] <= np.where(
+            propagator.propagated[at_risk] > self.critical_threshold, self.critical_threshold, self.warning_threshold
+        )]
         return {
             "agent": self.name,
-            "risk_assessments": risk_assessments,
-            "critical_risks": critical_risks,
-            "warnings": warnings,
-            "total_assessed": len(risk_assessments),
-            "critical_count": len(critical_risks),
-            "warning_count": len(warnings)
+            "propagated_risks": propagator.records(at_risk),
+            "elevated_suppliers": [graph.catalog.ids[code] for code in elevated.tolist()],
+            "suppliers_propagated": graph.n_suppliers,
+            "mode": mode,
+            "updated_suppliers": updated,
+            "iterations": propagator.iterations,
+            "damping": propagator.damping
         }
     
     def get_reasoning(self) -> str:
@@ -95,11 +160,19 @@ class RiskAnalysisAgent:
         1. Calculate risk score using weighted formula:
            - Deviation impact: 50% weight
            - Tier depth impact: 20% weight (deeper = riskier)
-           - Historical issues: 30% weight
+           - Historical issues: 30% weight (decayed count of the supplier's
+             earlier CRITICAL/WARNING days, kept in the issue history store)
         2. Classify risk levels:
            - Score > 70: CRITICAL (phantom stock likely)
            - Score > 40: WARNING (monitor closely)
            - Score ≤ 40: NORMAL
         3. Escalate CRITICAL and WARNING to Supervisor
         4. Provide detailed risk breakdown for decision making
+        5. Record each day's CRITICAL/WARNING outcome in the supplier's issue history
+        6. Roll supplier-days up to one row per supplier: max/mean/trend risk
+           and CRITICAL/WARNING counts over rolling day windows (7/30/90 by default)
+        7. Keep the latest scores indexed by tier and level for top-N queries
+        8. Propagate supplier risk downstream over supplies_to links (damped,
+           weighted by each customer's inbound volume) and report suppliers
+           pushed over a threshold by upstream risk
         """
@@ -2,13 +2,20 @@
 Supervisor Agent
 Verifies agent conclusions and triggers alerts
 """
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
+from alerting.diff import Snapshot, diff, snapshot
+from alerting.lifecycle import AlertLifecycle, alert_type
+from analytics.anomalies import group_by_supplier
 
 class SupervisorAgent:
-    def __init__(self):
+    def __init__(self, lifecycle: Optional[AlertLifecycle] = None):
         self.name = "Supervisor Agent"
         self.role = "Decision Maker and Alert Generator"
+        # Alert state per (supplier, alert type): repeats of open alerts are not re-sent
+        self.lifecycle = lifecycle if lifecycle is not None else AlertLifecycle()
+        # Diff mode: everything the last run raised, by canonical key hash
+        self.snapshot: Snapshot = {}
         
     def verify_and_decide(self, risk_analysis: Dict, monitoring_data: Dict) -> Dict:
         """
@@ -17,8 +24,24 @@ class SupervisorAgent:
         alerts = []
         recommendations = []
         
+        # One alert per supplier when the risk analysis carries its supplier roll-up
+        # (the peak assessment stands for the supplier), otherwise one per flagged supplier-day
+        supplier_risks = risk_analysis.get("supplier_risks")
+        windows = {}
+        if supplier_risks is not None:
+            critical_risks, warnings = [], []
+            for supplier_risk in supplier_risks:
+                if not supplier_risk["escalate"]:
+                    break  # rows are ordered worst first
+                level_risks = critical_risks if supplier_risk["risk_level"] == "CRITICAL" else warnings
+                level_risks.append(supplier_risk["peak_assessment"])
+                windows[supplier_risk["supplier_id"]] = supplier_risk["windows"]
+        else:
+            critical_risks = risk_analysis.get("critical_risks", [])
+            warnings = risk_analysis.get("warnings", [])
+        
         # Process critical risks
-        for critical in risk_analysis.get("critical_risks", []):
+        for critical in critical_risks:
             alert = {
                 "alert_id": f"ALERT-{critical['supplier_id']}-{datetime.now().strftime('%Y%m%d%H%M%S')}",
                 "severity": "CRITICAL",
@@ -32,6 +55,8 @@ class SupervisorAgent:
                 "expected_stock": critical["expected_stock"],
                 "timestamp": datetime.now().isoformat()
             }
+            if critical["supplier_id"] in windows:
+                alert["windows"] = windows[critical["supplier_id"]]
             
             recommendation = {
                 "supplier_id": critical["supplier_id"],
@@ -45,7 +70,7 @@ class SupervisorAgent:
             recommendations.append(recommendation)
         
         # Process warnings
-        for warning in risk_analysis.get("warnings", []):
+        for warning in warnings:
             alert = {
                 "alert_id": f"ALERT-{warning['supplier_id']}-{datetime.now().strftime('%Y%m%d%H%M%S')}",
                 "severity": "WARNING",
@@ -57,6 +82,8 @@ class SupervisorAgent:
                 "deviation": f"{warning['deviation_percentage']}%",
                 "timestamp": datetime.now().isoformat()
             }
+            if warning["supplier_id"] in windows:
+                alert["windows"] = windows[warning["supplier_id"]]
             
             recommendation = {
                 "supplier_id": warning["supplier_id"],
@@ -69,23 +96,47 @@ class SupervisorAgent:
             alerts.append(alert)
             recommendations.append(recommendation)
         
-        # Check for data quality issues from monitoring agent
+        # Check for data quality issues from monitoring agent (one alert per supplier)
         if monitoring_data.get("anomaly_count", 0) > 0:
-            for anomaly in monitoring_data.get("anomalies", []):
+            by_supplier = group_by_supplier(monitoring_data.get("anomalies", []))
+            for supplier_id, issues in by_supplier.items():
                 alert = {
-                    "alert_id": f"ALERT-DQ-{anomaly['supplier_id']}-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                    "alert_id": f"ALERT-DQ-{supplier_id}-{datetime.now().strftime('%Y%m%d%H%M%S')}",
                     "severity": "HIGH",
-                    "supplier_id": anomaly["supplier_id"],
-                    "message": f"Data quality issues detected: {', '.join(anomaly['issues'])}",
+                    "supplier_id": supplier_id,
+                    "message": "Data quality issues detected: " + ", ".join(
+                        f"{issue['issue']} ({issue['count']} records)" for issue in issues
+                    ),
+                    "issues": [
+                        {key: issue[key] for key in ("issue", "count", "first_seen", "last_seen", "sample_records")}
+                        for issue in issues
+                    ],
+                    "record_count": sum(issue["count"] for issue in issues),
                     "timestamp": datetime.now().isoformat()
                 }
                 alerts.append(alert)
         
+        # Send only new, changed or reminder-due alerts (and the recommendations that go with them)
+        lifecycle = self.lifecycle.observe(alerts)
+        # Diff everything raised (under the lifecycle's stable alert ids) against the previous run
+        raised = [self.lifecycle.states[(alert["supplier_id"], alert_type(alert))].alert for alert in alerts]
+        previous, self.snapshot = self.snapshot, snapshot(raised, recommendations)
+        changes = diff(previous, self.snapshot)
+        alerts = lifecycle["alerts"]
+        sent = {alert["supplier_id"] for alert in alerts if alert_type(alert) == "phantom_stock"}
+        recommendations = [r for r in recommendations if r["supplier_id"] in sent]
+        active = self.lifecycle.active()
+        
         return {
             "agent": self.name,
             "alerts": alerts,
             "recommendations": recommendations,
             "total_alerts": len(alerts),
+            "suppressed_alerts": lifecycle["suppressed"],
+            "resolved_alerts": lifecycle["resolved"],
+            "changes": changes["counts"],
+            "active_alerts": len(active),
+            "active_critical_alerts": len([a for a in active if a["severity"] == "CRITICAL"]),
             "critical_alerts": len([a for a in alerts if a["severity"] == "CRITICAL"]),
             "warning_alerts": len([a for a in alerts if a["severity"] == "WARNING"]),
             "decision_timestamp": datetime.now().isoformat()
@@ -104,7 +155,8 @@ class SupervisorAgent:
                                    all_agent_outputs.get("risk_analysis", {}).get("warning_count", 0),
                 "alerts_generated": all_agent_outputs.get("supervisor", {}).get("total_alerts", 0),
                 "phantom_stock_detected": all_agent_outputs.get("risk_analysis", {}).get("critical_count", 0),
-                "status": "ATTENTION_REQUIRED" if all_agent_outputs.get("supervisor", {}).get("critical_alerts", 0) > 0 else "NORMAL"
+                "active_alerts": all_agent_outputs.get("supervisor", {}).get("active_alerts", 0),
+                "status": "ATTENTION_REQUIRED" if all_agent_outputs.get("supervisor", {}).get("active_critical_alerts", 0) > 0 else "NORMAL"
             }
         }
     
@@ -118,7 +170,14 @@ class SupervisorAgent:
            - CRITICAL (risk > 70): Immediate audit required
            - WARNING (risk > 40): Increase monitoring
         4. Create actionable recommendations with priority
-        5. Check for data quality issues from monitoring
-        6. Generate executive summary for dashboard
-        7. Log all decisions for audit trail
+        5. Alert once per supplier, using the risk roll-up's windowed peak risk
+           when available
+        6. Check for data quality issues from monitoring (one alert per supplier)
+        7. Track each (supplier, alert type) as open / acknowledged / resolved:
+           send only new, escalated or reminder-due alerts, back off reminders,
+           and resolve alerts a run no longer raises
+        8. Diff every alert and recommendation raised against the previous run
+           by hashed canonical key: new, resolved and escalated
+        9. Generate executive summary for dashboard
+        10. Log all decisions for audit trail
         """
@@ -2,68 +2,99 @@
 Supply Monitoring Agent
 Collects and normalizes inventory, production, and shipment data
 """
-from typing import Dict, List
-from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from analytics.anomalies import rollup_columns, rollup_records
+from analytics.quality import DEFAULT_RULES, check_inventory_columns, check_inventory_records
+from analytics.logistics import ShipmentWindows
+from analytics.rules import compile_rules
+from simulation.columnar import InventoryColumns, ShipmentColumns
 
 class SupplyMonitoringAgent:
-    def __init__(self):
+    def __init__(self, rules: Optional[List[Dict]] = None):
         self.name = "Supply Monitoring Agent"
         self.role = "Data Collector and Normalizer"
+        # Declarative quality rule specs, compiled once per agent
+        self.rules = compile_rules(rules) if rules is not None else DEFAULT_RULES
+        # Rolling per-supplier shipment statistics for continuous feeds
+        self.shipment_windows = ShipmentWindows()
         
-    def process_inventory_data(self, inventory_data: List[Dict]) -> Dict:
+    def process_inventory_data(self, inventory_data: Optional[List[Dict]] = None,
+                               columns: Optional[InventoryColumns] = None,
+                               fields: Optional[Sequence[str]] = None) -> Dict:
         """
         Process and validate incoming inventory data
         Returns structured data with quality flags
+        
+        When the batch is also (or only) available as columns, e.g. generated or
+        replayed data, the checks run over the columns. processed_data is a view:
+        its dicts are only built when read or serialized
         """
-        processed_data = []
-        anomalies = []
+        # Data quality checks run over the whole batch at once
+        if columns is not None:
+            quality = check_inventory_columns(columns, rules=self.rules)
+            rollup = rollup_columns(quality, columns)
+        else:
+            quality = check_inventory_records(inventory_data, rules=self.rules)
+            rollup = rollup_records(quality, inventory_data)
+        processed_data = quality.lazy(inventory_data, columns, fields)
         
-        for record in inventory_data:
-            # Data quality checks
-            quality_issues = []
-            
-            if record["reported_stock"] < 0:
-                quality_issues.append("negative_stock")
-            
-            if record["production_rate"] <= 0:
-                quality_issues.append("invalid_production_rate")
-            
-            # Check for missing critical fields
-            required_fields = ["supplier_id", "reported_stock", "production_rate"]
-            if not all(field in record for field in required_fields):
-                quality_issues.append("missing_fields")
-            
-            # Flag anomalies
-            if quality_issues:
-                anomalies.append({
-                    "supplier_id": record["supplier_id"],
-                    "issues": quality_issues,
-                    "severity": "high",
-                    "escalate": True
-                })
-            
-            # Add monitoring metadata
-            processed_record = {
-                **record,
-                "monitored_at": datetime.now().isoformat(),
-                "data_quality": "poor" if quality_issues else "good",
-                "quality_issues": quality_issues
-            }
-            
-            processed_data.append(processed_record)
+        # Flag anomalies, rolled up per (supplier, issue)
+        anomalies = [{**anomaly, "severity": "high", "escalate": True} for anomaly in rollup]
         
         return {
             "agent": self.name,
             "processed_data": processed_data,
+            "monitored_at": quality.monitored_at,
             "anomalies": anomalies,
             "total_records": len(processed_data),
-            "anomaly_count": len(anomalies)
+            "anomaly_count": quality.anomaly_count
+        }
+    
+    def process_inventory_batch(self, inventory: InventoryColumns) -> Dict:
+        """
+        Batch quality checks over columnar inventory data
+        Records are not copied: quality flags are kept as a bitmask column
+        and anomaly dicts are only built for flagged records
+        """
+        quality = check_inventory_columns(inventory, rules=self.rules)
+        
+        anomalies = [
+            {**anomaly, "severity": "high", "escalate": True}
+            for anomaly in rollup_columns(quality, inventory)
+        ]
+        
+        return {
+            "agent": self.name,
+            "batch": inventory,
+            "quality": quality,
+            "monitored_at": quality.monitored_at,
+            "anomalies": anomalies,
+            "quality_counts": quality.counts(),
+            "rule_stats": quality.rule_stats,
+            "total_records": len(inventory),
+            "anomaly_count": quality.anomaly_count
         }
     
-    def process_shipment_data(self, shipment_data: List[Dict]) -> Dict:
+    def process_shipment_data(self, shipment_data: Optional[List[Dict]] = None,
+                              columns: Optional[ShipmentColumns] = None) -> Dict:
         """
         Process shipment logs and flag logistics anomalies
+        Returns per-supplier rolling aggregates instead of echoing the shipments
+        
+        When the log is available as columns, anomaly dicts are only built for
+        the delayed shipments
         """
+        windows = ShipmentWindows()
+        if columns is not None:
+            windows.add_shipments(columns)
+            delayed = columns.take(np.flatnonzero(columns.delay_days > 7))
+            shipment_data = delayed.to_records(("supplier_id", "shipment_id", "delay_days"))
+            total_shipments = len(columns)
+        else:
+            windows.add_records(shipment_data)
+            total_shipments = len(shipment_data)
+        
         logistics_anomalies = []
         
         for shipment in shipment_data:
@@ -78,10 +109,35 @@ class SupplyMonitoringAgent:
         
         return {
             "agent": self.name,
-            "shipment_data": shipment_data,
+            **self._shipment_aggregates(windows),
             "logistics_anomalies": logistics_anomalies,
-            "total_shipments": len(shipment_data),
-            "delayed_shipments": len(logistics_anomalies)
+            "total_shipments": total_shipments,
+            "delayed_shipments": len(logistics_anomalies),
+            "undated_shipments": windows.undated
+        }
+    
+    def process_shipment_stream(self, shipments: ShipmentColumns) -> Dict:
+        """
+        Fold a new columnar shipment batch into the agent's rolling windows
+        Earlier batches are never rescanned; returns updated aggregates
+        for the suppliers that appear in the batch
+        """
+        touched = self.shipment_windows.add_shipments(shipments)
+        delayed = shipments.delay_days > 7
+        
+        return {
+            "agent": self.name,
+            **self._shipment_aggregates(self.shipment_windows, touched),
+            "batch_shipments": len(shipments),
+            "delayed_shipments": int(np.count_nonzero(delayed))
+        }
+    
+    def _shipment_aggregates(self, windows: ShipmentWindows, codes: Optional[np.ndarray] = None) -> Dict:
+        """Compact per-supplier on-time rate, mean/p95 delay and trend per window"""
+        return {
+            "as_of": str(np.datetime64(windows.day, "D")) if windows.day is not None else None,
+            "windows": [f"{window}d" for window in windows.windows],
+            "supplier_stats": windows.summary(codes)
         }
     
     def get_reasoning(self) -> str:
@@ -92,6 +148,7 @@ class SupplyMonitoringAgent:
         2. Check for negative or impossible values
         3. Flag data quality issues immediately
         4. Identify logistics anomalies (delays > 7 days)
+           and track rolling on-time rate and delay per supplier (7/30/90 days)
         5. Escalate critical issues to Supervisor
         6. Pass clean data to Validation Agent
         """
@@ -2,18 +2,34 @@
 Validation Agent
 Predicts expected inventory levels and detects deviations
 """
-from typing import Dict, List
-import statistics
+from typing import Dict, List, Optional
+import numpy as np
+from analytics.forecast import SupplierForecaster
+from analytics.prediction import BatchPredictor
+from analytics.reconciliation import MISMATCH_THRESHOLD, SupplierFlows, reconcile
+from analytics.rules import QualityReport
+from analytics.threshold_sweep import ThresholdSweep
+from analytics.validation import (
+    DEVIATION_THRESHOLD, describe_columns, describe_records, validate_columns, validate_records
+)
+from simulation.columnar import InventoryColumns
+from simulation.supplier_graph import SupplierGraph
 
 class ValidationAgent:
-    def __init__(self):
+    def __init__(self, forecaster: Optional[SupplierForecaster] = None):
         self.name = "Validation Agent"
         self.role = "Predictive Validator"
-        self.deviation_threshold = 0.20  # 20% deviation triggers escalation
+        self.deviation_threshold = DEVIATION_THRESHOLD  # 20% deviation triggers escalation
+        self.mismatch_threshold = MISMATCH_THRESHOLD  # 10% of claimed stock missing downstream
+        # Online per-supplier forecasters of expected stock
+        self.forecaster = forecaster if forecaster is not None else SupplierForecaster()
+        # Memoized batch predictions over the latest ingested inventory
+        self.predictor = BatchPredictor(self.forecaster)
         
     def predict_expected_inventory(self, inventory_record: Dict) -> Dict:
         """
         Predict what inventory should exist based on production and consumption
+        Uses the supplier's forecaster once it has history for that supplier
         """
         production_rate = inventory_record.get("production_rate", 0)
         consumption_rate = inventory_record.get("consumption_rate", 0)
@@ -25,70 +41,126 @@ class ValidationAgent:
         if "expected_stock" in inventory_record:
             expected_stock = inventory_record["expected_stock"]
         
+        forecast = None
+        if inventory_record.get("date"):
+            forecast = self.forecaster.forecast_one(inventory_record["supplier_id"], inventory_record["date"])
+        if forecast is not None:
+            expected_stock = int(round(forecast))
+        
         return {
             "supplier_id": inventory_record["supplier_id"],
             "predicted_stock": max(0, expected_stock),
             "production_rate": production_rate,
-            "consumption_rate": consumption_rate
+            "consumption_rate": consumption_rate,
+            "model": "holt_weekly" if forecast is not None else "baseline"
         }
     
-    def validate_inventory(self, processed_data: List[Dict]) -> Dict:
+    def update_forecasts(self, inventory_data: Optional[List[Dict]] = None,
+                         columns: Optional[InventoryColumns] = None) -> int:
         """
-        Compare reported vs predicted inventory
+        Fold new supplier-days into the forecasters (days already seen are skipped)
+        Returns the number of suppliers with a forecast
         """
-        validations = []
-        high_deviations = []
+        if columns is not None:
+            self.forecaster.update_columns(columns)
+        else:
+            self.forecaster.update_records(inventory_data)
+        self.predictor.refresh()
+        return int(np.count_nonzero(self.forecaster.observations))
+    
+    def ingest_inventory(self, inventory_data: Optional[List[Dict]] = None,
+                         columns: Optional[InventoryColumns] = None) -> None:
+        """Index new inventory for batch predictions (drops memoized results)"""
+        if columns is not None:
+            self.predictor.ingest_columns(columns)
+        else:
+            self.predictor.ingest_records(inventory_data)
+    
+    def predict_batch(self, supplier_ids: Optional[List[str]] = None, start: Optional[str] = None,
+                      end: Optional[str] = None) -> Dict:
+        """
+        Predicted stock for a set of suppliers over a date range in one vectorized call
+        Repeated reads of the same inventory are served from the LRU memo
+        """
+        predictions = self.predictor.predict(supplier_ids, start, end)
         
-        for record in processed_data:
-            if record.get("data_quality") == "poor":
-                continue  # Skip poor quality data
-            
-            reported = record["reported_stock"]
-            expected = record.get("expected_stock", 0)
-            
-            # Calculate deviation
-            if expected > 0:
-                deviation = abs(reported - expected) / expected
-            else:
-                deviation = 0
-            
-            validation_result = {
-                "supplier_id": record["supplier_id"],
-                "supplier_name": record["supplier_name"],
-                "tier": record["tier"],
-                "reported_stock": reported,
-                "expected_stock": expected,
-                "deviation": round(deviation, 3),
-                "deviation_percentage": round(deviation * 100, 2)
-            }
-            
-            # Flag high deviations
-            if deviation > self.deviation_threshold:
-                validation_result["flag"] = "high_deviation"
-                validation_result["escalate"] = True
-                high_deviations.append(validation_result)
-            else:
-                validation_result["flag"] = "normal"
-                validation_result["escalate"] = False
-            
-            validations.append(validation_result)
+        return {
+            "agent": self.name,
+            "predictions": predictions,
+            "total": len(predictions),
+            "cache": self.predictor.cache_info()
+        }
+    
+    def validate_inventory(self, processed_data: List[Dict]) -> Dict:
+        """
+        Compare reported vs expected inventory
+        Deviations use each record's own expected_stock; the forecasters are fitted
+        on that same field, so they feed predictions, not this check
+        """
+        # Deviation, masking and flagging run as array operations over the batch
+        result = validate_records(processed_data, self.deviation_threshold)
+        validations = result.records(describe_records(processed_data))
+        high_deviations = [validations[index] for index in result.high_indices.tolist()]
         
         return {
             "agent": self.name,
             "validations": validations,
             "high_deviations": high_deviations,
             "total_validated": len(validations),
-            "high_deviation_count": len(high_deviations)
+            "high_deviation_count": len(high_deviations),
+            # What-if counts at other deviation thresholds, without revalidating
+            "deviation_sweep": ThresholdSweep.from_ids(
+                result.deviation, [validation["supplier_id"] for validation in validations]
+            )
+        }
+    
+    def validate_batch(self, inventory: InventoryColumns, quality: Optional[QualityReport] = None) -> Dict:
+        """
+        Columnar validation for engine-generated data
+        Returns the columnar result; dicts are only built for escalated records
+        """
+        result = validate_columns(inventory, quality, self.deviation_threshold)
+        high_deviations = result.records(describe_columns(inventory), result.high_indices)
+        
+        return {
+            "agent": self.name,
+            "result": result,
+            "high_deviations": high_deviations,
+            "total_validated": len(result),
+            "high_deviation_count": len(high_deviations),
+            "deviation_sweep": ThresholdSweep(result.deviation, inventory.supplier_code[result.rows], inventory.catalog.ids)
+        }
+    
+    def reconcile_network(self, graph: SupplierGraph, flows: SupplierFlows, received: np.ndarray) -> Dict:
+        """
+        Cross-tier mass balance: reported stock and outbound shipments vs
+        what customers record receiving on each supplies_to link
+        """
+        result = reconcile(graph, flows, received, self.mismatch_threshold)
+        mismatches = result.records()
+        
+        return {
+            "agent": self.name,
+            "result": result,
+            "mismatches": mismatches,
+            "suppliers_reconciled": graph.n_suppliers,
+            "links_reconciled": graph.n_edges,
+            "mismatch_count": len(mismatches)
         }
     
     def get_reasoning(self) -> str:
         """Return agent's reasoning process"""
         return """
         Validation Agent Reasoning:
-        1. Calculate expected inventory: production_rate - consumption_rate
-        2. Compare reported vs expected inventory
+        1. Calculate expected inventory: production_rate - consumption_rate,
+           or the supplier's Holt forecast (trend + weekly seasonality) once it has history
+        2. Compare reported inventory with the record's expected_stock
+           (the forecasts are fitted on it, so they do not change the check)
         3. Calculate deviation percentage
         4. If deviation > 20%, flag as high_deviation
+           (deviation_sweep answers the same question for other thresholds)
         5. Escalate high deviations to Risk Analysis Agent
         6. Pass all validations for risk scoring
+        7. Reconcile each supplier's stock and shipments with its customers' receipts,
+           tier by tier, and flag links where more than 10% of claimed stock never arrives
         """
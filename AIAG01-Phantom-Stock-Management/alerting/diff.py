@@ -0,0 +1,73 @@
+"""
+Alert Diff
+What changed between two analysis runs: alerts and recommendations that are new,
+resolved or escalated, found by comparing hashed canonical keys
+"""
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+from alerting.lifecycle import SEVERITY_RANK, alert_type
+
+# Priority rank of a recommendation: a move up is an escalation
+PRIORITY_RANK = {"P1": 1, "P0": 2}
+
+# key hash -> (rank, alert or recommendation)
+Snapshot = Dict[int, Tuple[int, Dict]]
+
+
+def canonical_key(kind: str, item: Dict) -> str:
+    """Identity of an alert or recommendation across runs (ids and timestamps change every run)"""
+    if kind == "alert":
+        return f"alert|{alert_type(item)}|{item['supplier_id']}"
+    return f"recommendation|{item['supplier_id']}"
+
+
+def key_hash(key: str) -> int:
+    """64-bit hash of a canonical key, signed so it fits an SQLite integer"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def snapshot(alerts: Iterable[Dict], recommendations: Iterable[Dict] = ()) -> Snapshot:
+    """Hash every alert and recommendation of a run by its canonical key, keeping the highest rank"""
+    items: Snapshot = {}
+    for kind, entries, ranks, field in (("alert", alerts, SEVERITY_RANK, "severity"),
+                                        ("recommendation", recommendations, PRIORITY_RANK, "priority")):
+        for entry in entries:
+            rank = ranks.get(entry[field], 0)
+            key = key_hash(canonical_key(kind, entry))
+            if key not in items or rank > items[key][0]:
+                items[key] = (rank, {**entry, "kind": kind})
+    return items
+
+
+def _identity(item: Dict) -> Dict:
+    """Just enough of a resolved item to find it again"""
+    if item["kind"] == "alert":
+        return {"kind": "alert", "alert_id": item["alert_id"], "alert_type": alert_type(item),
+                "supplier_id": item["supplier_id"], "severity": item["severity"]}
+    return {"kind": "recommendation", "supplier_id": item["supplier_id"], "action": item["action"],
+            "priority": item["priority"]}
+
+
+def diff(previous: Snapshot, current: Snapshot) -> Dict:
+    """
+    Changes from one run's snapshot to another's, in one pass over each
+    new and escalated entries carry the current item (escalated ones with what
+    they escalated from); resolved entries carry the identity of the old item
+    """
+    new: List[Dict] = []
+    escalated: List[Dict] = []
+    for key, (rank, item) in current.items():
+        before = previous.get(key)
+        if before is None:
+            new.append(item)
+        elif rank > before[0]:
+            field = "severity" if item["kind"] == "alert" else "priority"
+            escalated.append({**item, "escalated_from": before[1][field]})
+    resolved = [_identity(item) for key, (_, item) in previous.items() if key not in current]
+    return {
+        "new": new,
+        "resolved": resolved,
+        "escalated": escalated,
+        "counts": {"new": len(new), "resolved": len(resolved), "escalated": len(escalated)}
+    }
@@ -0,0 +1,373 @@
+"""
+Alert Dispatch
+Asynchronous fan-out of supervisor alerts to delivery sinks (webhooks, files, ...) with
+per-sink batching, bounded buffers and retries, off the request path
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from storage.paths import data_path
+
+ALERT_SPILL_DIR = data_path("PHANTOM_ALERT_SPILL", "alert_spill")
+
+WORKERS = 2  # concurrent batches in flight per sink
+BATCH_SIZE = 50
+LINGER = 0.05  # seconds a worker waits for a partial batch to fill
+CAPACITY = 1000  # alerts buffered per sink
+MAX_RETRIES = 5
+RETRY_BASE = 0.5  # seconds; retry delays double from this, with full jitter
+RETRY_MAX = 30.0
+WEBHOOK_TIMEOUT = 10.0
+
+# What to do with an alert that arrives while a sink's buffer is full
+DROP_OLDEST, DROP_NEWEST, SPILL = "drop_oldest", "drop_newest", "spill"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, SPILL)
+
+
+class Sink(ABC):
+    """Delivery target; send() raises to have the batch retried"""
+
+    name = "sink"
+
+    @abstractmethod
+    async def send(self, alerts: List[Dict]) -> None:
+        """Deliver one batch of alerts"""
+        pass
+
+
+class FileSink(Sink):
+    """Appends alerts to a JSON-lines file"""
+
+    def __init__(self, path: str, name: Optional[str] = None):
+        self.path = path
+        self.name = name or f"file:{os.path.basename(path)}"
+
+    def _write(self, alerts: List[Dict]) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(alert, default=str) + "\n" for alert in alerts)
+
+    async def send(self, alerts: List[Dict]) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._write, alerts)
+
+
+class WebhookSink(Sink):
+    """POSTs each batch as {"alerts": [...]} JSON; any non-2xx response is a failure"""
+
+    def __init__(self, url: str, timeout: float = WEBHOOK_TIMEOUT, headers: Optional[Dict[str, str]] = None,
+                 name: Optional[str] = None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.name = name or f"webhook:{url}"
+
+    def _post(self, alerts: List[Dict]) -> None:
+        body = json.dumps({"alerts": alerts}, default=str).encode()
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()  # urlopen raises HTTPError for non-2xx statuses
+
+    async def send(self, alerts: List[Dict]) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._post, alerts)
+
+
+class SinkChannel:
+    """
+    Bounded buffer and delivery metrics of one sink
+
+    Lives on the dispatcher's event loop. With the spill policy, alerts that
+    do not fit are appended to a JSON-lines file and read back as the buffer
+    drains (and after a restart), so nothing is dropped for lack of room. A
+    batch that still fails after max_retries is counted as failed and
+    discarded under every policy.
+    """
+
+    def __init__(self, sink: Sink, workers: int = WORKERS, batch_size: int = BATCH_SIZE, linger: float = LINGER,
+                 capacity: int = CAPACITY, overflow: str = DROP_OLDEST, spill_path: Optional[str] = None,
+                 max_retries: int = MAX_RETRIES, retry_base: float = RETRY_BASE, retry_max: float = RETRY_MAX):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        if overflow == SPILL and spill_path is None:
+            raise ValueError("the spill policy needs a spill_path")
+        self.sink = sink
+        self.workers = workers
+        self.batch_size = batch_size
+        self.linger = linger
+        self.capacity = capacity
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.buffer: Deque[Tuple[float, Dict]] = deque()  # (enqueued at, alert)
+        self.spilled = 0
+        if spill_path is not None and os.path.exists(spill_path):
+            with open(spill_path) as f:
+                self.spilled = sum(1 for _ in f)
+        self.in_flight = 0
+        self.metrics = {"enqueued": 0, "sent": 0, "batches": 0, "retries": 0, "failed": 0, "dropped": 0,
+                        "spilled": 0, "max_latency": 0.0, "total_latency": 0.0, "last_error": None}
+        self._ready: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self.buffer) + self.spilled + self.in_flight
+
+    def start(self) -> None:
+        """Create the loop-bound events (called on the dispatcher's loop)"""
+        self._ready, self._idle = asyncio.Event(), asyncio.Event()
+        self._signal()
+
+    def _signal(self) -> None:
+        if self.buffer or self.spilled:
+            self._ready.set()
+        if self.pending:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    def enqueue(self, alerts: Sequence[Dict], now: float) -> None:
+        self.metrics["enqueued"] += len(alerts)
+        overflow = []
+        for alert in alerts:
+            if len(self.buffer) < self.capacity and not self.spilled:
+                self.buffer.append((now, alert))
+            elif self.overflow == DROP_OLDEST:
+                if self.buffer:
+                    self.buffer.popleft()
+                    self.buffer.append((now, alert))
+                self.metrics["dropped"] += 1
+            elif self.overflow == DROP_NEWEST:
+                self.metrics["dropped"] += 1
+            else:
+                overflow.append((now, alert))
+        if overflow:
+            self._spill(overflow)
+        self._signal()
+
+    def _spill(self, entries: List[Tuple[float, Dict]]) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+        with open(self.spill_path, "a") as f:
+            f.writelines(json.dumps({"enqueued_at": at, "alert": alert}, default=str) + "\n"
+                         for at, alert in entries)
+        self.spilled += len(entries)
+        self.metrics["spilled"] += len(entries)
+
+    def _refill(self) -> None:
+        """Move spilled alerts back into the buffer, oldest first, once it has drained"""
+        if not self.spilled or self.buffer:
+            return
+        with open(self.spill_path) as f:
+            entries = [json.loads(line) for line in f]
+        head, rest = entries[:self.capacity], entries[self.capacity:]
+        with open(self.spill_path, "w") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in rest)
+        self.buffer.extend((entry["enqueued_at"], entry["alert"]) for entry in head)
+        self.spilled = len(rest)
+
+    async def take(self) -> List[Tuple[float, Dict]]:
+        """Next batch: waits for an alert, then up to linger for the batch to fill"""
+        while True:
+            self._refill()
+            if not self.buffer:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            if len(self.buffer) < self.batch_size and self.linger > 0:
+                await asyncio.sleep(self.linger)
+                self._refill()
+            if self.buffer:  # another worker may have taken it meanwhile
+                break
+        batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+        self.in_flight += len(batch)
+        return batch
+
+    def _retry_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_base * 2 ** attempt, self.retry_max))
+
+    async def deliver(self, batch: List[Tuple[float, Dict]]) -> None:
+        alerts = [alert for _, alert in batch]
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await self.sink.send(alerts)
+                except Exception as e:
+                    self.metrics["last_error"] = f"{type(e).__name__}: {e}"
+                    if attempt == self.max_retries:
+                        self.metrics["failed"] += len(alerts)
+                        return
+                    self.metrics["retries"] += 1
+                    await asyncio.sleep(self._retry_delay(attempt))
+                else:
+                    now = time.time()
+                    latencies = [now - at for at, _ in batch]
+                    self.metrics["sent"] += len(alerts)
+                    self.metrics["batches"] += 1
+                    self.metrics["total_latency"] += sum(latencies)
+                    self.metrics["max_latency"] = max(self.metrics["max_latency"], max(latencies))
+                    return
+        except asyncio.CancelledError:
+            self.buffer.extendleft(reversed(batch))  # shutting down: keep the batch (it may be sent twice)
+            raise
+        finally:
+            self.in_flight -= len(batch)
+            self._signal()
+
+    def spill_buffer(self) -> None:
+        """Write buffered alerts ahead of the spill file (on shutdown) so they are sent after a restart"""
+        if self.overflow != SPILL or not self.buffer:
+            return
+        entries = list(self.buffer)
+        self.buffer.clear()
+        pending = []
+        if self.spilled:
+            with open(self.spill_path) as f:
+                pending = f.readlines()
+            os.remove(self.spill_path)
+            self.spilled = 0
+        self._spill(entries)
+        self.metrics["spilled"] -= len(entries)  # counts overflow only
+        with open(self.spill_path, "a") as f:
+            f.writelines(pending)
+        self.spilled += len(pending)
+
+    async def run(self) -> None:
+        while True:
+            await self.deliver(await self.take())
+
+    def snapshot(self) -> Dict:
+        metrics = dict(self.metrics)
+        total_latency = metrics.pop("total_latency")
+        metrics["mean_latency"] = round(total_latency / metrics["sent"], 4) if metrics["sent"] else None
+        metrics["max_latency"] = round(metrics["max_latency"], 4)
+        return {"sink": self.sink.name, "overflow": self.overflow, "buffered": len(self.buffer),
+                "spill_pending": self.spilled, "in_flight": self.in_flight, **metrics}
+
+
+class AlertDispatcher:
+    """
+    Fans alerts out to every registered sink from a background event loop
+
+    submit() is thread-safe and only schedules the alerts onto the loop, so a
+    slow or failing sink never blocks the caller. Each sink has its own
+    bounded buffer and pool of workers that take batches and retry failed
+    deliveries with exponential back-off and full jitter.
+    """
+
+    def __init__(self):
+        self.channels: List[SinkChannel] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def _start(self) -> None:
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="alert-dispatch", daemon=True)
+        self._thread.start()
+
+    def _call(self, coroutine, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    def add_sink(self, sink: Sink, **options) -> SinkChannel:
+        """Register a sink; options are SinkChannel's (workers, batch_size, overflow, ...)"""
+        channel = SinkChannel(sink, **options)
+        self._start()
+
+        async def start():
+            channel.start()
+            self._tasks.extend(asyncio.ensure_future(channel.run()) for _ in range(channel.workers))
+
+        self._call(start())
+        self.channels.append(channel)
+        return channel
+
+    def submit(self, alerts: Sequence[Dict]) -> None:
+        """Queue alerts for every sink without waiting for delivery"""
+        if not alerts or not self.channels:
+            return
+        alerts, now = list(alerts), time.time()
+        for channel in self.channels:
+            self._loop.call_soon_threadsafe(channel.enqueue, alerts, now)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued alert is delivered or given up on; False on timeout"""
+        if not self.channels:
+            return True
+
+        async def drained():
+            await asyncio.sleep(0)  # let already scheduled submits land first
+            await asyncio.gather(*(channel._idle.wait() for channel in self.channels))
+
+        try:
+            self._call(asyncio.wait_for(drained(), timeout))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def metrics(self) -> List[Dict]:
+        if not self.channels:
+            return []
+
+        async def snapshot():
+            return [channel.snapshot() for channel in self.channels]
+
+        return self._call(snapshot())
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        Flush (up to timeout) and stop the loop; alerts still queued for a
+        spilling sink are written to its spill file, other sinks lose them
+        """
+        if self._loop is None:
+            return True
+        flushed = self.flush(timeout)
+
+        async def cancel():
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            for channel in self.channels:
+                channel.spill_buffer()
+
+        self._call(cancel())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop, self._thread, self._tasks = None, None, []
+        self.channels = []
+        return flushed
+
+
+def dispatcher_from_env(spill_dir: Optional[str] = ALERT_SPILL_DIR) -> AlertDispatcher:
+    """
+    Dispatcher with the sinks named in the environment:
+    PHANTOM_ALERT_WEBHOOKS (comma-separated URLs) and PHANTOM_ALERT_FILE (a JSON-lines path)
+    Webhook overflow spills to spill_dir (None drops the oldest alerts instead)
+    """
+    dispatcher = AlertDispatcher()
+    urls = [url for url in os.environ.get("PHANTOM_ALERT_WEBHOOKS", "").split(",") if url.strip()]
+    for url in urls:
+        url, options = url.strip(), {}
+        if spill_dir is not None:
+            # Spill files are named after the URL so they survive reordering the list
+            spill_name = f"webhook-{hashlib.sha1(url.encode()).hexdigest()[:12]}.jsonl"
+            options = {"overflow": SPILL, "spill_path": os.path.join(spill_dir, spill_name)}
+        dispatcher.add_sink(WebhookSink(url), **options)
+    if os.environ.get("PHANTOM_ALERT_FILE"):
+        dispatcher.add_sink(FileSink(os.environ["PHANTOM_ALERT_FILE"]))
+    return dispatcher
@@ -0,0 +1,280 @@
+"""
+Alert Lifecycle
+Open / acknowledged / resolved state per (supplier, alert type), so repeated analysis
+runs only surface alerts that are new, changed or due for a reminder
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from storage.paths import data_path
+
+ALERT_STATE_PATH = data_path("PHANTOM_ALERT_STATE", "alert_state.sqlite")
+
+OPEN, ACKNOWLEDGED, RESOLVED = "open", "acknowledged", "resolved"
+
+# Severity rank: a move up is an escalation
+SEVERITY_RANK = {"WARNING": 1, "HIGH": 2, "CRITICAL": 3}
+
+RENOTIFY_AFTER = timedelta(hours=1)  # first reminder for an alert that stays open
+RENOTIFY_MAX = timedelta(hours=24)  # reminders back off by doubling up to this
+ACK_TTL = timedelta(hours=24)  # an acknowledgement silences reminders this long
+RESOLVED_TTL = timedelta(days=7)  # resolved alerts are forgotten after this
+PERSIST_INTERVAL = timedelta(seconds=60)
+
+
+def alert_type(alert: Dict) -> str:
+    """Lifecycle type of a supervisor alert: data quality or phantom stock risk"""
+    return "data_quality" if alert["alert_id"].startswith("ALERT-DQ-") else "phantom_stock"
+
+
+class AlertState:
+    """Lifecycle of one (supplier, alert type) key"""
+
+    FIELDS = ("supplier_id", "alert_type", "alert_id", "status", "severity", "episode", "opened_at",
+              "last_seen", "last_notified", "notify_count", "next_notify", "acknowledged_at", "resolved_at", "alert")
+    TIMES = ("opened_at", "last_seen", "last_notified", "next_notify", "acknowledged_at", "resolved_at")
+
+    def __init__(self, supplier_id: str, alert_type: str, alert_id: str, severity: str, now: datetime,
+                 episode: int = 1):
+        self.supplier_id = supplier_id
+        self.alert_type = alert_type
+        self.alert_id = alert_id
+        self.status = OPEN
+        self.severity = severity
+        self.episode = episode
+        self.opened_at = now
+        self.last_seen = now
+        self.last_notified: Optional[datetime] = None
+        self.notify_count = 0
+        self.next_notify: Optional[datetime] = None
+        self.acknowledged_at: Optional[datetime] = None
+        self.resolved_at: Optional[datetime] = None
+        self.alert: Dict = {}  # latest alert raised for this key
+
+    def lifecycle(self) -> Dict:
+        """Lifecycle fields attached to alerts"""
+        return {
+            "status": self.status,
+            "opened_at": self.opened_at.isoformat(),
+            "notify_count": self.notify_count,
+            "next_notify": None if self.next_notify is None else self.next_notify.isoformat()
+        }
+
+    def to_dict(self) -> Dict:
+        state = {field: getattr(self, field) for field in self.FIELDS}
+        for field in self.TIMES:
+            if state[field] is not None:
+                state[field] = state[field].isoformat()
+        return state
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> "AlertState":
+        restored = cls.__new__(cls)
+        for field in cls.FIELDS:
+            value = state[field]
+            setattr(restored, field, datetime.fromisoformat(value) if field in cls.TIMES and value else value)
+        return restored
+
+
+class AlertLifecycle:
+    """
+    Hashed table of alert states keyed by (supplier_id, alert type)
+
+    observe() takes every alert a run produced and returns only those worth
+    sending: new keys, reopened keys, severity changes, and reminders for keys
+    still open once their back-off (doubling from renotify_after up to
+    renotify_max) has passed. An acknowledged key stays silent for ack_ttl
+    unless it escalates. Keys missing from a run are resolved.
+
+    With a path the table is written to SQLite at most every persist_interval
+    (only the keys that changed) and loaded again at startup.
+    """
+
+    def __init__(self, path: Optional[str] = None, renotify_after: timedelta = RENOTIFY_AFTER,
+                 renotify_max: timedelta = RENOTIFY_MAX, ack_ttl: timedelta = ACK_TTL,
+                 resolved_ttl: timedelta = RESOLVED_TTL, persist_interval: timedelta = PERSIST_INTERVAL):
+        self.path = path
+        self.renotify_after = renotify_after
+        self.renotify_max = renotify_max
+        self.ack_ttl = ack_ttl
+        self.resolved_ttl = resolved_ttl
+        self.persist_interval = persist_interval
+        self.states: Dict[Tuple[str, str], AlertState] = {}
+        self._by_alert_id: Dict[str, Tuple[str, str]] = {}
+        self._dirty = set()
+        self._deleted = set()
+        self._persisted_at: Optional[datetime] = None
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def _backoff(self, notify_count: int) -> timedelta:
+        return min(self.renotify_after * 2 ** max(notify_count - 1, 0), self.renotify_max)
+
+    def _notify(self, state: AlertState, now: datetime) -> None:
+        state.notify_count += 1
+        state.last_notified = now
+        state.next_notify = now + self._backoff(state.notify_count)
+
+    def _open(self, key: Tuple[str, str], alert: Dict, now: datetime, episode: int) -> AlertState:
+        alert_id = alert["alert_id"]
+        previous = self.states.get(key)
+        if previous is not None and previous.alert_id == alert_id:
+            alert_id = f"{alert_id}-{episode}"  # reopened within the same second
+        if previous is not None:
+            self._by_alert_id.pop(previous.alert_id, None)
+        state = AlertState(key[0], key[1], alert_id, alert["severity"], now, episode)
+        self.states[key] = state
+        self._by_alert_id[alert_id] = key
+        return state
+
+    def observe(self, alerts: List[Dict], now: Optional[datetime] = None) -> Dict:
+        """
+        Fold one run's alerts into the table
+        Returns the alerts to send (each tagged with its lifecycle event), the
+        alert ids resolved by this run, and how many alerts were suppressed
+        """
+        now = now or datetime.now()
+        # One alert per key: the most severe of the run
+        latest: Dict[Tuple[str, str], Dict] = {}
+        for alert in alerts:
+            key = (alert["supplier_id"], alert_type(alert))
+            current = latest.get(key)
+            if current is None or SEVERITY_RANK.get(alert["severity"], 0) > SEVERITY_RANK.get(current["severity"], 0):
+                latest[key] = alert
+
+        send, suppressed = [], 0
+        for key, alert in latest.items():
+            state = self.states.get(key)
+            if state is None or state.status == RESOLVED:
+                event = "new" if state is None else "reopened"
+                state = self._open(key, alert, now, 1 if state is None else state.episode + 1)
+            else:
+                rank = SEVERITY_RANK.get(alert["severity"], 0) - SEVERITY_RANK.get(state.severity, 0)
+                if state.status == ACKNOWLEDGED and state.acknowledged_at + self.ack_ttl <= now:
+                    state.status = OPEN  # the acknowledgement has expired
+                if rank > 0:
+                    event, state.status = "escalated", OPEN
+                elif rank < 0:
+                    event = "downgraded"
+                elif state.status == OPEN and state.next_notify <= now:
+                    event = "reminder"
+                else:
+                    event = None
+                state.severity = alert["severity"]
+            state.last_seen = now
+            state.alert = {**alert, "alert_id": state.alert_id}
+            self._dirty.add(key)
+            if event is None:
+                suppressed += 1
+                continue
+            self._notify(state, now)
+            send.append({**state.alert, "lifecycle": {"event": event, **state.lifecycle()}})
+
+        resolved = []
+        for key, state in list(self.states.items()):
+            if key in latest:
+                continue
+            if state.status != RESOLVED:
+                state.status, state.resolved_at = RESOLVED, now
+                resolved.append(state.alert_id)
+                self._dirty.add(key)
+            elif state.resolved_at + self.resolved_ttl <= now:
+                self._forget(key)
+        self.maybe_persist(now)
+        return {"alerts": send, "resolved": resolved, "suppressed": suppressed}
+
+    def _forget(self, key: Tuple[str, str]) -> None:
+        state = self.states.pop(key)
+        self._by_alert_id.pop(state.alert_id, None)
+        self._dirty.discard(key)
+        self._deleted.add(key)
+
+    def get(self, alert_id: str) -> Optional[AlertState]:
+        key = self._by_alert_id.get(alert_id)
+        return None if key is None else self.states[key]
+
+    def acknowledge(self, alert_id: str, now: Optional[datetime] = None) -> Optional[AlertState]:
+        """Silence reminders for an open alert for ack_ttl; None if the alert is unknown"""
+        state = self.get(alert_id)
+        if state is None:
+            return None
+        if state.status != RESOLVED:
+            state.status, state.acknowledged_at = ACKNOWLEDGED, now or datetime.now()
+            self._dirty.add((state.supplier_id, state.alert_type))
+        return state
+
+    def resolve(self, alert_id: str, now: Optional[datetime] = None) -> Optional[AlertState]:
+        """Close an alert by hand; it reopens (as a new episode) if a later run raises it again"""
+        state = self.get(alert_id)
+        if state is None:
+            return None
+        if state.status != RESOLVED:
+            state.status, state.resolved_at = RESOLVED, now or datetime.now()
+            self._dirty.add((state.supplier_id, state.alert_type))
+        return state
+
+    def active(self) -> List[Dict]:
+        """Latest alert of every open or acknowledged key, with its lifecycle"""
+        return [{**state.alert, "lifecycle": state.lifecycle()}
+                for state in self.states.values() if state.status != RESOLVED]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {OPEN: 0, ACKNOWLEDGED: 0, RESOLVED: 0}
+        for state in self.states.values():
+            counts[state.status] += 1
+        return counts
+
+    def maybe_persist(self, now: Optional[datetime] = None) -> bool:
+        """Write changed keys if persist_interval has passed since the last write"""
+        now = now or datetime.now()
+        if self.path is None or (self._persisted_at is not None and now - self._persisted_at < self.persist_interval):
+            return False
+        self.flush()
+        self._persisted_at = now
+        return True
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS alert_state ("
+            "supplier_id TEXT NOT NULL, alert_type TEXT NOT NULL, state TEXT NOT NULL, "
+            "PRIMARY KEY (supplier_id, alert_type))"
+        )
+        return connection
+
+    def flush(self) -> None:
+        """Write every changed key now"""
+        if self.path is None or not (self._dirty or self._deleted):
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO alert_state (supplier_id, alert_type, state) VALUES (?, ?, ?)",
+                    [(key[0], key[1], json.dumps(self.states[key].to_dict())) for key in self._dirty],
+                )
+                connection.executemany(
+                    "DELETE FROM alert_state WHERE supplier_id = ? AND alert_type = ?", list(self._deleted)
+                )
+        finally:
+            connection.close()
+        self._dirty.clear()
+        self._deleted.clear()
+
+    def _load(self) -> None:
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT supplier_id, alert_type, state FROM alert_state").fetchall()
+        finally:
+            connection.close()
+        for supplier_id, kind, state in rows:
+            restored = AlertState.from_dict(json.loads(state))
+            self.states[(supplier_id, kind)] = restored
+            self._by_alert_id[restored.alert_id] = (supplier_id, kind)
@@ -0,0 +1,79 @@
+"""
+Anomaly Roll-up
+Groups flagged records by (supplier, issue) so alert volume scales with suppliers, not records
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from analytics.rules import QualityReport, parse_dates
+from simulation.columnar import InventoryColumns
+
+MAX_SAMPLES = 3
+
+
+def _date_labels(dates: np.ndarray) -> List[Optional[str]]:
+    return [None if label == "NaT" else label for label in dates.astype(str).tolist()]
+
+
+def rollup_anomalies(quality: QualityReport, supplier_codes: np.ndarray, supplier_ids: Sequence[str],
+                     dates: Optional[np.ndarray] = None, max_samples: int = MAX_SAMPLES) -> List[Dict]:
+    """
+    One entry per (supplier, issue) with the record count, first/last seen date
+    and the indexes of up to max_samples sample records
+
+    supplier_codes maps each record to an index into supplier_ids. Grouping is
+    done with a stable sort per rule, so the cost is O(flagged log flagged)
+    and no per-record dicts are built.
+    """
+    groups = []
+    for bit, issue in enumerate(quality.rule_names):
+        rows = np.flatnonzero(quality.flags >> bit & 1)
+        if not len(rows):
+            continue
+        order = np.argsort(supplier_codes[rows], kind="stable")
+        rows = rows[order]
+        codes = supplier_codes[rows]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        counts = np.diff(np.r_[starts, len(rows)])
+        if dates is not None:
+            seen = dates[rows]
+            first_seen = _date_labels(np.fmin.reduceat(seen, starts))
+            last_seen = _date_labels(np.fmax.reduceat(seen, starts))
+        else:
+            first_seen = last_seen = [None] * len(starts)
+        for start, count, first, last in zip(starts.tolist(), counts.tolist(), first_seen, last_seen):
+            groups.append((int(codes[start]), bit, {
+                "supplier_id": supplier_ids[int(codes[start])],
+                "issue": issue,
+                "count": count,
+                "first_seen": first,
+                "last_seen": last,
+                "sample_records": rows[start:start + min(count, max_samples)].tolist(),
+            }))
+    # Supplier order, then rule order within a supplier
+    groups.sort(key=lambda group: group[:2])
+    return [group for _, _, group in groups]
+
+
+def rollup_records(quality: QualityReport, records: List[Dict], max_samples: int = MAX_SAMPLES) -> List[Dict]:
+    """Roll up anomalies for legacy record dicts (sample references are record indexes)"""
+    supplier_ids, codes = np.unique(
+        np.array([str(record.get("supplier_id")) for record in records], dtype=object), return_inverse=True
+    )
+    dates, _ = parse_dates([record.get("date") for record in records])  # unparsable dates count as unknown
+    return rollup_anomalies(quality, codes, supplier_ids.tolist(), dates, max_samples)
+
+
+def rollup_columns(quality: QualityReport, inventory: InventoryColumns,
+                   max_samples: int = MAX_SAMPLES) -> List[Dict]:
+    """Roll up anomalies for columnar inventory data (sample references are row indexes)"""
+    return rollup_anomalies(quality, inventory.supplier_code, inventory.catalog.ids, inventory.dates, max_samples)
+
+
+def group_by_supplier(anomalies: List[Dict]) -> Dict[str, List[Dict]]:
+    """Rolled-up anomalies keyed by supplier, in first-appearance order"""
+    by_supplier = {}
+    for anomaly in anomalies:
+        by_supplier.setdefault(anomaly["supplier_id"], []).append(anomaly)
+    return by_supplier
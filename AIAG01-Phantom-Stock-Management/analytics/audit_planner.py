@@ -0,0 +1,200 @@
+"""
+Audit Planner
+Schedules the supervisor's audit recommendations into the auditor capacity of each
+region and day: immediate audits first, then highest value per auditor-slot
+"""
+import heapq
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Auditor time an action takes, in quarter-day slots
+AUDIT_SLOTS = {"IMMEDIATE_AUDIT": 4, "INCREASE_MONITORING": 1}
+SLOTS_PER_AUDITOR = 4
+# Value weight of each action (an immediate audit of the same risk is worth more)
+ACTION_WEIGHTS = {"IMMEDIATE_AUDIT": 2.0, "INCREASE_MONITORING": 1.0}
+# Scheduling order of each action: increased monitoring is a short review that only
+# gets the auditor time left once every immediate audit that fits is on the plan
+ACTION_PRIORITY = {"IMMEDIATE_AUDIT": 0, "INCREASE_MONITORING": 1}
+IMPACT_WEIGHT = 0.5  # extra value per log-unit of downstream suppliers affected
+PLAN_DAYS = 7
+DEFAULT_REGION = "all"
+
+
+def audit_values(actions: Sequence[str], risk_scores, downstream) -> np.ndarray:
+    """Value of auditing each candidate: action weight x risk, raised by its downstream reach"""
+    weights = np.array([ACTION_WEIGHTS[action] for action in actions])
+    risk = np.asarray(risk_scores, dtype=np.float64)
+    reach = np.log1p(np.asarray(downstream, dtype=np.float64))
+    return weights * risk * (1 + IMPACT_WEIGHT * reach)
+
+
+class AuditPlanner:
+    """
+    Greedy knapsack of audit candidates into per-region, per-day auditor slots
+
+    Every supplier is one candidate (its latest recommendation), valued by
+    audit_values() and costing AUDIT_SLOTS of auditor time. Each region keeps
+    heaps of its candidates by action priority, then value per slot (one per
+    cost); planning a region pops the best candidate across them and puts it on
+    the earliest day with room, until no remaining cost fits. Ranking by value
+    density alone would let cheap monitoring crowd out critical audits, so every
+    immediate audit is placed before any monitoring, the best candidates get the
+    earliest days and a plan only reads the tops of the heaps. Adding or removing
+    candidates marks just their regions for re-planning; replaced entries are
+    skipped when popped and the heaps are rebuilt once stale entries pile up.
+    """
+
+    def __init__(self, auditors: Optional[Dict[str, int]] = None, default_auditors: int = 1,
+                 days: int = PLAN_DAYS, slots_per_auditor: int = SLOTS_PER_AUDITOR):
+        self.auditors = dict(auditors or {})
+        self.default_auditors = default_auditors
+        self.days = days
+        self.slots_per_auditor = slots_per_auditor
+        # supplier_id -> (sequence, region, action, risk_score, downstream, value, cost)
+        self.candidates: Dict[str, Tuple] = {}
+        # region -> audit cost -> heap of (action priority, -value per slot, sequence, supplier_id)
+        self._heaps: Dict[str, Dict[int, List[Tuple[int, float, int, str]]]] = {}
+        self._stale = 0  # heap entries of replaced or removed candidates
+        self._plans: Dict[str, List[Tuple[int, str]]] = {}  # region -> [(day, supplier_id)] in rank order
+        self._dirty = set()
+        self._sequence = 0
+        self.replanned: List[str] = []  # regions re-planned by the last plan()
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def day_slots(self, region: str) -> int:
+        return self.auditors.get(region, self.default_auditors) * self.slots_per_auditor
+
+    def add(self, supplier_ids: Sequence[str], actions: Sequence[str], risk_scores, downstream,
+            regions: Optional[Sequence[str]] = None) -> None:
+        """Add or replace candidates (one per supplier; a later entry replaces an earlier one)"""
+        values = audit_values(actions, risk_scores, downstream)
+        risk_scores = np.asarray(risk_scores, dtype=np.float64).tolist()
+        downstream = np.asarray(downstream).tolist()
+        regions = regions if regions is not None else [DEFAULT_REGION] * len(supplier_ids)
+        for supplier_id, action, risk, reach, value, region in zip(
+                supplier_ids, actions, risk_scores, downstream, values.tolist(), regions):
+            previous = self.candidates.get(supplier_id)
+            if previous is not None:
+                self._dirty.add(previous[1])
+                self._stale += 1
+            self._sequence += 1
+            self.candidates[supplier_id] = (self._sequence, region, action, risk, reach, value, AUDIT_SLOTS[action])
+            self._dirty.add(region)
+        if self._stale > len(self.candidates) + 1024:
+            self._rebuild(self.candidates)
+        else:
+            self._rebuild({supplier_id: self.candidates[supplier_id] for supplier_id in supplier_ids}, push=True)
+
+    def _rebuild(self, candidates: Dict[str, Tuple], push: bool = False) -> None:
+        """Heap entries for candidates: pushed onto the existing heaps, or replacing them (dropping stale entries)"""
+        entries: Dict[Tuple[str, int], List[Tuple[int, float, int, str]]] = {}
+        for supplier_id, (sequence, region, action, _, _, value, cost) in candidates.items():
+            entries.setdefault((region, cost), []).append(
+                (ACTION_PRIORITY[action], -value / cost, sequence, supplier_id)
+            )
+        if not push:
+            self._heaps, self._stale = {}, 0
+        for (region, cost), new in entries.items():
+            heap = self._heaps.setdefault(region, {}).setdefault(cost, [])
+            if len(new) * 4 > len(heap):
+                heap.extend(new)
+                heapq.heapify(heap)
+            else:
+                for entry in new:
+                    heapq.heappush(heap, entry)
+
+    def remove(self, supplier_ids: Iterable[str]) -> None:
+        """Drop candidates (e.g. audited, or no longer at risk)"""
+        for supplier_id in supplier_ids:
+            previous = self.candidates.pop(supplier_id, None)
+            if previous is not None:
+                self._dirty.add(previous[1])
+                self._stale += 1
+
+    def _head(self, heap: List[Tuple[int, float, int, str]]) -> Optional[Tuple[int, float, int, str]]:
+        """Best live entry of a heap, discarding replaced or removed ones on the way"""
+        while heap:
+            supplier_id = heap[0][3]
+            candidate = self.candidates.get(supplier_id)
+            if candidate is not None and candidate[0] == heap[0][2]:
+                return heap[0]
+            heapq.heappop(heap)
+            self._stale -= 1
+        return None
+
+    def _plan_region(self, region: str) -> None:
+        # One heap per cost: once a cost no longer fits any day, none of its heap does
+        heaps = dict(self._heaps.get(region, {}))
+        remaining = [self.day_slots(region)] * self.days
+        plan, popped = [], []
+        while heaps:
+            best, most = None, max(remaining)
+            for cost in list(heaps):
+                head = self._head(heaps[cost])
+                if head is None or cost > most:
+                    del heaps[cost]
+                elif best is None or head < heaps[best][0]:
+                    best = cost
+            if best is None:
+                break
+            entry = heapq.heappop(heaps[best])
+            popped.append((best, entry))
+            day = next(day for day in range(self.days) if remaining[day] >= best)
+            remaining[day] -= best
+            plan.append((day, entry[3]))
+        # Scheduled candidates stay candidates for the next re-plan
+        for cost, entry in popped:
+            heapq.heappush(self._heaps[region][cost], entry)
+        plan.sort(key=lambda item: item[0])  # by day, keeping priority and value order within a day
+        self._plans[region] = plan
+
+    def plan(self) -> None:
+        """Re-plan the regions whose candidates changed since the last plan"""
+        self.replanned = sorted(self._dirty)
+        for region in self.replanned:
+            self._plan_region(region)
+        self._dirty.clear()
+
+    def schedule(self, start: Optional[date] = None, limit: Optional[int] = None) -> List[Dict]:
+        """The planned audits, ranked by day, action priority, then value per slot, with their calendar dates"""
+        if self._dirty:
+            self.plan()
+        start = start or date.today()
+        planned = []
+        for region, plan in self._plans.items():
+            for day, supplier_id in plan:
+                sequence, _, action, _, _, value, cost = self.candidates[supplier_id]
+                planned.append((day, ACTION_PRIORITY[action], -value / cost, sequence, region, supplier_id))
+        planned.sort()
+        records = []
+        for rank, (day, _, _, _, region, supplier_id) in enumerate(planned[:limit], start=1):
+            _, _, action, risk, reach, value, cost = self.candidates[supplier_id]
+            records.append({
+                "rank": rank,
+                "date": (start + timedelta(days=day)).isoformat(),
+                "region": region,
+                "supplier_id": supplier_id,
+                "action": action,
+                "risk_score": risk,
+                "downstream_suppliers": reach,
+                "value": round(value, 2),
+                "auditor_slots": cost
+            })
+        return records
+
+    def summary(self) -> Dict:
+        if self._dirty:
+            self.plan()
+        scheduled = sum(len(plan) for plan in self._plans.values())
+        regions = set(self._plans) | {candidate[1] for candidate in self.candidates.values()}
+        return {
+            "candidates": len(self.candidates),
+            "scheduled": scheduled,
+            "unscheduled": len(self.candidates) - scheduled,
+            "days": self.days,
+            "slots_per_day": {region: self.day_slots(region) for region in sorted(regions)}
+        }
@@ -0,0 +1,177 @@
+"""
+Online Stock Forecasting
+Per-supplier Holt linear-trend forecasters with additive weekly seasonality,
+updated in O(1) per supplier-day and cheap to checkpoint
+
+The models are fitted on the expected_stock the records already carry, so they
+smooth and extend that baseline (predictions, dates past the data) rather than
+replace it: deviation checks still compare reported stock with the record's own
+expected_stock.
+"""
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from analytics.rules import parse_dates
+from simulation.columnar import InventoryColumns
+from storage.paths import data_path
+from storage.supplier_codes import SupplierCodes
+
+SEASON_LENGTH = 7  # weekly seasonality on daily data
+
+FORECAST_STATE = data_path("PHANTOM_FORECAST_STATE", "forecaster.npz")
+
+
+def day_numbers(dates: Sequence[str]) -> np.ndarray:
+    """ISO date strings as days since the epoch"""
+    return np.array(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+class SupplierForecaster:
+    """
+    Holt's linear trend with additive seasonality, one model per supplier
+
+    State is a level, a per-day trend, one seasonal term per weekday, the last
+    observed day and an observation count, held as arrays indexed by supplier.
+    A new supplier-day updates that supplier's state in O(1); supplier-days at
+    or before the last observed day are ignored, so re-ingesting a window that
+    was already seen does not refit or double count.
+    """
+
+    def __init__(self, alpha: float = 0.3, beta: float = 0.05, gamma: float = 0.1,
+                 season_length: int = SEASON_LENGTH, capacity: int = 16):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.season_length = season_length
+        self.registry = SupplierCodes()
+        self.supplier_ids = self.registry.ids  # supplier id of each internal code
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self.level = np.zeros(capacity)
+        self.trend = np.zeros(capacity)
+        self.season = np.zeros((capacity, self.season_length))
+        self.last_day = np.zeros(capacity, dtype=np.int64)
+        self.observations = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.supplier_ids)
+
+    def supplier_codes(self, supplier_ids: Sequence[str], register: bool = True) -> np.ndarray:
+        """Internal codes for supplier ids; unknown ids get -1 unless registered"""
+        codes = self.registry.codes(supplier_ids, register)
+        capacity = len(self.level)
+        if len(self.supplier_ids) > capacity:
+            old = (self.level, self.trend, self.season, self.last_day, self.observations)
+            self._allocate(max(len(self.supplier_ids), capacity * 2))
+            self.level[:capacity], self.trend[:capacity], self.season[:capacity] = old[:3]
+            self.last_day[:capacity], self.observations[:capacity] = old[3:]
+        return codes
+
+    def _step(self, codes: np.ndarray, day: int, values: np.ndarray) -> None:
+        """Fold one day of observations (one per supplier) into the models"""
+        slot = day % self.season_length
+        fresh = self.observations[codes] == 0
+        if fresh.any():
+            new = codes[fresh]
+            self.level[new] = values[fresh]
+            self.trend[new] = 0.0
+            self.season[new] = 0.0
+        active = ~fresh & (day > self.last_day[codes])
+        if active.any():
+            rows, y = codes[active], values[active]
+            gap = (day - self.last_day[rows]).astype(np.float64)
+            level, trend, season = self.level[rows], self.trend[rows], self.season[rows, slot]
+            new_level = self.alpha * (y - season) + (1 - self.alpha) * (level + trend * gap)
+            self.trend[rows] = self.beta * (new_level - level) / gap + (1 - self.beta) * trend
+            self.season[rows, slot] = self.gamma * (y - new_level) + (1 - self.gamma) * season
+            self.level[rows] = new_level
+        updated = fresh | active
+        self.last_day[codes[updated]] = day
+        self.observations[codes[updated]] += 1
+
+    def update(self, codes: np.ndarray, days: np.ndarray, values: np.ndarray) -> None:
+        """Fold observations (internal codes, days since epoch, values) in day order"""
+        if not len(codes):
+            return
+        order = np.argsort(days, kind="stable")
+        codes, days = codes[order], days[order]
+        values = np.asarray(values, dtype=np.float64)[order]
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(days)]):
+            day_codes, day_values = codes[start:stop], values[start:stop]
+            # Keep the last observation when a supplier repeats within a day
+            _, last = np.unique(day_codes[::-1], return_index=True)
+            keep = len(day_codes) - 1 - last
+            self._step(day_codes[keep], int(days[start]), day_values[keep])
+
+    def update_records(self, records: List[Dict], field: str = "expected_stock") -> None:
+        """Fold legacy record dicts (supplier_id, date, field) into the models (undated or unparsable dates are skipped)"""
+        records = [record for record in records if record.get(field) is not None]
+        days, _ = parse_dates([record.get("date") for record in records])
+        dated = np.flatnonzero(~np.isnat(days))
+        records = [records[row] for row in dated.tolist()]
+        codes = self.supplier_codes([record["supplier_id"] for record in records])
+        self.update(codes, days[dated].astype(np.int64),
+                    np.array([record[field] for record in records], dtype=np.float64))
+
+    def update_columns(self, inventory: InventoryColumns, field: str = "expected_stock") -> None:
+        """Fold columnar inventory data into the models"""
+        present, inverse = np.unique(inventory.supplier_code, return_inverse=True)
+        codes = self.supplier_codes([inventory.catalog.ids[int(code)] for code in present.tolist()])[inverse]
+        days = np.datetime64(inventory.base_date, "D").astype(np.int64) - inventory.day_offset.astype(np.int64)
+        self.update(codes, days, getattr(inventory, field))
+
+    def forecast(self, codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """
+        Forecasts for (supplier, day) pairs; NaN for suppliers without history
+        The state only describes the end of the fitted window, so days before a
+        supplier's last observed day are not back-extrapolated along the trend:
+        they get the current level plus that weekday's seasonal term.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        known = codes >= 0
+        known[known] = self.observations[codes[known]] > 0
+        result = np.full(len(codes), np.nan)
+        rows, target = codes[known], np.asarray(days, dtype=np.int64)[known]
+        horizon = np.maximum(target - self.last_day[rows], 0)
+        result[known] = (self.level[rows] + self.trend[rows] * horizon
+                         + self.season[rows, target % self.season_length])
+        return result
+
+    def forecast_one(self, supplier_id: str, date: str) -> Optional[float]:
+        """Forecast for one supplier and date, or None without history or a parsable date"""
+        code = self.registry.get(supplier_id)
+        days, _ = parse_dates([date])
+        if code is None or not self.observations[code] or np.isnat(days[0]):
+            return None
+        return float(self.forecast(np.array([code]), days.astype(np.int64))[0])
+
+    def save(self, path: str) -> None:
+        """Checkpoint the model state to an .npz file (written atomically)"""
+        n = len(self.supplier_ids)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(
+                f,
+                params=np.array([self.alpha, self.beta, self.gamma, self.season_length]),
+                supplier_ids=np.array(self.supplier_ids, dtype=str),
+                level=self.level[:n], trend=self.trend[:n], season=self.season[:n],
+                last_day=self.last_day[:n], observations=self.observations[:n],
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SupplierForecaster":
+        """Restore a forecaster checkpointed with save()"""
+        with np.load(path) as state:
+            alpha, beta, gamma, season_length = state["params"].tolist()
+            forecaster = cls(alpha, beta, gamma, int(season_length), capacity=max(len(state["level"]), 1))
+            forecaster.supplier_codes(state["supplier_ids"].tolist())
+            n = len(forecaster.supplier_ids)
+            for name in ("level", "trend", "season", "last_day", "observations"):
+                getattr(forecaster, name)[:n] = state[name]
+        return forecaster
@@ -0,0 +1,246 @@
+"""
+Windowed Logistics Analytics
+Per-supplier rolling shipment statistics (on-time rate, mean/p95 delay, delay trend)
+kept incrementally over fixed day windows
+"""
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from analytics.rules import parse_dates
+from simulation.columnar import ShipmentColumns
+from storage.supplier_codes import SupplierCodes
+
+WINDOWS = (7, 30, 90)
+DELAY_BINS = 16  # delay histogram: one bin per day 0..14, last bin holds 15+ days
+TOTALS = ("count", "on_time", "delay", "t", "tt", "td")
+
+
+def _value(value):
+    """JSON-friendly statistic: NaN (undefined, e.g. no shipments) becomes None"""
+    return None if value != value else value
+
+
+class ShipmentWindows:
+    """
+    Rolling per-supplier shipment statistics over day windows ending at the latest shipment day
+
+    Each supplier keeps a ring of per-day buckets (shipment count, on-time count,
+    delay sum, delay histogram) covering the longest window, plus running totals
+    per window. Adding a shipment touches one bucket and the running totals, and
+    advancing the clock subtracts each expiring bucket once, so the cost per
+    shipment is O(1) amortized and history is never rescanned.
+    """
+
+    def __init__(self, windows: Sequence[int] = WINDOWS, on_time_days: int = 0, capacity: int = 16):
+        self.windows = tuple(sorted(windows))
+        self.horizon = self.windows[-1]
+        self.on_time_days = on_time_days
+        self.registry = SupplierCodes()
+        self.supplier_ids = self.registry.ids  # supplier id of each internal code
+        self.day: Optional[int] = None  # latest shipment day (days since epoch)
+        self.origin: Optional[int] = None
+        self.dropped = 0  # shipments older than the longest window when they arrived
+        self.undated = 0  # shipments skipped for a missing or unparsable arrival date
+        self._catalog = None
+        self._catalog_codes = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        # Day- and window-major layout: the slices touched when a day expires are contiguous
+        n_windows = len(self.windows)
+        self.ring_count = np.zeros((self.horizon, capacity), dtype=np.int32)
+        self.ring_on_time = np.zeros((self.horizon, capacity), dtype=np.int32)
+        self.ring_delay = np.zeros((self.horizon, capacity), dtype=np.float64)
+        self.ring_hist = np.zeros((self.horizon, capacity, DELAY_BINS), dtype=np.uint16)
+        self.totals = {name: np.zeros((n_windows, capacity), dtype=np.float64) for name in TOTALS}
+        self.hist = np.zeros((n_windows, capacity, DELAY_BINS), dtype=np.int64)
+
+    def _grow(self, needed: int) -> None:
+        capacity = self.ring_count.shape[1]
+        if needed <= capacity:
+            return
+        old = (self.ring_count, self.ring_on_time, self.ring_delay, self.ring_hist, self.totals, self.hist)
+        self._allocate(max(needed, capacity * 2))
+        self.ring_count[:, :capacity], self.ring_on_time[:, :capacity] = old[0], old[1]
+        self.ring_delay[:, :capacity], self.ring_hist[:, :capacity] = old[2], old[3]
+        for name in TOTALS:
+            self.totals[name][:, :capacity] = old[4][name]
+        self.hist[:, :capacity] = old[5]
+
+    def __len__(self) -> int:
+        return len(self.supplier_ids)
+
+    def supplier_codes(self, supplier_ids: Sequence[str]) -> np.ndarray:
+        """Internal codes for supplier ids, registering unseen suppliers"""
+        codes = self.registry.codes(supplier_ids)
+        self._grow(len(self.supplier_ids))
+        return codes
+
+    def _advance(self, day: int) -> None:
+        """Move the clock forward, expiring buckets that leave each window"""
+        if self.day is None:
+            self.day = self.origin = day
+            return
+        if day - self.day >= self.horizon:
+            # Every window is fully expired
+            self.ring_count[:] = 0
+            self.ring_on_time[:] = 0
+            self.ring_delay[:] = 0
+            self.ring_hist[:] = 0
+            for total in self.totals.values():
+                total[:] = 0
+            self.hist[:] = 0
+            self.day = day
+            return
+        for current in range(self.day + 1, day + 1):
+            for w, window in enumerate(self.windows):
+                expired = current - window
+                slot = expired % self.horizon
+                count = self.ring_count[slot]
+                if not count.any():
+                    continue
+                t = float(expired - self.origin)
+                delay = self.ring_delay[slot]
+                self.totals["count"][w] -= count
+                self.totals["on_time"][w] -= self.ring_on_time[slot]
+                self.totals["delay"][w] -= delay
+                self.totals["t"][w] -= count * t
+                self.totals["tt"][w] -= count * (t * t)
+                self.totals["td"][w] -= delay * t
+                self.hist[w] -= self.ring_hist[slot]
+            # The longest window has just released this slot, so it can hold the new day
+            slot = current % self.horizon
+            self.ring_count[slot] = 0
+            self.ring_on_time[slot] = 0
+            self.ring_delay[slot] = 0
+            self.ring_hist[slot] = 0
+        self.day = day
+
+    def _add_day(self, codes: np.ndarray, day: int, delays: np.ndarray) -> None:
+        """Add shipments that all landed on the same day"""
+        if day > self.day:
+            self._advance(day)
+        age = self.day - day
+        if age >= self.horizon:
+            self.dropped += len(codes)
+            return
+        slot = day % self.horizon
+        t = float(day - self.origin)
+
+        # Aggregate the day's shipments per supplier once, then update each bucket and window with plain
+        # fancy indexing (rows are unique, so no np.add.at is needed)
+        if len(codes) == 1:
+            rows, inverse = codes, np.zeros(1, dtype=np.intp)
+        else:
+            rows, inverse = np.unique(codes, return_inverse=True)
+        delays = delays.astype(np.float64)
+        bins = np.clip(delays, 0, DELAY_BINS - 1).astype(np.intp)
+        count = np.bincount(inverse, minlength=len(rows))
+        on_time = np.bincount(inverse[delays <= self.on_time_days], minlength=len(rows))
+        delay = np.bincount(inverse, weights=delays, minlength=len(rows))
+        hist = np.bincount(inverse * DELAY_BINS + bins, minlength=len(rows) * DELAY_BINS).reshape(-1, DELAY_BINS)
+
+        self.ring_count[slot, rows] += count.astype(np.int32)
+        self.ring_on_time[slot, rows] += on_time.astype(np.int32)
+        self.ring_delay[slot, rows] += delay
+        self.ring_hist[slot, rows] += hist.astype(np.uint16)
+        for w, window in enumerate(self.windows):
+            if age >= window:
+                continue
+            self.totals["count"][w, rows] += count
+            self.totals["on_time"][w, rows] += on_time
+            self.totals["delay"][w, rows] += delay
+            self.totals["t"][w, rows] += count * t
+            self.totals["tt"][w, rows] += count * (t * t)
+            self.totals["td"][w, rows] += delay * t
+            self.hist[w, rows] += hist
+
+    def add(self, supplier_id: str, day: date, delay_days: int) -> None:
+        """Add one shipment (day is its actual arrival date)"""
+        codes = self.supplier_codes([supplier_id])
+        number = int(np.datetime64(day, "D").astype(np.int64))
+        if self.day is None:
+            self._advance(number)
+        self._add_day(codes, number, np.array([delay_days]))
+
+    def add_batch(self, codes: np.ndarray, days: np.ndarray, delays: np.ndarray) -> None:
+        """Add shipments given internal supplier codes, arrival days (days since epoch) and delays"""
+        if not len(codes):
+            return
+        order = np.argsort(days, kind="stable")
+        codes, days, delays = codes[order], days[order], delays[order]
+        if self.day is None:
+            self._advance(int(days[0]))
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(days)]):
+            self._add_day(codes[start:stop], int(days[start]), delays[start:stop])
+
+    def add_shipments(self, shipments: ShipmentColumns) -> np.ndarray:
+        """Add a columnar shipment batch, returning the internal codes of the suppliers it touched"""
+        present, inverse = np.unique(shipments.supplier_code, return_inverse=True)
+        # Catalog code -> internal code map, kept for the most recent catalog so that
+        # each supplier id is only looked up once per feed
+        catalog = shipments.catalog
+        if self._catalog is not catalog:
+            self._catalog, self._catalog_codes = catalog, np.full(len(catalog), -1, dtype=np.int64)
+        touched = self._catalog_codes[present]
+        unmapped = touched < 0
+        if unmapped.any():
+            new = present[unmapped]
+            codes = self.supplier_codes([catalog.ids[int(code)] for code in new.tolist()])
+            touched[unmapped] = self._catalog_codes[new] = codes
+        base = np.datetime64(shipments.base_date, "D").astype(np.int64)
+        self.add_batch(touched[inverse], base - shipments.actual_offset.astype(np.int64), shipments.delay_days)
+        return touched
+
+    def add_records(self, shipment_data: List[Dict]) -> None:
+        """
+        Add legacy shipment dicts (supplier_id, actual_date, delay_days)
+        Shipments without a parsable actual_date are skipped and counted in undated
+        """
+        days, _ = parse_dates([shipment.get("actual_date") for shipment in shipment_data])
+        dated = np.flatnonzero(~np.isnat(days)).tolist()
+        self.undated += len(shipment_data) - len(dated)
+        shipment_data = [shipment_data[row] for row in dated]
+        codes = self.supplier_codes([shipment["supplier_id"] for shipment in shipment_data])
+        delays = np.fromiter((shipment["delay_days"] for shipment in shipment_data),
+                             dtype=np.int64, count=len(shipment_data))
+        self.add_batch(codes, days[dated].astype(np.int64), delays)
+
+    def stats(self, codes: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Per-supplier, per-window statistics as (suppliers, windows) arrays; NaN where undefined"""
+        rows = slice(0, len(self.supplier_ids)) if codes is None else codes
+        totals = {name: total[:, rows].T for name, total in self.totals.items()}
+        count = totals["count"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            on_time_rate = totals["on_time"] / count
+            mean_delay = totals["delay"] / count
+            # Least-squares slope of delay against arrival day, in days of delay per day
+            spread = count * totals["tt"] - totals["t"] ** 2
+            trend = np.where(spread > 0, (count * totals["td"] - totals["t"] * totals["delay"]) / spread, np.nan)
+        cumulative = np.cumsum(self.hist[:, rows].transpose(1, 0, 2), axis=2)
+        p95 = np.argmax(cumulative >= np.ceil(0.95 * count)[:, :, None], axis=2).astype(np.float64)
+        p95[count == 0] = np.nan
+        return {
+            "shipments": count.astype(np.int64),
+            "on_time_rate": on_time_rate,
+            "mean_delay": mean_delay,
+            "p95_delay": p95,
+            "delay_trend": trend,
+        }
+
+    def summary(self, codes: Optional[np.ndarray] = None) -> List[Dict]:
+        """Compact aggregates for suppliers (all, or the given codes) with shipments in the longest window"""
+        codes = np.arange(len(self.supplier_ids)) if codes is None else np.asarray(codes)
+        stats = self.stats(codes)
+        shipments = stats["shipments"]
+        values = {name: np.round(array, 3).tolist() for name, array in stats.items()}
+        summary = []
+        for row in np.flatnonzero(shipments[:, -1]).tolist():
+            windows = {}
+            for w, window in enumerate(self.windows):
+                windows[f"{window}d"] = {name: _value(value[row][w]) for name, value in values.items()}
+            summary.append({"supplier_id": self.supplier_ids[int(codes[row])], "windows": windows})
+        return summary
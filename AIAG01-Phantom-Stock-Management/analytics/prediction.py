@@ -0,0 +1,179 @@
+"""
+Batch Stock Prediction
+Vectorized expected-stock predictions for supplier/date ranges, memoized in an LRU
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from analytics.forecast import SupplierForecaster, day_numbers
+from analytics.rules import parse_dates
+from simulation.columnar import InventoryColumns
+
+MEMO_CAPACITY = 65536  # (supplier, date) predictions kept between reads
+MAX_PREDICTION_DAYS = 366  # longest date range one predict() call expands
+
+
+class BatchPredictor:
+    """
+    Expected-stock predictions over the latest ingested inventory
+
+    Predictions use the supplier's Holt forecast once it has history and
+    fall back to the record's baseline (expected_stock, else production -
+    consumption), exactly like ValidationAgent.predict_expected_inventory.
+    Dates without an ingested record are forecast-only: they carry no
+    production or consumption rate. Results are memoized per (supplier, date, fingerprint); the fingerprint
+    hashes the ingested inputs and the forecaster state, so ingesting new
+    inventory or updating the forecasts invalidates every entry.
+    """
+
+    def __init__(self, forecaster: SupplierForecaster, capacity: int = MEMO_CAPACITY):
+        self.forecaster = forecaster
+        self.capacity = capacity
+        self.fingerprint: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._memo: "OrderedDict[tuple, Optional[Dict]]" = OrderedDict()
+        self.ingest_records([])
+
+    def ingest_records(self, records: List[Dict]) -> None:
+        """Index a new inventory batch by (supplier, day) and drop memoized results (undated records are skipped)"""
+        days, _ = parse_dates([record.get("date") for record in records])
+        dated = np.flatnonzero(~np.isnat(days))
+        records = [records[row] for row in dated.tolist()]
+        self._index(
+            np.array([str(record.get("supplier_id")) for record in records], dtype=object),
+            days[dated].astype(np.int64),
+            np.array([np.nan if record.get("expected_stock") is None else record["expected_stock"]
+                      for record in records], dtype=np.float64),
+            np.array([record.get("production_rate", 0) for record in records], dtype=np.float64),
+            np.array([record.get("consumption_rate", 0) for record in records], dtype=np.float64),
+        )
+
+    def ingest_columns(self, inventory: InventoryColumns) -> None:
+        """Index a columnar inventory batch by (supplier, day) and drop memoized results"""
+        self._index(
+            np.asarray(inventory.catalog.ids, dtype=object)[inventory.supplier_code],
+            inventory.dates.astype(np.int64),
+            inventory.expected_stock.astype(np.float64),
+            inventory.production_rate.astype(np.float64),
+            inventory.consumption_rate.astype(np.float64),
+        )
+
+    def _index(self, supplier_ids: np.ndarray, days: np.ndarray, expected: np.ndarray,
+               production: np.ndarray, consumption: np.ndarray) -> None:
+        supplier_ids, codes = np.unique(supplier_ids, return_inverse=True)
+        self.supplier_ids: List[str] = supplier_ids.tolist()
+        self._codes = {supplier_id: code for code, supplier_id in enumerate(self.supplier_ids)}
+        self.first_day = int(days.min()) if len(days) else 0
+        self.last_day = int(days.max()) if len(days) else -1
+        self._span = self.last_day - self.first_day + 1
+
+        keys = codes.astype(np.int64) * self._span + (days - self.first_day)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._expected = expected[order]
+        self._production = production[order]
+        self._consumption = consumption[order]
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Recompute the input fingerprint (call after the forecaster changes)"""
+        digest = hashlib.blake2b(digest_size=8)
+        forecaster = self.forecaster
+        for array in (self._keys, self._expected, self._production, self._consumption, forecaster.observations,
+                      forecaster.last_day, forecaster.level, forecaster.trend, forecaster.season):
+            digest.update(array.tobytes())
+        digest.update(np.int64(self.first_day).tobytes())
+        self.fingerprint = digest.hexdigest()
+        self._memo.clear()
+
+    def _rows(self, codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """Row of each (supplier code, day) in the ingested batch, or -1"""
+        rows = np.full(len(codes), -1, dtype=np.int64)
+        inside = (codes >= 0) & (days >= self.first_day) & (days <= self.last_day)
+        if not inside.any() or not len(self._keys):
+            return rows
+        keys = codes[inside] * self._span + (days[inside] - self.first_day)
+        found = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        rows[inside] = np.where(self._keys[found] == keys, found, -1)
+        return rows
+
+    def _compute(self, supplier_ids: List[str], dates: List[str]) -> List[Optional[Dict]]:
+        """Predictions for (supplier, date) pairs in one vectorized pass; None without data"""
+        codes = np.array([self._codes.get(supplier_id, -1) for supplier_id in supplier_ids], dtype=np.int64)
+        days = day_numbers(dates)
+        rows = self._rows(codes, days)
+        forecast = self.forecaster.forecast(self.forecaster.supplier_codes(supplier_ids, register=False), days)
+
+        has_row = rows >= 0
+        expected = np.where(has_row, self._expected[rows], np.nan)
+        production = np.where(has_row, self._production[rows], 0.0)
+        consumption = np.where(has_row, self._consumption[rows], 0.0)
+        baseline = np.where(np.isnan(expected), production - consumption, expected)
+        modeled = ~np.isnan(forecast)
+        predicted = np.maximum(np.where(modeled, np.round(forecast), baseline), 0).astype(np.int64)
+        available = (modeled | has_row).tolist()
+
+        predictions: List[Optional[Dict]] = []
+        for supplier_id, date, stock, production_rate, consumption_rate, model, observed, ok in zip(
+            supplier_ids, dates, predicted.tolist(), production.astype(np.int64).tolist(),
+            consumption.astype(np.int64).tolist(), modeled.tolist(), has_row.tolist(), available
+        ):
+            if not ok:
+                predictions.append(None)
+            elif observed:
+                predictions.append({
+                    "supplier_id": supplier_id,
+                    "date": date,
+                    "predicted_stock": stock,
+                    "production_rate": production_rate,
+                    "consumption_rate": consumption_rate,
+                    "model": "holt_weekly" if model else "baseline"
+                })
+            else:
+                predictions.append({"supplier_id": supplier_id, "date": date, "predicted_stock": stock,
+                                    "model": "holt_weekly", "forecast_only": True})
+        return predictions
+
+    def predict(self, supplier_ids: Optional[Sequence[str]] = None, start: Optional[str] = None,
+                end: Optional[str] = None) -> List[Dict]:
+        """
+        Predictions for every supplier in supplier_ids (default: all ingested)
+        and every date in [start, end] (default: the ingested date range),
+        ordered by supplier then date. Pairs without inventory or forecast history are omitted.
+        Raises ValueError for an unparsable date or a range over MAX_PREDICTION_DAYS.
+        """
+        supplier_ids = list(self.supplier_ids if supplier_ids is None else supplier_ids)
+        first = self.first_day if start is None else int(day_numbers([start])[0])
+        last = self.last_day if end is None else int(day_numbers([end])[0])
+        if last - first + 1 > MAX_PREDICTION_DAYS:
+            raise ValueError(f"date range spans {last - first + 1} days, at most {MAX_PREDICTION_DAYS} allowed")
+        dates = np.arange(first, last + 1).astype("datetime64[D]").astype(str).tolist()
+
+        keys = [(supplier_id, date, self.fingerprint) for supplier_id in supplier_ids for date in dates]
+        results = [None] * len(keys)
+        missed = []
+        memo = self._memo
+        for index, key in enumerate(keys):
+            if key in memo:
+                memo.move_to_end(key)
+                results[index] = memo[key]
+            else:
+                missed.append(index)
+        self.hits += len(keys) - len(missed)
+        self.misses += len(missed)
+
+        if missed:
+            computed = self._compute([keys[index][0] for index in missed], [keys[index][1] for index in missed])
+            for index, prediction in zip(missed, computed):
+                results[index] = memo[keys[index]] = prediction
+            while len(memo) > self.capacity:
+                memo.popitem(last=False)
+        return [prediction for prediction in results if prediction is not None]
+
+    def cache_info(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._memo),
+                "capacity": self.capacity, "fingerprint": self.fingerprint}
@@ -0,0 +1,57 @@
+"""
+Batch Data Quality Checks
+The monitoring rule set, declared as rule specs and evaluated with the compiled rule engine
+"""
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+from analytics.rules import BatchFrame, CompiledRules, QualityReport, compile_rules
+from simulation.columnar import InventoryColumns
+
+REQUIRED_FIELDS = ("supplier_id", "reported_stock", "production_rate")
+
+# Bit i of the quality flags is rule i, so new rules are appended to keep existing bits stable
+QUALITY_RULES = [
+    {"name": "negative_stock", "field": "reported_stock", "op": "lt", "value": 0},
+    {"name": "invalid_production_rate", "field": "production_rate", "op": "le", "value": 0, "fill": 0},
+    {"name": "missing_fields", "op": "missing", "fields": REQUIRED_FIELDS},
+    {"name": "invalid_date", "op": "invalid", "fields": ("date",)},
+]
+
+# Opt-in checks (they raise alerts the default rule set does not): set
+# PHANTOM_QUALITY_RULES=extended, or pass these specs to the monitoring agent
+EXTENDED_QUALITY_RULES = QUALITY_RULES + [
+    {"name": "stock_above_capacity", "field": "reported_stock", "op": "gt", "ref": "capacity"},
+    {"name": "consumption_above_production", "field": "consumption_rate", "op": "gt", "ref": "production_rate"},
+    {"name": "stale_date", "field": "age_days", "op": "gt", "value": 365},
+    {"name": "future_date", "field": "age_days", "op": "lt", "value": 0},
+    {"name": "duplicate_supplier_day", "op": "duplicate", "fields": ("supplier_id", "date")},
+]
+
+DEFAULT_RULES = compile_rules(
+    EXTENDED_QUALITY_RULES if os.environ.get("PHANTOM_QUALITY_RULES") == "extended" else QUALITY_RULES
+)
+
+NEGATIVE_STOCK = DEFAULT_RULES.bit("negative_stock")
+INVALID_PRODUCTION_RATE = DEFAULT_RULES.bit("invalid_production_rate")
+MISSING_FIELDS = DEFAULT_RULES.bit("missing_fields")
+
+
+def check_inventory_columns(columns: InventoryColumns, monitored_at: Optional[str] = None,
+                            rules: Optional[CompiledRules] = None,
+                            reference_date: Optional[date] = None) -> QualityReport:
+    """Quality checks for engine-generated columns (all fields are always present)"""
+    return (rules or DEFAULT_RULES).evaluate(BatchFrame.from_columns(columns, reference_date), monitored_at)
+
+
+def check_inventory_records(records: List[Dict], monitored_at: Optional[str] = None,
+                            rules: Optional[CompiledRules] = None,
+                            reference_date: Optional[date] = None,
+                            capacities: Optional[Dict[str, float]] = None) -> QualityReport:
+    """
+    Quality checks for legacy record dicts; absent fields only match rules that declare a fill value
+    capacities (supplier_id -> capacity) supplies the capacity bound, which records do not carry
+    """
+    frame = BatchFrame.from_records(records, reference_date, capacities)
+    return (rules or DEFAULT_RULES).evaluate(frame, monitored_at)
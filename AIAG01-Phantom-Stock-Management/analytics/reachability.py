@@ -0,0 +1,149 @@
+"""
+Supplier Reachability Index
+Transitive closure of the supplies_to links as bitsets, for blast-radius ("who is
+affected downstream") and common-upstream queries without walking the graph
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from analytics.reconciliation import _edge_positions, topological_levels
+from simulation.supplier_graph import SupplierGraph
+
+MAX_SUPPLIERS = 16384  # each closure holds n^2 bits (32 MB per direction at the limit)
+
+_BITS = np.uint64(1) << np.arange(64, dtype=np.uint64)
+
+
+def _or_rows(closure: np.ndarray, codes: np.ndarray, segments: np.ndarray, targets: np.ndarray) -> None:
+    """closure[targets] = OR of (closure[codes] | bit(codes)) over each segment of codes"""
+    rows = closure[codes]
+    rows[np.arange(len(codes)), codes >> 6] |= _BITS[codes & 63]
+    closure[targets] |= np.bitwise_or.reduceat(rows, segments, axis=0)
+
+
+class ReachabilityIndex:
+    """
+    Downstream and upstream closure of a supplier graph
+
+    Row i of `downstream` is a bitset of every supplier that i's goods reach
+    (its customers, their customers, ...); row i of `upstream` is every
+    supplier whose goods reach i. The initial closure is built one topological
+    level at a time with vectorized ORs over the CSR edges. Adding a link u -> v
+    ORs v's downstream set into u and everything upstream of u (and the
+    reverse for upstream sets), so the index never needs rebuilding.
+    Queries are a row lookup, or an AND of rows for common upstream suppliers.
+    """
+
+    def __init__(self, graph: SupplierGraph, capacity: Optional[int] = None):
+        n = graph.n_suppliers
+        if n > MAX_SUPPLIERS:
+            raise ValueError(f"{n} suppliers exceed the bitset index limit of {MAX_SUPPLIERS}")
+        self.supplier_ids: List[str] = list(graph.catalog.ids)
+        self.tiers: List[int] = graph.catalog.tiers.tolist()
+        self._codes: Dict[str, int] = {supplier_id: code for code, supplier_id in enumerate(self.supplier_ids)}
+        self._allocate(max(capacity or n, 64))
+
+        sources = graph.edge_sources().astype(np.int64)
+        targets = graph.indices.astype(np.int64)
+        by_target = np.argsort(targets, kind="stable")
+        in_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(graph.in_degree(), out=in_indptr[1:])
+        levels = topological_levels(graph)
+        # Customers are complete before their suppliers (and suppliers before their customers going up)
+        for level in reversed(levels):
+            level = level[graph.out_degree()[level] > 0]
+            if len(level):
+                starts, stops = graph.indptr[level], graph.indptr[level + 1]
+                edges = _edge_positions(starts, stops)
+                _or_rows(self.downstream, targets[edges], np.r_[0, np.cumsum(stops - starts)[:-1]], level)
+        for level in levels:
+            level = level[in_indptr[level + 1] > in_indptr[level]]
+            if len(level):
+                starts, stops = in_indptr[level], in_indptr[level + 1]
+                edges = by_target[_edge_positions(starts, stops)]
+                _or_rows(self.upstream, sources[edges], np.r_[0, np.cumsum(stops - starts)[:-1]], level)
+
+    def _allocate(self, capacity: int) -> None:
+        words = (capacity + 63) // 64
+        self.downstream = np.zeros((capacity, words), dtype=np.uint64)
+        self.upstream = np.zeros((capacity, words), dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.supplier_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.downstream.nbytes + self.upstream.nbytes
+
+    def code_of(self, supplier_id: str) -> int:
+        code = self._codes.get(supplier_id)
+        if code is None:
+            raise KeyError(supplier_id)
+        return code
+
+    def add_supplier(self, supplier_id: str, tier: int) -> int:
+        """Register a new supplier (with no links yet), returning its code"""
+        if supplier_id in self._codes:
+            raise ValueError(f"{supplier_id} is already indexed")
+        code = len(self.supplier_ids)
+        if code >= MAX_SUPPLIERS:
+            raise ValueError(f"the bitset index is limited to {MAX_SUPPLIERS} suppliers")
+        capacity = len(self.downstream)
+        if code >= capacity:
+            downstream, upstream = self.downstream, self.upstream
+            self._allocate(min(capacity * 2, MAX_SUPPLIERS))
+            self.downstream[:capacity, :downstream.shape[1]] = downstream
+            self.upstream[:capacity, :upstream.shape[1]] = upstream
+        self._codes[supplier_id] = code
+        self.supplier_ids.append(supplier_id)
+        self.tiers.append(int(tier))
+        return code
+
+    def add_link(self, supplier_id: str, customer_id: str) -> None:
+        """Record that supplier_id supplies to customer_id"""
+        supplier, customer = self.code_of(supplier_id), self.code_of(customer_id)
+        # Everything at or upstream of the supplier now reaches the customer and everything it reaches
+        reaching = np.r_[self._members(self.upstream[supplier]), supplier]
+        reached = np.r_[self._members(self.downstream[customer]), customer]
+        gained = self.downstream[customer].copy()
+        gained[customer >> 6] |= _BITS[customer & 63]
+        self.downstream[reaching] |= gained
+        gained = self.upstream[supplier].copy()
+        gained[supplier >> 6] |= _BITS[supplier & 63]
+        self.upstream[reached] |= gained
+
+    @staticmethod
+    def _members(bitset: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(bitset.view(np.uint8), bitorder="little"))
+
+    def reaches(self, supplier_id: str, customer_id: str) -> bool:
+        """Whether supplier_id's goods reach customer_id through supplies_to links"""
+        customer = self.code_of(customer_id)
+        return bool(self.downstream[self.code_of(supplier_id), customer >> 6] & _BITS[customer & 63])
+
+    def downstream_of(self, supplier_id: str) -> List[str]:
+        return [self.supplier_ids[code] for code in self._members(self.downstream[self.code_of(supplier_id)]).tolist()]
+
+    def upstream_of(self, supplier_id: str) -> List[str]:
+        return [self.supplier_ids[code] for code in self._members(self.upstream[self.code_of(supplier_id)]).tolist()]
+
+    def common_upstream(self, supplier_ids: Sequence[str]) -> List[str]:
+        """Suppliers upstream of every given supplier"""
+        codes = [self.code_of(supplier_id) for supplier_id in supplier_ids]
+        common = np.bitwise_and.reduce(self.upstream[codes], axis=0)
+        return [self.supplier_ids[code] for code in self._members(common).tolist()]
+
+    def blast_radius(self, supplier_id: str) -> Dict:
+        """Suppliers affected if supplier_id's stock is phantom, grouped by tier"""
+        affected = self._members(self.downstream[self.code_of(supplier_id)]).tolist()
+        by_tier: Dict[str, List[str]] = {}
+        for code in affected:
+            by_tier.setdefault(f"tier{self.tiers[code]}", []).append(self.supplier_ids[code])
+        return {
+            "supplier_id": supplier_id,
+            "tier": self.tiers[self.code_of(supplier_id)],
+            "affected": by_tier,
+            "affected_count": len(affected),
+            "tier1_affected": by_tier.get("tier1", [])
+        }
@@ -0,0 +1,221 @@
+"""
+Cross-Tier Mass Balance
+Reconciles what suppliers report and ship with what their customers record receiving
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from analytics.rules import parse_dates
+from simulation.columnar import InventoryColumns, ShipmentColumns, SupplierCatalog
+from simulation.supplier_graph import SupplierGraph
+
+MISMATCH_THRESHOLD = 0.10  # 10% of claimed stock unaccounted for downstream
+
+
+class SupplierFlows:
+    """
+    Per-supplier totals the reconciliation needs, indexed by catalog code:
+    latest reported stock, units shipped out, and the simulator's phantom flag
+    """
+
+    def __init__(self, reported_stock: np.ndarray, outbound: np.ndarray, phantom: np.ndarray):
+        self.reported_stock = reported_stock
+        self.outbound = outbound
+        self.phantom = phantom
+
+    @staticmethod
+    def _latest(n: int, codes: np.ndarray, day_offset: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Value of each supplier's most recent day (smallest offset)"""
+        latest = np.full(n, np.iinfo(np.int64).max)
+        np.minimum.at(latest, codes, day_offset)
+        rows = np.flatnonzero(day_offset == latest[codes])
+        stock = np.zeros(n, dtype=np.float64)
+        stock[codes[rows]] = values[rows]
+        return stock
+
+    @classmethod
+    def from_columns(cls, inventory: InventoryColumns, shipments: Optional[ShipmentColumns] = None,
+                     catalog: Optional[SupplierCatalog] = None) -> "SupplierFlows":
+        """
+        Totals from columnar data, indexed by catalog (default: the inventory's own)
+        Columns recorded against another catalog are mapped by supplier id; ids
+        outside catalog are ignored. Without shipments nothing is shipped out.
+        """
+        catalog = inventory.catalog if catalog is None else catalog
+        n = len(catalog)
+        codes, keep = cls._codes_in(catalog, inventory.catalog, inventory.supplier_code)
+        if shipments is not None:
+            shipment_codes, shipped = cls._codes_in(catalog, shipments.catalog, shipments.supplier_code)
+            outbound = np.bincount(shipment_codes, weights=shipments.quantity[shipped], minlength=n)
+        else:
+            outbound = np.zeros(n, dtype=np.float64)
+        return cls(
+            cls._latest(n, codes, inventory.day_offset[keep], inventory.reported_stock[keep]),
+            outbound,
+            np.bincount(codes, weights=inventory.has_phantom_stock[keep], minlength=n) > 0,
+        )
+
+    @staticmethod
+    def _codes_in(catalog: SupplierCatalog, source: SupplierCatalog, codes: np.ndarray):
+        """codes of source re-expressed in catalog, and the mask of rows whose supplier it knows"""
+        if source is catalog:
+            return codes, slice(None)
+        known = {supplier_id: code for code, supplier_id in enumerate(catalog.ids)}
+        mapping = np.array([known.get(supplier_id, -1) for supplier_id in source.ids], dtype=np.int64)
+        mapped = mapping[codes]
+        keep = mapped >= 0
+        return mapped[keep], keep
+
+    @classmethod
+    def from_records(cls, catalog: SupplierCatalog, inventory_data: List[Dict],
+                     shipment_data: List[Dict]) -> "SupplierFlows":
+        """
+        Totals from legacy record dicts (ids outside the catalog are ignored)
+        Undated or unparsable records only count as a supplier's latest stock
+        when it has no dated record
+        """
+        n = len(catalog)
+        known = {supplier_id: code for code, supplier_id in enumerate(catalog.ids)}
+        inventory = [record for record in inventory_data if record.get("supplier_id") in known]
+        shipments = [record for record in shipment_data if record.get("supplier_id") in known]
+        codes = np.array([known[record["supplier_id"]] for record in inventory], dtype=np.int64)
+        dates, _ = parse_dates([record.get("date") for record in inventory])
+        dated = ~np.isnat(dates)
+        # Undated rows sort after every dated one, so NaT never reaches max() or the offsets
+        day_offset = np.full(len(dates), np.iinfo(np.int64).max - 1)
+        if dated.any():
+            day_offset[dated] = (dates[dated].max() - dates[dated]).astype(np.int64)
+        return cls(
+            cls._latest(n, codes, day_offset,
+                        np.array([record.get("reported_stock", 0) for record in inventory], dtype=np.float64)),
+            np.bincount(np.array([known[record["supplier_id"]] for record in shipments], dtype=np.int64),
+                        weights=np.array([record.get("quantity", 0) for record in shipments], dtype=np.float64),
+                        minlength=n),
+            np.bincount(codes, weights=np.array([bool(record.get("has_phantom_stock")) for record in inventory]),
+                        minlength=n) > 0,
+        )
+
+
+def topological_levels(graph: SupplierGraph) -> List[np.ndarray]:
+    """
+    Supplier codes grouped into topological levels (Kahn's algorithm, one
+    frontier at a time): every edge goes from an earlier level to a later one
+    Raises ValueError if the supplies_to links contain a cycle
+    """
+    remaining = graph.in_degree()
+    frontier = np.flatnonzero(remaining == 0)
+    levels, visited = [], 0
+    while len(frontier):
+        levels.append(frontier)
+        visited += len(frontier)
+        starts, stops = graph.indptr[frontier], graph.indptr[frontier + 1]
+        edges = _edge_positions(starts, stops)
+        if not len(edges):
+            break
+        customers = graph.indices[edges]
+        remaining -= np.bincount(customers, minlength=graph.n_suppliers)
+        touched = np.unique(customers)
+        frontier = touched[remaining[touched] == 0]
+    if visited != graph.n_suppliers:
+        raise ValueError(f"supplies_to links contain a cycle ({graph.n_suppliers - visited} suppliers unreachable)")
+    return levels
+
+
+def _edge_positions(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Concatenated CSR ranges [start, stop) without a Python loop"""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(total, dtype=np.int64) + offsets
+
+
+class ReconciliationResult:
+    """
+    Per-edge and per-supplier mass balance
+    Edge arrays follow the graph's CSR order; supplier arrays are indexed by code
+    """
+
+    def __init__(self, graph: SupplierGraph, flows: SupplierFlows, sources: np.ndarray, shipped: np.ndarray,
+                 received: np.ndarray, inherited: np.ndarray, threshold: float):
+        self.graph = graph
+        self.flows = flows
+        self.shipped = shipped
+        self.received = received
+        self.threshold = threshold
+        n = graph.n_suppliers
+        self.shipped_total = np.bincount(sources, weights=shipped, minlength=n)
+        self.unreceived = self.shipped_total - np.bincount(sources, weights=received, minlength=n)
+        self.inbound_expected = np.bincount(graph.indices, weights=shipped, minlength=n)
+        self.inbound_received = np.bincount(graph.indices, weights=received, minlength=n)
+        self.inherited_shortfall = inherited
+        claimed = flows.reported_stock + flows.outbound
+        self.mismatch = np.zeros(n)
+        np.divide(self.unreceived, claimed, out=self.mismatch, where=claimed > 0)
+        self.flagged = self.mismatch > threshold
+
+    @property
+    def flagged_indices(self) -> np.ndarray:
+        """Flagged supplier codes, worst mismatch first"""
+        codes = np.flatnonzero(self.flagged)
+        return codes[np.argsort(-self.mismatch[codes], kind="stable")]
+
+    @property
+    def flagged_count(self) -> int:
+        return int(np.count_nonzero(self.flagged))
+
+    def records(self, codes: Optional[np.ndarray] = None) -> List[Dict]:
+        """Reconciliation dicts for the given supplier codes (flagged ones by default)"""
+        if codes is None:
+            codes = self.flagged_indices
+        catalog = self.graph.catalog
+        return [
+            {
+                "supplier_id": catalog.ids[code],
+                "supplier_name": catalog.names[code],
+                "tier": tier,
+                "reported_stock": reported,
+                "shipped": round(shipped, 1),
+                "received_downstream": round(shipped - unreceived, 1),
+                "unreceived": round(unreceived, 1),
+                "inherited_shortfall": round(inherited, 1),
+                "mismatch": round(mismatch, 3),
+                "flag": "mass_balance_mismatch" if flagged else "balanced",
+                "escalate": flagged
+            }
+            for code, tier, reported, shipped, unreceived, inherited, mismatch, flagged in zip(
+                codes.tolist(), catalog.tiers[codes].tolist(), self.flows.reported_stock[codes].tolist(),
+                self.shipped_total[codes].tolist(), self.unreceived[codes].tolist(),
+                self.inherited_shortfall[codes].tolist(), self.mismatch[codes].tolist(), self.flagged[codes].tolist()
+            )
+        ]
+
+
+def reconcile(graph: SupplierGraph, flows: SupplierFlows, received: np.ndarray,
+              threshold: float = MISMATCH_THRESHOLD) -> ReconciliationResult:
+    """
+    Mass balance over the supplies_to graph
+
+    Each supplier's outbound units are split across its customers by edge
+    share and compared with what each customer recorded receiving on that
+    edge (`received`, one value per edge in CSR order). Suppliers are then
+    walked in topological order so every supplier also carries the shortfall
+    that entered it from further upstream (split by the same shares), which
+    traces phantom stock at deeper tiers through to tier 1. All aggregation
+    is per level with bincount, so the cost is O(suppliers + edges).
+    """
+    sources = graph.edge_sources()
+    shipped = flows.outbound[sources] * graph.share
+    received = np.asarray(received, dtype=np.float64)
+    missing = np.maximum(shipped - received, 0.0)
+
+    inherited = np.zeros(graph.n_suppliers)
+    for level in topological_levels(graph):
+        edges = _edge_positions(graph.indptr[level], graph.indptr[level + 1])
+        if not len(edges):
+            continue
+        carried = missing[edges] + inherited[sources[edges]] * graph.share[edges]
+        inherited += np.bincount(graph.indices[edges], weights=carried, minlength=graph.n_suppliers)
+    return ReconciliationResult(graph, flows, sources, shipped, received, inherited, threshold)
@@ -0,0 +1,73 @@
+"""
+Lazy Record Lists
+List-like views that build legacy record dicts only when they are read
+"""
+from collections.abc import Sequence as SequenceABC
+from typing import Any, Callable, Dict, Iterator, List
+
+import numpy as np
+
+MATERIALIZE_CHUNK = 4096  # dicts built per step while iterating
+
+
+class LazyRecords(SequenceABC):
+    """
+    Read-only sequence of dicts for selected positions of a columnar result
+
+    `build` turns an array of positions into a list of dicts. Indexing builds
+    just the requested entries; iteration builds them in chunks; to_list()
+    builds everything once and caches it (this is what JSON serializers call).
+    """
+
+    def __init__(self, build: Callable[[np.ndarray], List[Dict]], positions: np.ndarray):
+        self._build = build
+        self.positions = positions
+        self._materialized = None
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if self._materialized is not None:
+            return self._materialized[index]
+        if isinstance(index, slice):
+            return self._build(self.positions[index])
+        return self._build(self.positions[[index]])[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self._materialized is not None:
+            yield from self._materialized
+            return
+        for start in range(0, len(self.positions), MATERIALIZE_CHUNK):
+            yield from self._build(self.positions[start:start + MATERIALIZE_CHUNK])
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (LazyRecords, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __add__(self, other) -> List[Dict]:
+        return list(self) + list(other)
+
+    def __radd__(self, other) -> List[Dict]:
+        return list(other) + list(self)
+
+    def __repr__(self) -> str:
+        return f"LazyRecords({len(self)} records)"
+
+    def to_list(self) -> List[Dict]:
+        if self._materialized is None:
+            self._materialized = self._build(self.positions)
+        return self._materialized
+
+
+def materialize(value: Any) -> Any:
+    """
+    Replace LazyRecords inside nested dicts with plain lists (for JSON encoders)
+    Plain lists are returned as they are, so record lists are not copied
+    """
+    if isinstance(value, LazyRecords):
+        return value.to_list()
+    if isinstance(value, dict):
+        return {key: materialize(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,146 @@
+"""
+Batch Risk Scoring
+Risk components, scores and levels for a whole batch of validations as arrays
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from analytics.records import LazyRecords
+
+CRITICAL_THRESHOLD = 70
+WARNING_THRESHOLD = 40
+
+# Level codes index these tuples
+NORMAL, WARNING, CRITICAL = 0, 1, 2
+RISK_LEVELS = ("NORMAL", "WARNING", "CRITICAL")
+CLASSIFICATIONS = ("normal", "monitor_closely", "phantom_stock_likely")
+
+# Validation fields copied into every risk assessment (with the legacy defaults)
+ASSESSMENT_FIELDS = (("deviation_percentage", 0), ("reported_stock", 0), ("expected_stock", 0))
+
+
+class RiskScores:
+    """
+    Columnar risk assessment: one entry per scored validation
+
+    Risk Score = min(deviation * 50, 50) + tier * 6.67 + min(history * 10, 30),
+    classified CRITICAL above critical_threshold and WARNING above warning_threshold.
+    """
+
+    def __init__(self, deviation_score: np.ndarray, tier_score: np.ndarray, history_score: np.ndarray,
+                 critical_threshold: float = CRITICAL_THRESHOLD, warning_threshold: float = WARNING_THRESHOLD):
+        self.deviation_score = deviation_score
+        self.tier_score = tier_score
+        self.history_score = history_score
+        self.risk_score = deviation_score + tier_score + history_score
+        self.level = np.where(self.risk_score > critical_threshold, CRITICAL,
+                              np.where(self.risk_score > warning_threshold, WARNING, NORMAL)).astype(np.int8)
+
+    def __len__(self) -> int:
+        return len(self.risk_score)
+
+    @property
+    def critical(self) -> np.ndarray:
+        return self.level == CRITICAL
+
+    @property
+    def warning(self) -> np.ndarray:
+        return self.level == WARNING
+
+    @property
+    def escalate(self) -> np.ndarray:
+        return self.level != NORMAL
+
+    @property
+    def critical_indices(self) -> np.ndarray:
+        return np.flatnonzero(self.critical)
+
+    @property
+    def warning_indices(self) -> np.ndarray:
+        return np.flatnonzero(self.warning)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of assessments per risk level"""
+        counts = np.bincount(self.level, minlength=len(RISK_LEVELS)).tolist()
+        return dict(zip(RISK_LEVELS, counts))
+
+    def records(self, validations: List[Dict], positions: np.ndarray, components: bool = True) -> List[Dict]:
+        """Legacy risk assessment dicts for the given positions (validations are the scored inputs)"""
+        return assessment_records(
+            [validations[position] for position in positions.tolist()], self.risk_score[positions],
+            self.level[positions], self.deviation_score[positions], self.tier_score[positions],
+            self.history_score[positions], components
+        )
+
+    def lazy(self, validations: List[Dict], positions: Optional[np.ndarray] = None,
+             components: bool = True) -> LazyRecords:
+        """Assessment dicts for positions (all by default), built only when read"""
+        if positions is None:
+            positions = np.arange(len(self))
+
+        def build(rows: np.ndarray) -> List[Dict]:
+            return self.records(validations, rows, components)
+        return LazyRecords(build, positions)
+
+
+def assessment_inputs(validation: Dict) -> Dict:
+    """The validation fields an assessment dict is built from, copied out of the validation"""
+    return {
+        "supplier_id": validation["supplier_id"],
+        "supplier_name": validation.get("supplier_name"),
+        "tier": validation.get("tier", 1),
+        **{field: validation.get(field, default) for field, default in ASSESSMENT_FIELDS}
+    }
+
+
+def assessment_records(validations: List[Dict], risk_score: np.ndarray, level: np.ndarray,
+                       deviation_score: np.ndarray, tier_score: np.ndarray, history_score: np.ndarray,
+                       components: bool = True) -> List[Dict]:
+    """Legacy risk assessment dicts, one per validation and its (aligned) scores"""
+    assessments = []
+    for validation, risk, code, deviation, tier, history in zip(
+        validations, risk_score.tolist(), level.tolist(), deviation_score.tolist(),
+        tier_score.tolist(), history_score.tolist()
+    ):
+        assessment = {
+            "supplier_id": validation["supplier_id"],
+            "supplier_name": validation["supplier_name"],
+            "tier": validation.get("tier", 1),
+            "risk_score": round(risk, 2),
+            "risk_level": RISK_LEVELS[code],
+            "classification": CLASSIFICATIONS[code],
+            **{field: validation.get(field, default) for field, default in ASSESSMENT_FIELDS},
+            "escalate": code != NORMAL
+        }
+        if components:
+            assessment["components"] = {
+                "deviation_score": round(deviation, 2),
+                "tier_score": round(tier, 2),
+                "history_score": round(history, 2)
+            }
+        assessments.append(assessment)
+    return assessments
+
+
+def score_risks(deviation: np.ndarray, tier: np.ndarray, history: np.ndarray,
+                critical_threshold: float = CRITICAL_THRESHOLD,
+                warning_threshold: float = WARNING_THRESHOLD) -> RiskScores:
+    """Score every (deviation, tier, historical issue count) triple at once"""
+    deviation_score = np.minimum(np.asarray(deviation, dtype=np.float64) * 50, 50)  # Max 50 points
+    tier_score = np.asarray(tier, dtype=np.float64) * 6.67  # Tier 3 = 20 points
+    history_score = np.minimum(np.asarray(history, dtype=np.float64) * 10, 30)  # Max 30 points
+    return RiskScores(deviation_score, tier_score, history_score, critical_threshold, warning_threshold)
+
+
+def validation_arrays(validations: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """(deviation, tier) arrays of validation dicts, with the legacy defaults"""
+    n = len(validations)
+    deviation = np.fromiter((validation.get("deviation", 0) for validation in validations), dtype=np.float64, count=n)
+    tier = np.fromiter((validation.get("tier", 1) for validation in validations), dtype=np.float64, count=n)
+    return deviation, tier
+
+
+def simulated_history(deviation: np.ndarray) -> np.ndarray:
+    """Placeholder historical issue count for backends without an issue history store"""
+    return (deviation > 0.3).astype(np.float64)
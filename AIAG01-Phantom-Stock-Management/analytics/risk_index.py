@@ -0,0 +1,201 @@
+"""
+Risk Score Index
+Latest risk assessment per supplier-day, ordered by score within each (tier, risk level)
+bucket, so top-N / threshold / level queries never scan or serialize the full list
+"""
+import heapq
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analytics.risk import RISK_LEVELS, RiskScores, assessment_inputs, assessment_records
+from storage.supplier_codes import SupplierCodes
+
+SCAN_CHUNK = 256  # entries pulled from a bucket at a time while merging buckets
+
+_DAY_OFFSET = 2 ** 31  # keeps the day part of a key non-negative (undated entries use day -2**31)
+
+
+class RiskIndex:
+    """
+    Sorted-array index over the latest risk scores
+
+    Every (supplier, day) key owns one slot holding its score, tier, level,
+    score components and a copy of the few validation fields its assessment
+    dict is built from, so indexed batches are not kept alive. Callers that
+    want only the latest run indexed clear() it first. Each (tier, level) bucket keeps
+    its slots in descending score order, so the top K of a bucket is its first K
+    entries and "score above S" is one binary search; queries spanning several
+    buckets merge them with a heap. Adding a batch replaces the slots of keys
+    assessed again and merges the new entries into their buckets, without
+    re-sorting what is already indexed.
+    """
+
+    def __init__(self, capacity: int = 16):
+        self._allocate(capacity)
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop every indexed entry (the allocated arrays are reused)"""
+        self.registry = SupplierCodes()
+        self.supplier_ids = self.registry.ids  # supplier id of each internal code
+        self.size = 0
+        # Sorted keys and their slots, for vectorized key lookups
+        self._keys = np.empty(0, dtype=np.int64)
+        self._key_slots = np.empty(0, dtype=np.int64)
+        # (tier, level) -> (negated scores ascending, slots)
+        self._buckets: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+        # Validation fields of each slot's assessment (None when indexed without validations)
+        self._inputs: List[Optional[Dict]] = [None] * len(self.score)
+
+    def _arrays(self) -> Tuple[np.ndarray, ...]:
+        return (self.score, self.tier, self.level, self.supplier,
+                self.deviation_score, self.tier_score, self.history_score)
+
+    def _allocate(self, capacity: int) -> None:
+        self.score = np.zeros(capacity, dtype=np.float64)
+        self.tier = np.zeros(capacity, dtype=np.int8)
+        self.level = np.zeros(capacity, dtype=np.int8)
+        self.supplier = np.zeros(capacity, dtype=np.int64)
+        self.deviation_score = np.zeros(capacity, dtype=np.float64)
+        self.tier_score = np.zeros(capacity, dtype=np.float64)
+        self.history_score = np.zeros(capacity, dtype=np.float64)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.score)
+        if needed <= capacity:
+            return
+        old = self._arrays()
+        self._allocate(max(needed, capacity * 2))
+        for new, values in zip(self._arrays(), old):
+            new[:capacity] = values
+        self._inputs.extend([None] * (len(self.score) - capacity))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def supplier_codes(self, supplier_ids: Sequence[str]) -> np.ndarray:
+        """Internal codes for supplier ids, registering unseen suppliers"""
+        codes = self.registry.codes(supplier_ids)
+        return codes
+
+    def add(self, scores: RiskScores, validations: Optional[Sequence[Dict]], supplier_ids: Sequence[str],
+            days: np.ndarray, tiers: np.ndarray) -> None:
+        """
+        Index a scored batch (days as datetime64[D], NaT when undated); a key
+        assessed again replaces its earlier entry, the last one in a batch wins.
+        Without validations only the scores are indexed (no records()).
+        """
+        if not len(scores):
+            return
+        codes = self.supplier_codes(supplier_ids)
+        day_numbers = np.where(np.isnat(days), -_DAY_OFFSET, days.astype(np.int64))
+        keys = codes * (2 ** 32) + (day_numbers + _DAY_OFFSET)
+        unique_keys, last = np.unique(keys[::-1], return_index=True)
+        positions = len(keys) - 1 - last
+
+        # Keys indexed before get their slot back, new keys get fresh slots
+        found_at = np.searchsorted(self._keys, unique_keys)
+        found = found_at < len(self._keys)
+        found[found] = self._keys[found_at[found]] == unique_keys[found]
+        slots = np.empty(len(unique_keys), dtype=np.int64)
+        slots[found] = self._key_slots[found_at[found]]
+        new = ~found
+        slots[new] = np.arange(self.size, self.size + int(new.sum()))
+        if found.any():
+            self._remove(slots[found])
+        self._grow(self.size + int(new.sum()))
+        self.size += int(new.sum())
+        self._keys = np.insert(self._keys, found_at[new], unique_keys[new])
+        self._key_slots = np.insert(self._key_slots, found_at[new], slots[new])
+
+        self.score[slots] = scores.risk_score[positions]
+        self.tier[slots] = np.asarray(tiers)[positions]
+        self.level[slots] = scores.level[positions]
+        self.supplier[slots] = codes[positions]
+        self.deviation_score[slots] = scores.deviation_score[positions]
+        self.tier_score[slots] = scores.tier_score[positions]
+        self.history_score[slots] = scores.history_score[positions]
+        if validations is None:
+            for slot in slots[found].tolist():  # fresh slots hold None already
+                self._inputs[slot] = None
+        else:
+            for slot, position in zip(slots.tolist(), positions.tolist()):
+                self._inputs[slot] = assessment_inputs(validations[position])
+        self._insert(slots)
+
+    def _remove(self, slots: np.ndarray) -> None:
+        """Take slots out of their buckets"""
+        for bucket in set(zip(self.tier[slots].tolist(), self.level[slots].tolist())):
+            negated, members = self._buckets[bucket]
+            keep = ~np.isin(members, slots)
+            self._buckets[bucket] = (negated[keep], members[keep])
+
+    def _insert(self, slots: np.ndarray) -> None:
+        """Merge slots into their buckets, keeping each bucket in descending score order"""
+        groups = self.tier[slots].astype(np.int64) * len(RISK_LEVELS) + self.level[slots]
+        for group in np.unique(groups).tolist():
+            members = slots[groups == group]
+            negated = -self.score[members]
+            order = np.argsort(negated, kind="stable")
+            negated, members = negated[order], members[order]
+            bucket = (group // len(RISK_LEVELS), group % len(RISK_LEVELS))
+            if bucket in self._buckets:
+                old_negated, old_members = self._buckets[bucket]
+                at = np.searchsorted(old_negated, negated, side="right")
+                negated, members = np.insert(old_negated, at, negated), np.insert(old_members, at, members)
+            self._buckets[bucket] = (negated, members)
+
+    def _selected(self, tier: Optional[int], level: Optional[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        level_code = None if level is None else RISK_LEVELS.index(level)
+        return [
+            bucket for (bucket_tier, bucket_level), bucket in self._buckets.items()
+            if (tier is None or bucket_tier == tier) and (level_code is None or bucket_level == level_code)
+        ]
+
+    @staticmethod
+    def _scan(negated: np.ndarray, members: np.ndarray, stop: int) -> Iterator[Tuple[float, int]]:
+        for start in range(0, stop, SCAN_CHUNK):
+            end = min(start + SCAN_CHUNK, stop)
+            yield from zip(negated[start:end].tolist(), members[start:end].tolist())
+
+    def count(self, tier: Optional[int] = None, level: Optional[str] = None,
+              min_score: Optional[float] = None) -> int:
+        """Number of indexed entries matching the filters (score strictly above min_score)"""
+        total = 0
+        for negated, members in self._selected(tier, level):
+            total += len(members) if min_score is None else int(np.searchsorted(negated, -min_score, side="left"))
+        return total
+
+    def query(self, limit: Optional[int] = None, tier: Optional[int] = None, level: Optional[str] = None,
+              min_score: Optional[float] = None, distinct: bool = False) -> np.ndarray:
+        """
+        Slots of the highest-scoring entries matching the filters, best first
+        With distinct, each supplier appears once (at its best matching entry)
+        """
+        streams = []
+        for negated, members in self._selected(tier, level):
+            stop = len(members) if min_score is None else int(np.searchsorted(negated, -min_score, side="left"))
+            if not distinct and limit is not None:
+                stop = min(stop, limit)
+            streams.append(self._scan(negated, members, stop))
+        ordered = (slot for _, slot in heapq.merge(*streams))
+        if distinct:
+            ordered = self._first_per_supplier(ordered)
+        return np.fromiter(islice(ordered, limit), dtype=np.int64)
+
+    def _first_per_supplier(self, slots: Iterator[int]) -> Iterator[int]:
+        seen = set()
+        for slot in slots:
+            supplier = int(self.supplier[slot])
+            if supplier not in seen:
+                seen.add(supplier)
+                yield slot
+
+    def records(self, slots: np.ndarray, components: bool = True) -> List[Dict]:
+        """Assessment dicts for slots, in the given order"""
+        return assessment_records(
+            [self._inputs[slot] for slot in slots.tolist()], self.score[slots], self.level[slots],
+            self.deviation_score[slots], self.tier_score[slots], self.history_score[slots], components
+        )
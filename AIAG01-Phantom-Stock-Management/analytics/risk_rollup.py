@@ -0,0 +1,272 @@
+"""
+Supplier Risk Roll-up
+Per-supplier risk over day windows (max, mean, trend, CRITICAL/WARNING counts),
+kept incrementally so that consumers get one row per supplier instead of one per supplier-day
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from analytics.records import LazyRecords
+from analytics.risk import CRITICAL, NORMAL, RISK_LEVELS, WARNING, RiskScores
+from storage.supplier_codes import SupplierCodes
+
+ROLLUP_WINDOWS = (7, 30, 90)
+TOTALS = ("count", "risk", "t", "tt", "tr", "critical", "warning")
+
+
+def _value(value):
+    """JSON-friendly statistic: NaN (undefined, e.g. no assessments) becomes None"""
+    return None if value != value else value
+
+
+class RiskWindows:
+    """
+    Rolling per-supplier risk statistics over day windows ending at the latest assessed day
+
+    Each supplier keeps a ring of per-day buckets (assessment count, risk sum,
+    peak risk, CRITICAL/WARNING counts) covering the longest window, plus
+    running totals per window. Adding a day touches one bucket and the running
+    totals, and advancing the clock subtracts each expiring bucket once, so
+    history is never rescanned. Assessing a supplier-day again replaces its
+    bucket, so re-running an analysis on the same dates does not double count.
+    """
+
+    def __init__(self, windows: Sequence[int] = ROLLUP_WINDOWS, capacity: int = 16):
+        self.windows = tuple(sorted(windows))
+        self.horizon = self.windows[-1]
+        self.registry = SupplierCodes()
+        self.supplier_ids = self.registry.ids  # supplier id of each internal code
+        self.day: Optional[int] = None  # latest assessed day (days since epoch)
+        self.origin: Optional[int] = None
+        self.dropped = 0  # assessments older than the longest window when they arrived
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        # Day- and window-major layout: the slices touched when a day expires are contiguous
+        self.ring_count = np.zeros((self.horizon, capacity), dtype=np.int32)
+        self.ring_risk = np.zeros((self.horizon, capacity), dtype=np.float64)
+        self.ring_peak = np.full((self.horizon, capacity), -np.inf)
+        self.ring_critical = np.zeros((self.horizon, capacity), dtype=np.int32)
+        self.ring_warning = np.zeros((self.horizon, capacity), dtype=np.int32)
+        self.totals = {name: np.zeros((len(self.windows), capacity), dtype=np.float64) for name in TOTALS}
+
+    def _grow(self, needed: int) -> None:
+        capacity = self.ring_count.shape[1]
+        if needed <= capacity:
+            return
+        rings = (self.ring_count, self.ring_risk, self.ring_peak, self.ring_critical, self.ring_warning)
+        totals = self.totals
+        self._allocate(max(needed, capacity * 2))
+        for new, old in zip((self.ring_count, self.ring_risk, self.ring_peak, self.ring_critical,
+                             self.ring_warning), rings):
+            new[:, :capacity] = old
+        for name in TOTALS:
+            self.totals[name][:, :capacity] = totals[name]
+
+    def __len__(self) -> int:
+        return len(self.supplier_ids)
+
+    def supplier_codes(self, supplier_ids: Sequence[str]) -> np.ndarray:
+        """Internal codes for supplier ids, registering unseen suppliers"""
+        codes = self.registry.codes(supplier_ids)
+        self._grow(len(self.supplier_ids))
+        return codes
+
+    def _bucket_totals(self, slot: int, rows: np.ndarray, t: float) -> Dict[str, np.ndarray]:
+        """Window-total contributions of the given suppliers' buckets in one slot"""
+        count = self.ring_count[slot, rows].astype(np.float64)
+        risk = self.ring_risk[slot, rows]
+        return {
+            "count": count,
+            "risk": risk,
+            "t": count * t,
+            "tt": count * (t * t),
+            "tr": risk * t,
+            "critical": self.ring_critical[slot, rows],
+            "warning": self.ring_warning[slot, rows],
+        }
+
+    def _advance(self, day: int) -> None:
+        """Move the clock forward, expiring buckets that leave each window"""
+        if self.day is None:
+            self.day = self.origin = day
+            return
+        if day - self.day >= self.horizon:
+            # Every window is fully expired
+            self.ring_count[:] = 0
+            self.ring_risk[:] = 0
+            self.ring_peak[:] = -np.inf
+            self.ring_critical[:] = 0
+            self.ring_warning[:] = 0
+            for total in self.totals.values():
+                total[:] = 0
+            self.day = day
+            return
+        for current in range(self.day + 1, day + 1):
+            for w, window in enumerate(self.windows):
+                expired = current - window
+                slot = expired % self.horizon
+                rows = np.flatnonzero(self.ring_count[slot])
+                if not len(rows):
+                    continue
+                for name, value in self._bucket_totals(slot, rows, float(expired - self.origin)).items():
+                    self.totals[name][w, rows] -= value
+            # The longest window has just released this slot, so it can hold the new day
+            slot = current % self.horizon
+            self.ring_count[slot] = 0
+            self.ring_risk[slot] = 0
+            self.ring_peak[slot] = -np.inf
+            self.ring_critical[slot] = 0
+            self.ring_warning[slot] = 0
+        self.day = day
+
+    def _set_day(self, codes: np.ndarray, day: int, risk: np.ndarray, level: np.ndarray) -> None:
+        """Replace the buckets of one day with the given assessments"""
+        if day > self.day:
+            self._advance(day)
+        age = self.day - day
+        if age >= self.horizon:
+            self.dropped += len(codes)
+            return
+        slot = day % self.horizon
+        t = float(day - self.origin)
+        windows = [w for w, window in enumerate(self.windows) if age < window]
+
+        if len(codes) == 1:
+            rows, inverse = codes, np.zeros(1, dtype=np.intp)
+        else:
+            rows, inverse = np.unique(codes, return_inverse=True)
+
+        # Take out whatever an earlier batch recorded for these supplier-days
+        stale = rows[self.ring_count[slot, rows] > 0]
+        if len(stale):
+            for name, value in self._bucket_totals(slot, stale, t).items():
+                for w in windows:
+                    self.totals[name][w, stale] -= value
+
+        peak = np.full(len(rows), -np.inf)
+        np.maximum.at(peak, inverse, risk)
+        self.ring_count[slot, rows] = np.bincount(inverse, minlength=len(rows))
+        self.ring_risk[slot, rows] = np.bincount(inverse, weights=risk, minlength=len(rows))
+        self.ring_peak[slot, rows] = peak
+        self.ring_critical[slot, rows] = np.bincount(inverse[level == CRITICAL], minlength=len(rows))
+        self.ring_warning[slot, rows] = np.bincount(inverse[level == WARNING], minlength=len(rows))
+        for name, value in self._bucket_totals(slot, rows, t).items():
+            for w in windows:
+                self.totals[name][w, rows] += value
+
+    def add_batch(self, codes: np.ndarray, days: np.ndarray, risk: np.ndarray, level: np.ndarray) -> None:
+        """Add assessments given internal supplier codes, days (days since epoch), risk scores and level codes"""
+        if not len(codes):
+            return
+        order = np.argsort(days, kind="stable")
+        codes, days, risk, level = codes[order], days[order], risk[order], level[order]
+        if self.day is None:
+            self._advance(int(days[0]))
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(days)]):
+            self._set_day(codes[start:stop], int(days[start]), risk[start:stop], level[start:stop])
+
+    def stats(self, codes: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Per-supplier, per-window statistics as (suppliers, windows) arrays; NaN where undefined"""
+        rows = np.arange(len(self.supplier_ids)) if codes is None else np.asarray(codes)
+        totals = {name: total[:, rows].T for name, total in self.totals.items()}
+        count = totals["count"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = totals["risk"] / count
+            # Least-squares slope of risk against day, in risk points per day
+            spread = count * totals["tt"] - totals["t"] ** 2
+            trend = np.where(spread > 0, (count * totals["tr"] - totals["t"] * totals["risk"]) / spread, np.nan)
+        peak = np.full(count.shape, np.nan)
+        if self.day is not None:
+            for w, window in enumerate(self.windows):
+                slots = np.arange(self.day - window + 1, self.day + 1) % self.horizon
+                peak[:, w] = self.ring_peak[slots][:, rows].max(axis=0)
+        peak[count == 0] = np.nan
+        return {
+            "assessments": count.astype(np.int64),
+            "max_risk": peak,
+            "mean_risk": mean,
+            "risk_trend": trend,
+            "critical_count": np.rint(totals["critical"]).astype(np.int64),
+            "warning_count": np.rint(totals["warning"]).astype(np.int64),
+        }
+
+
+def peak_positions(codes: np.ndarray, risk: np.ndarray) -> np.ndarray:
+    """Position of each supplier's highest risk score in a batch, ordered by supplier code"""
+    order = np.lexsort((-risk, codes))
+    first = np.r_[True, codes[order][1:] != codes[order][:-1]]
+    return order[first]
+
+
+class SupplierRisks:
+    """
+    Columnar supplier-level roll-up: one entry per supplier in a scored batch
+
+    Each supplier's level comes from its peak risk over the longest window, and
+    its peak assessment is its highest-scoring entry in the batch. Entries are
+    ordered worst first.
+    """
+
+    def __init__(self, rollup: RiskWindows, codes: np.ndarray, peaks: np.ndarray,
+                 critical_threshold: float, warning_threshold: float):
+        stats = rollup.stats(codes)
+        window_peak = np.nan_to_num(stats["max_risk"][:, -1], nan=-np.inf)
+        order = np.lexsort((codes, -window_peak))
+        self.supplier_ids = rollup.supplier_ids
+        self.windows = rollup.windows
+        self.codes = codes[order]
+        self.peaks = peaks[order]
+        self.stats = {name: array[order] for name, array in stats.items()}
+        self.level = np.where(window_peak[order] > critical_threshold, CRITICAL,
+                              np.where(window_peak[order] > warning_threshold, WARNING, NORMAL)).astype(np.int8)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def critical_indices(self) -> np.ndarray:
+        return np.flatnonzero(self.level == CRITICAL)
+
+    @property
+    def warning_indices(self) -> np.ndarray:
+        return np.flatnonzero(self.level == WARNING)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of suppliers per risk level"""
+        counts = np.bincount(self.level, minlength=len(RISK_LEVELS)).tolist()
+        return dict(zip(RISK_LEVELS, counts))
+
+    def records(self, scores: RiskScores, validations: List[Dict], positions: np.ndarray) -> List[Dict]:
+        """Supplier risk dicts for the given entries, each with its peak assessment and window statistics"""
+        peaks = scores.records(validations, self.peaks[positions])
+        values = {name: np.round(array[positions], 2).tolist() for name, array in self.stats.items()}
+        supplier_risks = []
+        for index, (code, level, peak) in enumerate(zip(
+            self.codes[positions].tolist(), self.level[positions].tolist(), peaks
+        )):
+            windows = {}
+            for w, window in enumerate(self.windows):
+                windows[f"{window}d"] = {name: _value(value[index][w]) for name, value in values.items()}
+            supplier_risks.append({
+                "supplier_id": self.supplier_ids[code],
+                "supplier_name": peak["supplier_name"],
+                "tier": peak["tier"],
+                "risk_level": RISK_LEVELS[level],
+                "escalate": level != NORMAL,
+                "peak_assessment": peak,
+                "windows": windows
+            })
+        return supplier_risks
+
+    def lazy(self, scores: RiskScores, validations: List[Dict],
+             positions: Optional[np.ndarray] = None) -> LazyRecords:
+        """Supplier risk dicts for positions (all by default), built only when read"""
+        if positions is None:
+            positions = np.arange(len(self))
+
+        def build(rows: np.ndarray) -> List[Dict]:
+            return self.records(scores, validations, rows)
+        return LazyRecords(build, positions)
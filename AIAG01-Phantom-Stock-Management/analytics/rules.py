@@ -0,0 +1,382 @@
+"""
+Declarative Data-Quality Rule Engine
+Rule specs are compiled once into vectorized predicates and evaluated over a whole batch
+"""
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analytics.records import LazyRecords
+from simulation.columnar import InventoryColumns
+
+COMPARISONS = {
+    "lt": np.less,
+    "le": np.less_equal,
+    "gt": np.greater,
+    "ge": np.greater_equal,
+    "eq": np.equal,
+    "ne": np.not_equal,
+}
+
+NUMERIC_FIELDS = frozenset((
+    "reported_stock", "expected_stock", "production_rate", "consumption_rate",
+    "tier", "reliability", "capacity",
+))
+
+
+# Largest code range kept as value offsets; wider ranges are re-coded densely
+_MAX_KEY_SPAN = 1 << 40
+
+
+def parse_dates(values: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Day dates from ISO strings or date objects, and a mask of the values that could not be parsed
+    Absent values (None, "") become NaT; unparsable ones become NaT and are marked in the mask
+    """
+    n = len(values)
+    try:
+        return (np.array([value or "NaT" for value in values], dtype="datetime64[D]"),
+                np.zeros(n, dtype=bool))
+    except (ValueError, TypeError):
+        pass
+    dates = np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+    invalid = np.zeros(n, dtype=bool)
+    for index, value in enumerate(values):
+        if not value:
+            continue
+        try:
+            dates[index] = np.datetime64(value).astype("datetime64[D]")
+        except (ValueError, TypeError):
+            invalid[index] = True
+    return dates, invalid
+
+
+def _key_codes(values: np.ndarray):
+    """Dense non-negative integer codes for one key column (without NaT), and the number of code values"""
+    if values.dtype.kind == "M":
+        values = values.view(np.int64)
+    if values.dtype.kind in "iub" and len(values):
+        low, high = int(values.min()), int(values.max())
+        if high - low < _MAX_KEY_SPAN:
+            codes = values.astype(np.int64)
+            codes -= low
+            return codes, high - low + 1
+    uniques, codes = np.unique(values, return_inverse=True)
+    return codes.astype(np.int64), max(len(uniques), 1)
+
+
+class BatchFrame:
+    """
+    Column access for rule evaluation over one batch
+    Columns are extracted (or derived) once, on first use, and shared by all rules
+    """
+
+    def __init__(self, length: int, loaders: Dict[str, Callable[[], np.ndarray]],
+                 presence: Optional[Callable[[str], np.ndarray]] = None,
+                 key_fields: Optional[Dict[str, str]] = None):
+        self.length = length
+        self._loaders = loaders
+        self._presence = presence
+        self._key_fields = key_fields or {}
+        self._cache = {}
+        # field -> mask of values present but unparsable, recorded by the field's loader
+        self.unparsed: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        if field not in self._cache:
+            if field not in self._loaders:
+                raise KeyError(f"Unknown field for quality rules: {field}")
+            self._cache[field] = self._loaders[field]()
+        return self._cache[field]
+
+    @property
+    def complete(self) -> bool:
+        """True when every record carries every field"""
+        return self._presence is None
+
+    def missing(self, field: str) -> np.ndarray:
+        """Records that do not carry `field` at all"""
+        if self._presence is None:
+            return np.zeros(self.length, dtype=bool)
+        key = ("missing", field)
+        if key not in self._cache:
+            self._cache[key] = ~self._presence(field)
+        return self._cache[key]
+
+    def invalid(self, field: str) -> np.ndarray:
+        """Records whose `field` is present but could not be parsed"""
+        self[field]
+        return self.unparsed.get(field, np.zeros(self.length, dtype=bool))
+
+    def duplicates(self, fields: Sequence[str]) -> np.ndarray:
+        """Records whose key (fields) already appeared earlier in the batch; keys with a NaT never match"""
+        columns = [self[self._key_fields.get(field, field)] for field in fields]
+        dated = [np.isnat(column) for column in columns if column.dtype.kind == "M"]
+        rows = np.flatnonzero(~np.logical_or.reduce(dated)) if dated else None
+        if rows is not None and len(rows) < self.length:
+            columns = [column[rows] for column in columns]
+        else:
+            rows = None
+        key, span = None, 1
+        for column in columns:
+            codes, size = _key_codes(column)
+            if key is None:
+                key, span = codes, size
+                continue
+            if span * size >= 1 << 62:
+                # The combined key would overflow int64: re-code the fields so far densely
+                uniques, key = np.unique(key, return_inverse=True)
+                key, span = key.astype(np.int64), len(uniques)
+            key *= size
+            key += codes
+            span *= size
+        duplicate = np.zeros(self.length, dtype=bool)
+        if key is None or len(key) < 2 or np.all(key[1:] > key[:-1]):
+            # Already strictly ordered (the generators emit supplier-day order): no sort needed
+            return duplicate
+        order = np.argsort(key, kind="stable")
+        ordered = key[order]
+        repeated = order[1:][ordered[1:] == ordered[:-1]]
+        duplicate[repeated if rows is None else rows[repeated]] = True
+        return duplicate
+
+    @classmethod
+    def from_columns(cls, inventory: InventoryColumns, reference_date: Optional[date] = None) -> "BatchFrame":
+        """Frame over engine-generated columns (every field is present)"""
+        lag = ((reference_date or date.today()) - inventory.base_date).days
+        catalog = inventory.catalog
+        loaders = {
+            "supplier_id": lambda: inventory.supplier_code,
+            "date": lambda: inventory.dates,
+            "age_days": lambda: inventory.day_offset + lag,
+            "tier": lambda: inventory.tier,
+            "reliability": lambda: inventory.reliability,
+            "capacity": lambda: catalog.capacity[inventory.supplier_code],
+        }
+        for name in InventoryColumns.ARRAYS:
+            loaders.setdefault(name, lambda name=name: getattr(inventory, name))
+        # Dates are a one-to-one function of day_offset, so keys use the stored column directly
+        return cls(len(inventory), loaders, key_fields={"supplier_id": "supplier_code", "date": "day_offset"})
+
+    @classmethod
+    def from_records(cls, records: List[Dict], reference_date: Optional[date] = None,
+                     capacities: Optional[Dict[str, float]] = None) -> "BatchFrame":
+        """
+        Frame over legacy record dicts; absent numeric values become NaN
+        Records carry no capacity, so it is looked up per supplier in `capacities` when given
+        """
+        n = len(records)
+        reference = np.datetime64(reference_date or date.today(), "D")
+
+        def numeric(field):
+            return np.fromiter(
+                (r.get(field) if r.get(field) is not None else np.nan for r in records), dtype=np.float64, count=n
+            )
+
+        def labels(field):
+            return np.array([str(r.get(field, "")) for r in records], dtype=object)
+
+        def dates():
+            parsed, frame.unparsed["date"] = parse_dates([r.get("date") for r in records])
+            return parsed
+
+        def capacity():
+            values = numeric("capacity")
+            if capacities:
+                lookup = np.fromiter((capacities.get(r.get("supplier_id"), np.nan) for r in records),
+                                     dtype=np.float64, count=n)
+                values = np.where(np.isnan(values), lookup, values)
+            return values
+
+        def presence(field):
+            return np.fromiter((field in r for r in records), dtype=bool, count=n)
+
+        loaders = {field: (lambda field=field: numeric(field)) for field in NUMERIC_FIELDS}
+        loaders["supplier_id"] = lambda: labels("supplier_id")
+        loaders["date"] = dates
+        loaders["capacity"] = capacity
+        frame = cls(n, loaders, presence)
+        # Records without a (parsable) date get NaT, whose age is NaN and never matches a comparison
+        loaders["age_days"] = lambda: np.where(np.isnat(frame["date"]), np.nan,
+                                               (reference - frame["date"]).astype(np.float64))
+        return frame
+
+
+class QualityReport:
+    """
+    Result of one rule-set evaluation: a bitmask per record (bit i = rule i),
+    a single run timestamp, and per-rule hit counts and evaluation times
+    """
+
+    def __init__(self, flags: np.ndarray, monitored_at: str, rule_names: Sequence[str],
+                 rule_stats: Optional[Dict[str, Dict]] = None):
+        self.flags = flags
+        self.monitored_at = monitored_at
+        self.rule_names = tuple(rule_names)
+        self.rule_stats = rule_stats or {}
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    @property
+    def poor(self) -> np.ndarray:
+        """Mask of records with at least one quality issue"""
+        return self.flags != 0
+
+    @property
+    def anomaly_indices(self) -> np.ndarray:
+        return np.flatnonzero(self.flags)
+
+    @property
+    def anomaly_count(self) -> int:
+        return int(np.count_nonzero(self.flags))
+
+    def issue_names(self, flags: int) -> List[str]:
+        """Rule names set in one bitmask value, in rule order"""
+        return [name for bit, name in enumerate(self.rule_names) if flags >> bit & 1]
+
+    def counts(self) -> Dict[str, int]:
+        """Records hit by each rule"""
+        if self.rule_stats:
+            return {name: self.rule_stats[name]["hits"] for name in self.rule_names}
+        return {name: int(np.count_nonzero(self.flags >> bit & 1)) for bit, name in enumerate(self.rule_names)}
+
+    def issues(self) -> List[List[str]]:
+        """Per-record issue lists (legacy "quality_issues" field)"""
+        table = {value: self.issue_names(value) for value in np.unique(self.flags).tolist()}
+        return [list(table[value]) for value in self.flags.tolist()]
+
+    def lazy(self, records: Optional[List[Dict]] = None, columns: Optional[InventoryColumns] = None,
+             fields: Optional[Sequence[str]] = None) -> "MonitoredRecords":
+        """Monitored-record view of the checked batch (see MonitoredRecords)"""
+        return MonitoredRecords(self, records, columns, fields)
+
+    def anomalies(self, supplier_id_of: Callable[[int], str]) -> List[Dict]:
+        """Issue lists for flagged records only; supplier_id_of maps a record index to its supplier id"""
+        flags = self.flags
+        return [
+            {"supplier_id": supplier_id_of(index), "issues": self.issue_names(int(flags[index]))}
+            for index in self.anomaly_indices.tolist()
+        ]
+
+
+class MonitoredRecords(LazyRecords):
+    """
+    Monitored records (legacy "processed_data") as a view over the checked batch
+
+    Each record is its input record plus monitored_at, data_quality and
+    quality_issues, built only when read or serialized: the batch keeps just
+    the input (record dicts, or columns materialized with `fields`), the flag
+    column and one run timestamp. Batch consumers read `quality` and `records`
+    / `columns` directly.
+    """
+
+    def __init__(self, quality: "QualityReport", records: Optional[List[Dict]] = None,
+                 columns: Optional[InventoryColumns] = None, fields: Optional[Sequence[str]] = None):
+        if records is None and columns is None:
+            raise ValueError("MonitoredRecords needs records or columns")
+        self.quality = quality
+        self.records = records
+        self.columns = columns
+        self.fields = fields
+        super().__init__(self._monitored, np.arange(len(quality)))
+
+    def _monitored(self, positions: np.ndarray) -> List[Dict]:
+        if self.records is not None:
+            inputs = [self.records[position] for position in positions.tolist()]
+        else:
+            inputs = self.columns.take(positions).to_records(self.fields)
+        quality = self.quality
+        flags = quality.flags[positions].tolist()
+        issues = {value: quality.issue_names(value) for value in set(flags)}
+        return [
+            {
+                **record,
+                "monitored_at": quality.monitored_at,
+                "data_quality": "poor" if value else "good",
+                "quality_issues": list(issues[value])
+            }
+            for record, value in zip(inputs, flags)
+        ]
+
+
+def _field_values(field: str, fill) -> Callable[[BatchFrame], np.ndarray]:
+    """Column accessor; with a fill value, records lacking the field are compared as that value"""
+    if fill is None:
+        return lambda frame: frame[field]
+    return lambda frame: frame[field] if frame.complete else np.where(frame.missing(field), fill, frame[field])
+
+
+def _compile_rule(spec: Dict) -> Callable[[BatchFrame], np.ndarray]:
+    """Turn one rule spec into a predicate returning a boolean mask over the frame"""
+    op = spec["op"]
+    if op in COMPARISONS:
+        compare = COMPARISONS[op]
+        field = spec["field"]
+        values = _field_values(field, spec.get("fill"))
+        if "ref" in spec:
+            ref, scale = spec["ref"], spec.get("scale", 1.0)
+            return lambda frame: compare(values(frame), frame[ref] * scale)
+        value = spec["value"]
+        return lambda frame: compare(values(frame), value)
+    if op == "outside":
+        field, low, high = spec["field"], spec["min"], spec["max"]
+        return lambda frame: (frame[field] < low) | (frame[field] > high)
+    if op == "missing":
+        fields = tuple(spec["fields"])
+        return lambda frame: (np.zeros(len(frame), dtype=bool) if frame.complete
+                              else np.logical_or.reduce([frame.missing(field) for field in fields]))
+    if op == "invalid":
+        fields = tuple(spec["fields"])
+        return lambda frame: np.logical_or.reduce([frame.invalid(field) for field in fields])
+    if op == "duplicate":
+        fields = tuple(spec["fields"])
+        return lambda frame: frame.duplicates(fields)
+    raise ValueError(f"Unknown quality rule operator: {op}")
+
+
+class CompiledRules:
+    """A rule set compiled to vectorized predicates; bit i of the flags is rule i"""
+
+    def __init__(self, specs: Sequence[Dict]):
+        if len(specs) > 64:
+            raise ValueError("At most 64 quality rules are supported")
+        names = [spec["name"] for spec in specs]
+        if len(set(names)) != len(names):
+            raise ValueError("Quality rule names must be unique")
+        self.specs = [dict(spec) for spec in specs]
+        self.names = tuple(names)
+        self.predicates = [_compile_rule(spec) for spec in specs]
+        self.dtype = next(dtype for dtype in (np.uint8, np.uint16, np.uint32, np.uint64)
+                          if np.dtype(dtype).itemsize * 8 >= len(specs))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def bit(self, name: str) -> int:
+        """Flag value of one rule"""
+        return 1 << self.names.index(name)
+
+    def evaluate(self, frame: BatchFrame, monitored_at: Optional[str] = None) -> QualityReport:
+        """Run every rule over the batch; each rule is a single vectorized pass"""
+        flags = np.zeros(len(frame), dtype=self.dtype)
+        rule_stats = {}
+        for bit, (name, predicate) in enumerate(zip(self.names, self.predicates)):
+            started = time.perf_counter()
+            mask = predicate(frame)
+            np.bitwise_or(flags, self.dtype(1 << bit), out=flags, where=mask)
+            rule_stats[name] = {
+                "hits": int(np.count_nonzero(mask)),
+                "seconds": round(time.perf_counter() - started, 6),
+            }
+        return QualityReport(flags, monitored_at or datetime.now().isoformat(), self.names, rule_stats)
+
+
+def compile_rules(specs: Sequence[Dict]) -> CompiledRules:
+    """Compile declarative rule specs, e.g. {"name": "negative_stock", "field": "reported_stock", "op": "lt", "value": 0}"""
+    return CompiledRules(specs)
@@ -0,0 +1,127 @@
+"""
+Threshold What-if Sweeps
+How many entries (and which suppliers) a threshold would flag, for many candidate
+thresholds at once, from a single sort of the scores
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class ThresholdSweep:
+    """
+    Entries and suppliers strictly above candidate thresholds
+
+    Values are sorted once (on first use); the number of entries above any
+    threshold is then one binary search. Suppliers are ranked by their peak
+    value, so the suppliers above a threshold are a prefix of that ranking and
+    the suppliers between two thresholds are a slice of it.
+    """
+
+    def __init__(self, values: np.ndarray, supplier_codes: np.ndarray, supplier_ids: Sequence[str]):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.supplier_codes = np.asarray(supplier_codes, dtype=np.int64)  # one per value, indexing supplier_ids
+        self.supplier_ids = supplier_ids
+        self._sorted = None
+        self._ranking = None
+
+    @classmethod
+    def from_ids(cls, values: np.ndarray, supplier_ids: Sequence[str]) -> "ThresholdSweep":
+        """Sweep over values labelled with one supplier id each"""
+        ids, codes = np.unique(np.asarray(supplier_ids, dtype=str), return_inverse=True)
+        return cls(values, codes, ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _prepare(self) -> None:
+        if self._sorted is not None:
+            return
+        self._sorted = np.sort(self.values)
+        present, inverse = np.unique(self.supplier_codes, return_inverse=True)
+        peaks = np.full(len(present), -np.inf)
+        np.maximum.at(peaks, inverse, self.values)
+        order = np.argsort(-peaks, kind="stable")
+        # Ranking worst first, plus the same peaks ascending for binary search
+        self._ranking = (present[order], peaks[order][::-1].copy())
+
+    @property
+    def supplier_count(self) -> int:
+        self._prepare()
+        return len(self._ranking[0])
+
+    def count_above(self, thresholds) -> np.ndarray:
+        """Number of entries with a value strictly above each threshold"""
+        self._prepare()
+        return len(self._sorted) - np.searchsorted(self._sorted, thresholds, side="right")
+
+    def suppliers_above(self, thresholds) -> np.ndarray:
+        """Number of suppliers whose peak value is strictly above each threshold"""
+        self._prepare()
+        peaks = self._ranking[1]
+        return len(peaks) - np.searchsorted(peaks, thresholds, side="right")
+
+    def suppliers_between(self, low: float, high: float = np.inf) -> List[str]:
+        """Suppliers whose peak value is above low and not above high, worst first"""
+        start, stop = self.suppliers_above([high, low]).tolist()
+        return [self.supplier_ids[code] for code in self._ranking[0][start:stop].tolist()]
+
+    def level_table(self, critical_thresholds, warning_thresholds) -> Dict[str, np.ndarray]:
+        """
+        CRITICAL/WARNING counts for every (critical, warning) threshold pair as
+        (len(critical), len(warning)) arrays: CRITICAL is above the critical
+        threshold, WARNING is above the warning threshold but not CRITICAL
+        """
+        critical = np.asarray(critical_thresholds, dtype=np.float64)
+        warning = np.asarray(warning_thresholds, dtype=np.float64)
+        upper = np.maximum(critical[:, None], warning[None, :])
+        entries_critical = self.count_above(critical)
+        suppliers_critical = self.suppliers_above(critical)
+        return {
+            "critical_count": np.broadcast_to(entries_critical[:, None], upper.shape),
+            "warning_count": self.count_above(warning)[None, :] - self.count_above(upper),
+            "supplier_critical_count": np.broadcast_to(suppliers_critical[:, None], upper.shape),
+            "supplier_warning_count": self.suppliers_above(warning)[None, :] - self.suppliers_above(upper),
+        }
+
+    def levels(self, critical_threshold: float, warning_threshold: float) -> Dict:
+        """Counts and suppliers at one (critical, warning) threshold pair"""
+        table = self.level_table([critical_threshold], [warning_threshold])
+        upper = max(critical_threshold, warning_threshold)
+        return {
+            "critical_threshold": critical_threshold,
+            "warning_threshold": warning_threshold,
+            **{name: int(counts[0, 0]) for name, counts in table.items()},
+            "critical_suppliers": self.suppliers_between(critical_threshold),
+            "warning_suppliers": self.suppliers_between(warning_threshold, upper),
+        }
+
+    def level_records(self, critical_thresholds, warning_thresholds, suppliers: bool = False) -> List[Dict]:
+        """Sensitivity table rows, one per (critical, warning) pair, optionally naming the flagged suppliers"""
+        critical_thresholds = np.asarray(critical_thresholds, dtype=np.float64).tolist()
+        warning_thresholds = np.asarray(warning_thresholds, dtype=np.float64).tolist()
+        table = {name: counts.tolist() for name, counts in
+                 self.level_table(critical_thresholds, warning_thresholds).items()}
+        rows = []
+        for i, critical in enumerate(critical_thresholds):
+            for j, warning in enumerate(warning_thresholds):
+                row = {"critical_threshold": critical, "warning_threshold": warning,
+                       **{name: counts[i][j] for name, counts in table.items()}}
+                if suppliers:
+                    row["critical_suppliers"] = self.suppliers_between(critical)
+                    row["warning_suppliers"] = self.suppliers_between(warning, max(critical, warning))
+                rows.append(row)
+        return rows
+
+    def threshold_records(self, thresholds, suppliers: bool = False, label: str = "threshold") -> List[Dict]:
+        """Sensitivity table rows for a single threshold: entries and suppliers above each candidate"""
+        thresholds = np.asarray(thresholds, dtype=np.float64).tolist()
+        counts = self.count_above(thresholds).tolist()
+        supplier_counts = self.suppliers_above(thresholds).tolist()
+        rows = []
+        for threshold, count, supplier_count in zip(thresholds, counts, supplier_counts):
+            row = {label: threshold, "count": count, "supplier_count": supplier_count}
+            if suppliers:
+                row["suppliers"] = self.suppliers_between(threshold)
+            rows.append(row)
+        return rows
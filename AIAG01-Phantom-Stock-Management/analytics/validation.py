@@ -0,0 +1,150 @@
+"""
+Batch Deviation Validation
+Compares reported and expected stock for a whole batch with array operations
+"""
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from analytics.rules import MonitoredRecords, QualityReport
+from simulation.columnar import InventoryColumns
+
+DEVIATION_THRESHOLD = 0.20  # 20% deviation triggers escalation
+SUPPLIER_FIELDS = ("supplier_id", "supplier_name", "tier", "date")
+
+
+class ValidationResult:
+    """
+    Columnar validation output: one entry per validated record
+    `rows` maps each entry back to its record in the source batch
+    """
+
+    def __init__(self, rows: np.ndarray, reported: np.ndarray, expected: np.ndarray,
+                 deviation: np.ndarray, threshold: float):
+        self.rows = rows
+        self.reported = reported
+        self.expected = expected
+        self.deviation = deviation
+        self.threshold = threshold
+        self.high = deviation > threshold
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def high_indices(self) -> np.ndarray:
+        """Positions (within this result) of high-deviation records"""
+        return np.flatnonzero(self.high)
+
+    @property
+    def high_count(self) -> int:
+        return int(np.count_nonzero(self.high))
+
+    @property
+    def deviation_percentage(self) -> np.ndarray:
+        return np.round(self.deviation * 100, 2)
+
+    def records(self, describe: Callable[[np.ndarray], Dict[str, list]],
+                positions: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        Legacy validation dicts for the given positions (all by default)
+        describe maps source rows to supplier field columns (supplier_id, supplier_name, tier, date)
+        """
+        if positions is None:
+            positions = slice(None)
+        deviation = self.deviation[positions]
+        supplier = describe(self.rows[positions])
+        return [
+            {
+                "supplier_id": supplier_id,
+                "supplier_name": supplier_name,
+                "tier": tier,
+                "date": date,
+                "reported_stock": reported,
+                "expected_stock": expected,
+                "deviation": rounded,
+                "deviation_percentage": percentage,
+                "flag": "high_deviation" if escalate else "normal",
+                "escalate": escalate
+            }
+            for supplier_id, supplier_name, tier, date, reported, expected, rounded, percentage, escalate in zip(
+                supplier["supplier_id"], supplier["supplier_name"], supplier["tier"], supplier["date"],
+                self.reported[positions].tolist(), self.expected[positions].tolist(),
+                np.round(deviation, 3).tolist(), np.round(deviation * 100, 2).tolist(), self.high[positions].tolist()
+            )
+        ]
+
+
+def validate_deviations(reported: np.ndarray, expected: np.ndarray, valid: Optional[np.ndarray] = None,
+                        threshold: float = DEVIATION_THRESHOLD) -> ValidationResult:
+    """
+    Deviation |reported - expected| / expected for every valid record
+    Records with expected <= 0 get a deviation of 0, as before
+    """
+    if valid is None or valid.all():
+        rows = np.arange(len(reported))
+    else:
+        rows = np.flatnonzero(valid)
+        reported, expected = reported[rows], expected[rows]
+    deviation = np.zeros(len(rows), dtype=np.float64)
+    difference = np.subtract(reported, expected, dtype=np.float64)
+    np.abs(difference, out=difference)
+    np.divide(difference, expected, out=deviation, where=expected > 0)
+    return ValidationResult(rows, reported, expected, deviation, threshold)
+
+
+def validate_records(processed_data: List[Dict], threshold: float = DEVIATION_THRESHOLD) -> ValidationResult:
+    """
+    Validate monitored records, skipping poor-quality records
+    A MonitoredRecords view is validated from its input and flag column, without building its dicts
+    """
+    if isinstance(processed_data, MonitoredRecords):
+        if processed_data.columns is not None:
+            return validate_columns(processed_data.columns, processed_data.quality, threshold)
+        records, valid = processed_data.records, ~processed_data.quality.poor
+    else:
+        records = processed_data
+        valid = np.fromiter((record.get("data_quality") != "poor" for record in records), dtype=bool,
+                            count=len(records))
+    return validate_deviations(
+        np.array([record.get("reported_stock", 0) for record in records]),
+        np.array([record.get("expected_stock", 0) for record in records]),
+        valid,
+        threshold,
+    )
+
+
+def validate_columns(inventory: InventoryColumns, quality: Optional[QualityReport] = None,
+                     threshold: float = DEVIATION_THRESHOLD) -> ValidationResult:
+    """Validate columnar inventory data, skipping records the quality report marks as poor"""
+    valid = None if quality is None else ~quality.poor
+    return validate_deviations(inventory.reported_stock, inventory.expected_stock, valid, threshold)
+
+
+def describe_records(records: List[Dict]) -> Callable[[np.ndarray], Dict[str, list]]:
+    """Supplier field columns of record dicts (or of a MonitoredRecords input), for ValidationResult.records()"""
+    if isinstance(records, MonitoredRecords):
+        if records.columns is not None:
+            return describe_columns(records.columns)
+        records = records.records
+
+    def describe(rows: np.ndarray) -> Dict[str, list]:
+        selected = [records[row] for row in rows.tolist()]
+        return {field: [record.get(field) for record in selected] for field in SUPPLIER_FIELDS}
+    return describe
+
+
+def describe_columns(inventory: InventoryColumns) -> Callable[[np.ndarray], Dict[str, list]]:
+    """Supplier field columns of columnar inventory rows, for ValidationResult.records()"""
+    catalog = inventory.catalog
+
+    def describe(rows: np.ndarray) -> Dict[str, list]:
+        codes = inventory.supplier_code[rows].tolist()
+        return {
+            "supplier_id": [catalog.ids[code] for code in codes],
+            "supplier_name": [catalog.names[code] for code in codes],
+            "tier": catalog.tiers[inventory.supplier_code[rows]].tolist(),
+            "date": (np.datetime64(inventory.base_date, "D")
+                     - inventory.day_offset[rows].astype("timedelta64[D]")).astype(str).tolist()
+        }
+    return describe
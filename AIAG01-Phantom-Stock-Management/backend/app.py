@@ -3,7 +3,10 @@ AIAG01 - Phantom Stock Management Backend
 Flask API with Agentic AI Architecture
 """
 from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import numpy as np
+import atexit
 import sys
 import os
 
@@ -11,25 +14,61 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from simulation.supplier_simulator import SupplierSimulator
+from simulation.dataset_file import DatasetReplay, record_dataset
+from alerting.diff import diff
+from alerting.dispatch import dispatcher_from_env
+from alerting.lifecycle import ALERT_STATE_PATH, SEVERITY_RANK, AlertLifecycle, alert_type
+from analytics.audit_planner import AuditPlanner
+from analytics.forecast import FORECAST_STATE, SupplierForecaster
+from analytics.reachability import ReachabilityIndex
+from analytics.reconciliation import SupplierFlows
+from analytics.records import LazyRecords
+from analytics.risk import RISK_LEVELS
+from storage.alert_history import ALERT_HISTORY_PATH, AlertHistory, time_window
+from storage.issue_history import ISSUE_HISTORY_PATH, IssueHistory
 from agents.supply_monitoring_agent import SupplyMonitoringAgent
 from agents.validation_agent import ValidationAgent
 from agents.risk_analysis_agent import RiskAnalysisAgent
 from agents.supervisor_agent import SupervisorAgent
 
+class AgentJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes lazily built agent record lists"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, LazyRecords):
+            return o.to_list()
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = AgentJSONProvider(app)
 CORS(app)
 
 # Initialize components
 simulator = SupplierSimulator()
 monitoring_agent = SupplyMonitoringAgent()
-validation_agent = ValidationAgent()
-risk_agent = RiskAnalysisAgent()
-supervisor_agent = SupervisorAgent()
+validation_agent = ValidationAgent(
+    SupplierForecaster.load(FORECAST_STATE) if os.path.exists(FORECAST_STATE) else None
+)
+risk_agent = RiskAnalysisAgent(IssueHistory(ISSUE_HISTORY_PATH))
+supervisor_agent = SupervisorAgent(AlertLifecycle(ALERT_STATE_PATH))
+# Runs only persist lifecycle changes every PERSIST_INTERVAL: write what is left on shutdown
+atexit.register(supervisor_agent.lifecycle.flush)
+alert_dispatcher = dispatcher_from_env()  # delivers sent alerts to the configured sinks in the background
+# Sinks cannot run once the interpreter is exiting: spill what is still queued instead of flushing
+atexit.register(alert_dispatcher.close, 0)
+alert_history = AlertHistory(ALERT_HISTORY_PATH)  # every alert ever sent, queryable by supplier / severity / tier
+# Diff the first analysis against the last recorded run, not against nothing
+if alert_history.latest_run() is not None:
+    supervisor_agent.snapshot = alert_history.snapshot(alert_history.latest_run())
+reachability = ReachabilityIndex(simulator.graph)  # downstream/upstream closure of supplies_to links
+# Audit schedule for open recommendations (no supplier regions yet: one pool of auditors)
+audit_planner = AuditPlanner(default_auditors=int(os.environ.get("PHANTOM_AUDITORS_PER_DAY", "2")))
 
 # Global state (in production, use database)
-current_inventory_data = []
-current_shipment_data = []
 agent_outputs = {}
+threshold_sweeps = {}  # threshold what-if sweeps of the latest analysis
+MAX_THRESHOLDS = 1000  # candidate thresholds per sweep parameter
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -59,68 +98,157 @@ def get_suppliers():
         }
     })
 
+@app.route('/api/suppliers/<supplier_id>/blast-radius', methods=['GET'])
+def get_blast_radius(supplier_id):
+    """
+    Suppliers affected downstream if this supplier's stock is phantom, and its upstream suppliers
+    Optional query param: ?common_with=T1-002,T2-001 lists upstream suppliers shared with them
+    """
+    try:
+        result = reachability.blast_radius(supplier_id)
+        result["upstream"] = reachability.upstream_of(supplier_id)
+        common_with = request.args.get('common_with')
+        if common_with:
+            result["common_upstream"] = reachability.common_upstream([supplier_id] + common_with.split(","))
+    except KeyError as e:
+        return jsonify({"error": f"Unknown supplier: {e.args[0]}"}), 404
+    
+    return jsonify(result)
+
 @app.route('/api/inventory/reported', methods=['GET'])
 def get_reported_inventory():
     """Get reported inventory data"""
-    global current_inventory_data
-    
     days = request.args.get('days', default=30, type=int)
-    current_inventory_data = simulator.generate_inventory_data(days_back=days)
+    inventory_columns = simulator.generate_inventory_columns(days_back=days)
+    validation_agent.ingest_inventory(columns=inventory_columns)
     
     return jsonify({
-        "inventory_data": current_inventory_data,
-        "total_records": len(current_inventory_data)
+        "inventory_data": inventory_columns.to_records(),
+        "total_records": len(inventory_columns)
     })
 
 @app.route('/api/inventory/predicted', methods=['GET'])
 def get_predicted_inventory():
-    """Get predicted inventory (from Validation Agent)"""
-    if not current_inventory_data:
+    """
+    Get predicted inventory (from Validation Agent)
+    Optional query params: ?suppliers=T1-001,T2-001&start=YYYY-MM-DD&end=YYYY-MM-DD
+    """
+    if not validation_agent.predictor.supplier_ids:
         return jsonify({"error": "No inventory data available. Call /api/inventory/reported first"}), 400
     
-    predictions = []
-    for record in current_inventory_data:
-        prediction = validation_agent.predict_expected_inventory(record)
-        predictions.append(prediction)
+    suppliers = request.args.get('suppliers')
+    try:
+        output = validation_agent.predict_batch(
+            suppliers.split(",") if suppliers else None,
+            request.args.get('start'),
+            request.args.get('end')
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Invalid date range: {e}"}), 400
     
     return jsonify({
-        "predictions": predictions,
-        "total": len(predictions)
+        "predictions": output["predictions"],
+        "total": output["total"],
+        "cache": output["cache"]
     })
 
+def plan_audits(supervisor_output):
+    """Add the run's recommendations to the audit plan and drop suppliers whose alerts resolved"""
+    risk_scores = {
+        alert["supplier_id"]: alert["risk_score"]
+        for alert in supervisor_output["alerts"] if alert_type(alert) == "phantom_stock"
+    }
+    recommendations = supervisor_output["recommendations"]
+    supplier_ids = [r["supplier_id"] for r in recommendations]
+    downstream = []
+    for supplier_id in supplier_ids:
+        try:
+            downstream.append(len(reachability.downstream_of(supplier_id)))
+        except KeyError:
+            downstream.append(0)
+    audit_planner.add(supplier_ids, [r["action"] for r in recommendations],
+                      [risk_scores[supplier_id] for supplier_id in supplier_ids], downstream)
+    resolved = (supervisor_agent.lifecycle.get(alert_id) for alert_id in supervisor_output["resolved_alerts"])
+    audit_planner.remove(state.supplier_id for state in resolved
+                         if state is not None and state.alert_type == "phantom_stock")
+
 @app.route('/api/analysis/run', methods=['POST'])
 def run_full_analysis():
     """
     Run complete agentic analysis pipeline
     This is the main endpoint that orchestrates all agents
+    Optional query params: ?record=<name> saves the generated data,
+    ?replay=<name> re-runs the pipeline on a recorded dataset
     """
-    global current_inventory_data, current_shipment_data, agent_outputs
+    global agent_outputs, threshold_sweeps
+    
+    # Step 1: Generate fresh data (or replay a recorded dataset)
+    replay = request.args.get('replay')
+    record = request.args.get('record')
+    try:
+        if replay:
+            dataset = DatasetReplay(replay)
+            inventory_columns = dataset.inventory  # memory-mapped, like the shipments (None if not recorded)
+            shipment_columns = dataset.shipments
+        else:
+            inventory_columns = simulator.generate_inventory_columns(days_back=30)
+            shipment_columns = simulator.generate_shipment_columns()
+            if record:
+                record_dataset(record, inventory_columns, shipment_columns)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({"error": f"Dataset unavailable: {e}"}), 400
     
-    # Step 1: Generate fresh data
-    current_inventory_data = simulator.generate_inventory_data(days_back=30)
-    current_shipment_data = simulator.generate_shipment_data()
+    # Every step below works on the columns: record dicts are only built for responses
+    validation_agent.ingest_inventory(columns=inventory_columns)
     
     # Step 2: Supply Monitoring Agent processes data
-    monitoring_output = monitoring_agent.process_inventory_data(current_inventory_data)
-    shipment_output = monitoring_agent.process_shipment_data(current_shipment_data)
+    monitoring_output = monitoring_agent.process_inventory_data(columns=inventory_columns)
+    shipment_output = monitoring_agent.process_shipment_data([], shipment_columns)
     
     # Step 3: Validation Agent validates inventory
     validation_output = validation_agent.validate_inventory(monitoring_output["processed_data"])
     
+    # Fold new supplier-days into the expected-stock forecasters and checkpoint them
+    validation_agent.update_forecasts(columns=inventory_columns)
+    validation_agent.forecaster.save(FORECAST_STATE)
+    
+    # Step 3b: Reconcile reported stock with what downstream customers receive
+    flows = SupplierFlows.from_columns(inventory_columns, shipment_columns, simulator.catalog)
+    receipts = simulator.generate_receipts(flows.outbound, flows.phantom)
+    reconciliation = validation_agent.reconcile_network(simulator.graph, flows, receipts)
+    reconciliation_output = {key: value for key, value in reconciliation.items() if key != "result"}
+    
     # Step 4: Risk Analysis Agent calculates risks
     risk_output = risk_agent.analyze_risks(validation_output["validations"])
     
+    # Step 4b: Propagate supplier risk downstream through the supplier graph
+    propagation_output = risk_agent.propagate_risk(simulator.graph, risk_output["supplier_rollup"])
+    
     # Step 5: Supervisor Agent makes final decisions
     supervisor_output = supervisor_agent.verify_and_decide(risk_output, monitoring_output)
+    alert_dispatcher.submit(supervisor_output["alerts"])  # queued only; sinks deliver asynchronously
+    supervisor_output["run_id"] = alert_history.record(
+        supervisor_output["alerts"], supervisor_output["recommendations"], snapshot=supervisor_agent.snapshot
+    )
+    plan_audits(supervisor_output)
     
     # Store outputs
     agent_outputs = {
         "monitoring": monitoring_output,
         "shipment_monitoring": shipment_output,
-        "validation": validation_output,
-        "risk_analysis": risk_output,
+        "validation": {key: value for key, value in validation_output.items() if key != "deviation_sweep"},
+        "reconciliation": reconciliation_output,
+        "risk_analysis": {
+            key: value for key, value in risk_output.items()
+            if key not in ("scores", "supplier_rollup", "threshold_sweep")
+        },
+        "risk_propagation": propagation_output,
         "supervisor": supervisor_output
     }
+    threshold_sweeps = {
+        "risk": risk_output["threshold_sweep"],
+        "deviation": validation_output["deviation_sweep"]
+    }
     
     # Generate summary
     summary = supervisor_agent.generate_summary(agent_outputs)
@@ -131,26 +259,228 @@ def run_full_analysis():
         "agent_outputs": agent_outputs
     })
 
+RISK_QUERY_PARAMS = ('top', 'tier', 'level', 'min_score', 'distinct')
+
 @app.route('/api/risks', methods=['GET'])
 def get_risks():
-    """Get risk assessments"""
+    """
+    Get risk assessments
+    Optional query params (answered from the risk index, best first):
+    ?top=N&tier=1|2|3&level=CRITICAL|WARNING|NORMAL&min_score=S&distinct=true (one row per supplier)
+    """
+    if "risk_analysis" not in agent_outputs:
+        return jsonify({"error": "No analysis available. Run /api/analysis/run first"}), 400
+    
+    if not any(param in request.args for param in RISK_QUERY_PARAMS):
+        return jsonify(agent_outputs["risk_analysis"])
+    
+    level = request.args.get('level')
+    if level is not None:
+        level = level.upper()
+        if level not in RISK_LEVELS:
+            return jsonify({"error": f"Invalid level: {level}"}), 400
+    top = request.args.get('top', type=int)
+    tier = request.args.get('tier', type=int)
+    min_score = request.args.get('min_score', type=float)
+    distinct = request.args.get('distinct', default=False, type=lambda value: value.lower() == "true")
+    
+    return jsonify(risk_agent.query_risks(top, tier, level, min_score, distinct))
+
+@app.route('/api/risks/suppliers', methods=['GET'])
+def get_supplier_risks():
+    """Get one rolled-up risk row per supplier (worst first)"""
     if "risk_analysis" not in agent_outputs:
         return jsonify({"error": "No analysis available. Run /api/analysis/run first"}), 400
     
-    return jsonify(agent_outputs["risk_analysis"])
+    risk_output = agent_outputs["risk_analysis"]
+    return jsonify({
+        "supplier_risks": risk_output["supplier_risks"],
+        "suppliers_assessed": risk_output["suppliers_assessed"],
+        "critical_count": risk_output["supplier_critical_count"],
+        "warning_count": risk_output["supplier_warning_count"],
+        "windows": [f"{window}d" for window in risk_agent.rollup.windows]
+    })
+
+def parse_thresholds(name, default):
+    """
+    Candidate thresholds from a query param: a comma list (60,70,80) or a range start:stop:step (inclusive)
+    The count is checked against MAX_THRESHOLDS before a range is expanded
+    """
+    value = request.args.get(name)
+    if not value:
+        return default
+    if ":" in value:
+        start, stop, step = (float(part) for part in value.split(":"))
+        if not step > 0:
+            raise ValueError(f"{name} step must be positive")
+        count = np.ceil((stop + step / 2 - start) / step)
+        if not count <= MAX_THRESHOLDS:
+            raise ValueError(f"{name} has more than {MAX_THRESHOLDS} thresholds")
+        return np.arange(start, stop + step / 2, step).round(6).tolist()
+    parts = value.split(",")
+    if len(parts) > MAX_THRESHOLDS:
+        raise ValueError(f"{name} has more than {MAX_THRESHOLDS} thresholds")
+    return [float(part) for part in parts]
+
+@app.route('/api/risks/sweep', methods=['GET'])
+def get_threshold_sweep():
+    """
+    What-if sensitivity table over risk and deviation thresholds (no pipeline re-run)
+    Optional query params: ?critical=50:90:5&warning=20:60:5&deviation=0.05:0.5:0.05&suppliers=true
+    """
+    if not threshold_sweeps:
+        return jsonify({"error": "No analysis available. Run /api/analysis/run first"}), 400
+    
+    try:
+        critical = parse_thresholds('critical', [50, 60, 70, 80, 90])
+        warning = parse_thresholds('warning', [20, 30, 40, 50, 60])
+        deviation = parse_thresholds('deviation', [0.05, 0.1, 0.15, 0.2, 0.3, 0.5])
+    except ValueError as e:
+        return jsonify({"error": f"Invalid thresholds: {e}"}), 400
+    if len(critical) * len(warning) > 10000:
+        return jsonify({"error": "Too many threshold pairs (limit 10000)"}), 400
+    suppliers = request.args.get('suppliers', default=False, type=lambda value: value.lower() == "true")
+    
+    risk_sweep = threshold_sweeps["risk"]
+    deviation_sweep = threshold_sweeps["deviation"]
+    return jsonify({
+        "risk": {
+            "current": risk_sweep.levels(risk_agent.critical_threshold, risk_agent.warning_threshold),
+            "table": risk_sweep.level_records(critical, warning, suppliers),
+            "total_assessed": len(risk_sweep),
+            "suppliers": risk_sweep.supplier_count
+        },
+        "deviation": {
+            "current": deviation_sweep.threshold_records(
+                [validation_agent.deviation_threshold], True, "deviation_threshold"
+            )[0],
+            "table": deviation_sweep.threshold_records(deviation, suppliers, "deviation_threshold"),
+            "total_validated": len(deviation_sweep),
+            "suppliers": deviation_sweep.supplier_count
+        }
+    })
+
+@app.route('/api/risks/propagated', methods=['GET'])
+def get_propagated_risks():
+    """Get supplier risk propagated downstream through the supplier graph"""
+    if "risk_propagation" not in agent_outputs:
+        return jsonify({"error": "No analysis available. Run /api/analysis/run first"}), 400
+    
+    return jsonify(agent_outputs["risk_propagation"])
+
+@app.route('/api/audits/plan', methods=['GET'])
+def get_audit_plan():
+    """
+    Get the audit schedule: open recommendations ranked into the auditor capacity of the next days
+    Optional query param: ?limit=N (first N audits)
+    """
+    return jsonify({
+        "summary": audit_planner.summary(),
+        "schedule": audit_planner.schedule(limit=request.args.get('limit', type=int))
+    })
+
+@app.route('/api/reconciliation', methods=['GET'])
+def get_reconciliation():
+    """Get cross-tier mass-balance mismatches"""
+    if "reconciliation" not in agent_outputs:
+        return jsonify({"error": "No analysis available. Run /api/analysis/run first"}), 400
+    
+    return jsonify(agent_outputs["reconciliation"])
 
 @app.route('/api/alerts', methods=['GET'])
 def get_alerts():
-    """Get active alerts"""
+    """
+    Get the alerts sent by the latest analysis (new, escalated or due for a reminder)
+    Optional query param: ?state=active lists every open or acknowledged alert instead
+    """
+    if request.args.get('state') == 'active':
+        active = supervisor_agent.lifecycle.active()
+        return jsonify({
+            "alerts": active,
+            "total_alerts": len(active),
+            "counts": supervisor_agent.lifecycle.counts()
+        })
     if "supervisor" not in agent_outputs:
         return jsonify({"error": "No analysis available. Run /api/analysis/run first"}), 400
     
     return jsonify({
         "alerts": agent_outputs["supervisor"]["alerts"],
         "recommendations": agent_outputs["supervisor"]["recommendations"],
-        "total_alerts": agent_outputs["supervisor"]["total_alerts"]
+        "total_alerts": agent_outputs["supervisor"]["total_alerts"],
+        "suppressed_alerts": agent_outputs["supervisor"]["suppressed_alerts"],
+        "resolved_alerts": agent_outputs["supervisor"]["resolved_alerts"],
+        "run_id": agent_outputs["supervisor"]["run_id"]
     })
 
+@app.route('/api/alerts/changes', methods=['GET'])
+def get_alert_changes():
+    """
+    Get what changed since an earlier analysis run: new, resolved and escalated alerts and recommendations
+    Optional query params: ?since=<run_id> (default: the run before) &run_id=<run_id> (default: the latest)
+    """
+    run_id = request.args.get('run_id', type=int) or alert_history.latest_run()
+    if run_id is None:
+        return jsonify({"error": "No analysis available. Run /api/analysis/run first"}), 400
+    since = request.args.get('since', type=int) or alert_history.previous_run(run_id)
+    current = alert_history.snapshot(run_id)
+    if current is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    previous = {} if since is None else alert_history.snapshot(since)
+    if previous is None:
+        return jsonify({"error": f"Unknown run: {since}"}), 404
+    
+    return jsonify({"since_run": since, "run_id": run_id, **diff(previous, current)})
+
+@app.route('/api/alerts/history', methods=['GET'])
+def get_alert_history():
+    """
+    Get recorded alerts, newest first, one page at a time
+    Optional query params: ?supplier_id=&severity=CRITICAL|HIGH|WARNING&tier=&run_id=
+    &days=N (or &since=&until= ISO timestamps)&limit=100&cursor=<next_cursor of the previous page>
+    """
+    severity = request.args.get('severity')
+    if severity is not None:
+        severity = severity.upper()
+        if severity not in SEVERITY_RANK:
+            return jsonify({"error": f"Invalid severity: {severity}"}), 400
+    try:
+        since, until = time_window(request.args.get('days', type=float), request.args.get('since'),
+                                   request.args.get('until'))
+        result = alert_history.query(
+            supplier_id=request.args.get('supplier_id'), severity=severity, tier=request.args.get('tier', type=int),
+            since=since, until=until, run_id=request.args.get('run_id', type=int),
+            limit=request.args.get('limit', default=100, type=int), cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(result)
+
+@app.route('/api/alerts/dispatch', methods=['GET'])
+def get_alert_dispatch():
+    """Delivery metrics of every configured alert sink"""
+    return jsonify({"sinks": alert_dispatcher.metrics()})
+
+@app.route('/api/alerts/<alert_id>/acknowledge', methods=['POST'])
+def acknowledge_alert(alert_id):
+    """Acknowledge an alert: no reminders until the acknowledgement expires or the alert escalates"""
+    state = supervisor_agent.lifecycle.acknowledge(alert_id)
+    if state is None:
+        return jsonify({"error": f"Unknown alert: {alert_id}"}), 404
+    supervisor_agent.lifecycle.flush()
+    return jsonify(state.to_dict())
+
+@app.route('/api/alerts/<alert_id>/resolve', methods=['POST'])
+def resolve_alert(alert_id):
+    """Resolve an alert by hand; a later analysis raising it again reopens it"""
+    state = supervisor_agent.lifecycle.resolve(alert_id)
+    if state is None:
+        return jsonify({"error": f"Unknown alert: {alert_id}"}), 404
+    if state.alert_type == "phantom_stock":
+        audit_planner.remove([state.supplier_id])
+    supervisor_agent.lifecycle.flush()
+    return jsonify(state.to_dict())
+
 @app.route('/api/agents/reasoning', methods=['GET'])
 def get_agent_reasoning():
     """Get reasoning process for all agents"""
@@ -189,7 +519,7 @@ def get_dashboard_data():
     return jsonify({
         "suppliers": simulator.get_all_suppliers(),
         "summary": supervisor_agent.generate_summary(agent_outputs),
-        "alerts": agent_outputs.get("supervisor", {}).get("alerts", []),
+        "alerts": supervisor_agent.lifecycle.active(),
         "critical_risks": agent_outputs.get("risk_analysis", {}).get("critical_risks", []),
         "warnings": agent_outputs.get("risk_analysis", {}).get("warnings", [])
     })
@@ -201,9 +531,20 @@ if __name__ == '__main__':
     print("\n📋 Available Endpoints:")
     print("  GET  /api/health - Health check")
     print("  GET  /api/suppliers - List all suppliers")
-    print("  POST /api/analysis/run - Run full agentic analysis")
-    print("  GET  /api/risks - Get risk assessments")
-    print("  GET  /api/alerts - Get active alerts")
+    print("  GET  /api/suppliers/<id>/blast-radius - Downstream suppliers affected by a supplier")
+    print("  POST /api/analysis/run - Run full agentic analysis (?record=<name> / ?replay=<name>)")
+    print("  GET  /api/risks - Get risk assessments (?top=N&tier=&level=&min_score=&distinct=true)")
+    print("  GET  /api/risks/suppliers - Get per-supplier risk roll-up")
+    print("  GET  /api/risks/propagated - Get risk propagated through the supplier graph")
+    print("  GET  /api/risks/sweep - What-if counts over candidate risk/deviation thresholds")
+    print("  GET  /api/audits/plan - Get the capacity-constrained audit schedule")
+    print("  GET  /api/reconciliation - Get cross-tier mass-balance mismatches")
+    print("  GET  /api/alerts - Get alerts sent by the latest analysis (?state=active for all open alerts)")
+    print("  GET  /api/alerts/history - Query recorded alerts (?supplier_id=&severity=&tier=&days=&cursor=)")
+    print("  GET  /api/alerts/changes - Get alert changes since an earlier run (?since=<run_id>)")
+    print("  GET  /api/alerts/dispatch - Get alert delivery metrics per sink")
+    print("  POST /api/alerts/<id>/acknowledge - Acknowledge an alert")
+    print("  POST /api/alerts/<id>/resolve - Resolve an alert")
     print("  GET  /api/agents/reasoning - Get agent reasoning")
     print("  GET  /api/dashboard - Get dashboard data")
     
@@ -1,42 +1,30 @@
 """
 Supply Monitoring Agent - Data validation and quality checks
 """
-from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Sequence
+from analytics.anomalies import rollup_columns, rollup_records
+from analytics.quality import check_inventory_columns, check_inventory_records
+from simulation.columnar import InventoryColumns
 
-def monitoring_agent(inventory_data: List[Dict]) -> Dict:
-    processed_data = []
-    anomalies = []
+def monitoring_agent(inventory_data: Optional[List[Dict]] = None, columns: Optional[InventoryColumns] = None,
+                     fields: Optional[Sequence[str]] = None) -> Dict:
+    # Columnar batches are checked as columns; processed records are built only when serialized
+    if columns is not None:
+        quality = check_inventory_columns(columns)
+        rollup = rollup_columns(quality, columns)
+    else:
+        quality = check_inventory_records(inventory_data)
+        rollup = rollup_records(quality, inventory_data)
     
-    for record in inventory_data:
-        quality_issues = []
-        
-        if record["reported_stock"] < 0:
-            quality_issues.append("negative_stock")
-        
-        if record["production_rate"] <= 0:
-            quality_issues.append("invalid_production_rate")
-        
-        if quality_issues:
-            anomalies.append({
-                "supplier_id": record["supplier_id"],
-                "issues": quality_issues,
-                "severity": "high"
-            })
-        
-        processed_record = {
-            **record,
-            "monitored_at": datetime.now().isoformat(),
-            "data_quality": "poor" if quality_issues else "good",
-            "quality_issues": quality_issues
-        }
-        
-        processed_data.append(processed_record)
+    anomalies = [{**anomaly, "severity": "high"} for anomaly in rollup]
+    
+    processed_data = quality.lazy(inventory_data, columns, fields)
     
     return {
         "agent": "Supply Monitoring Agent",
         "processed_data": processed_data,
+        "monitored_at": quality.monitored_at,
         "anomalies": anomalies,
         "total_records": len(processed_data),
-        "anomaly_count": len(anomalies)
+        "anomaly_count": quality.anomaly_count
     }
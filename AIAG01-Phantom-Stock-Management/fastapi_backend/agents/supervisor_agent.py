@@ -3,6 +3,7 @@ Supervisor Agent - Makes final decisions and generates alerts
 """
 from datetime import datetime
 from typing import Dict
+from analytics.anomalies import group_by_supplier
 
 def supervisor_agent(risk_analysis: Dict, monitoring_data: Dict) -> Dict:
     alerts = []
@@ -58,12 +59,19 @@ def supervisor_agent(risk_analysis: Dict, monitoring_data: Dict) -> Dict:
         alerts.append(alert)
         recommendations.append(recommendation)
     
-    for anomaly in monitoring_data.get("anomalies", []):
+    for supplier_id, issues in group_by_supplier(monitoring_data.get("anomalies", [])).items():
         alert = {
-            "alert_id": f"ALERT-DQ-{anomaly['supplier_id']}-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            "alert_id": f"ALERT-DQ-{supplier_id}-{datetime.now().strftime('%Y%m%d%H%M%S')}",
             "severity": "HIGH",
-            "supplier_id": anomaly["supplier_id"],
-            "message": f"Data quality issues: {', '.join(anomaly['issues'])}",
+            "supplier_id": supplier_id,
+            "message": "Data quality issues: " + ", ".join(
+                f"{issue['issue']} ({issue['count']} records)" for issue in issues
+            ),
+            "issues": [
+                {key: issue[key] for key in ("issue", "count", "first_seen", "last_seen", "sample_records")}
+                for issue in issues
+            ],
+            "record_count": sum(issue["count"] for issue in issues),
             "timestamp": datetime.now().isoformat()
         }
         alerts.append(alert)
@@ -1,8 +1,18 @@
 """
 AIAG01 - Phantom Stock Management Backend (FastAPI)
 """
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+import sys
+import os
+
+# Add parent directory to path (shared simulation engine)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alerting.lifecycle import SEVERITY_RANK
+from analytics.records import materialize
+from storage.alert_history import time_window
 from services.supplier_service import SupplierService
 from services.agent_service import AgentService
 
@@ -49,25 +59,44 @@ def get_reported_inventory(days: int = 30):
     }
 
 @app.post("/api/analysis/run")
-def run_analysis():
-    result = agent_service.run_full_analysis()
-    return result
+def run_analysis(replay: Optional[str] = None, record: Optional[str] = None):
+    try:
+        result = agent_service.run_full_analysis(replay=replay, record=record)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=f"Dataset unavailable: {e}")
+    return materialize(result)
 
 @app.get("/api/risks")
 def get_risks():
-    return agent_service.get_risks()
+    return materialize(agent_service.get_risks())
 
 @app.get("/api/alerts")
 def get_alerts():
     return agent_service.get_alerts()
 
+@app.get("/api/alerts/history")
+def get_alert_history(supplier_id: Optional[str] = None, severity: Optional[str] = None,
+                      tier: Optional[int] = None, run_id: Optional[int] = None, days: Optional[float] = None,
+                      since: Optional[str] = None, until: Optional[str] = None, limit: int = 100,
+                      cursor: Optional[str] = None):
+    if severity is not None and severity.upper() not in SEVERITY_RANK:
+        raise HTTPException(status_code=400, detail=f"Invalid severity: {severity}")
+    try:
+        since_time, until_time = time_window(days, since, until)
+        return agent_service.get_alert_history(
+            supplier_id=supplier_id, severity=severity and severity.upper(), tier=tier, run_id=run_id,
+            since=since_time, until=until_time, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/agents/reasoning")
 def get_agent_reasoning():
     return agent_service.get_reasoning()
 
 @app.get("/api/dashboard")
 def get_dashboard():
-    return agent_service.get_dashboard_data()
+    return materialize(agent_service.get_dashboard_data())
 
 if __name__ == "__main__":
     import uvicorn
@@ -2,8 +2,10 @@
 Agent Service - Orchestrates all AI agents
 """
 from datetime import datetime
-from typing import Dict, List
-from services.supplier_service import SupplierService
+from typing import Dict, List, Optional
+from services.supplier_service import RECORD_FIELDS, SupplierService
+from simulation.dataset_file import DatasetReplay, record_dataset
+from storage.alert_history import ALERT_HISTORY_PATH, AlertHistory
 from agents.monitoring_agent import monitoring_agent
 from agents.validation_agent import validation_agent
 from agents.risk_agent import risk_agent
@@ -13,14 +15,22 @@ class AgentService:
     def __init__(self):
         self.supplier_service = SupplierService()
         self.agent_outputs = {}
+        self.alert_history = AlertHistory(ALERT_HISTORY_PATH, source="fastapi")
     
-    def run_full_analysis(self) -> Dict:
-        inventory_data = self.supplier_service.generate_inventory_data(30)
+    def run_full_analysis(self, replay: Optional[str] = None, record: Optional[str] = None) -> Dict:
+        if replay:
+            inventory_data, inventory_columns = None, DatasetReplay(replay).inventory
+        else:
+            inventory_data, inventory_columns = None, self.supplier_service.generate_inventory_columns(30)
+            if record:
+                record_dataset(record, inventory_columns)
         
-        monitoring_output = monitoring_agent(inventory_data)
+        # Generated columns go through the batch checks as they are; records are built only for the response
+        monitoring_output = monitoring_agent(inventory_data, inventory_columns, fields=RECORD_FIELDS)
         validation_output = validation_agent(monitoring_output["processed_data"])
         risk_output = risk_agent(validation_output["validations"])
         supervisor_output = supervisor_agent(risk_output, monitoring_output)
+        self.alert_history.record(supervisor_output["alerts"], supervisor_output["recommendations"])
         
         self.agent_outputs = {
             "monitoring": monitoring_output,
@@ -58,6 +68,9 @@ class AgentService:
             "total_alerts": self.agent_outputs["supervisor"]["total_alerts"]
         }
     
+    def get_alert_history(self, **filters) -> Dict:
+        return self.alert_history.query(**filters)
+    
     def get_reasoning(self) -> Dict:
         return {
             "agents": {
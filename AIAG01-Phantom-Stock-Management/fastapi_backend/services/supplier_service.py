@@ -1,13 +1,17 @@
 """
 Supplier Service - Multi-tier supplier simulation
 """
-import random
-from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
+from simulation.columnar import INVENTORY_FIELDS, InventoryColumns, SupplierCatalog, generate_inventory_columns, make_rng
+from simulation.supplier_graph import SupplierGraph
+
+# Inventory records exposed by this service (no ground-truth phantom flag)
+RECORD_FIELDS = tuple(field for field in INVENTORY_FIELDS if field != "has_phantom_stock")
 
 class SupplierService:
-    def __init__(self):
-        self.suppliers = {
+    def __init__(self, seed: Optional[int] = None, graph: Optional[SupplierGraph] = None):
+        self.graph = graph
+        self.suppliers = graph.suppliers_by_tier() if graph is not None else {
             "tier1": [
                 {"id": "T1-001", "name": "Tier1 Electronics Inc", "tier": 1, "capacity": 10000, "reliability": 0.95},
                 {"id": "T1-002", "name": "Tier1 Components Ltd", "tier": 1, "capacity": 8000, "reliability": 0.90}
@@ -23,37 +27,14 @@ class SupplierService:
                 {"id": "T3-003", "name": "Tier3 Plastics Inc", "tier": 3, "capacity": 2800, "reliability": 0.78}
             ]
         }
+        self.catalog = graph.catalog if graph is not None else SupplierCatalog.from_suppliers(self.get_all_suppliers())
+        self.rng = make_rng(seed)
     
     def get_all_suppliers(self) -> List[Dict]:
         return [s for tier in self.suppliers.values() for s in tier]
     
+    def generate_inventory_columns(self, days_back: int = 30) -> InventoryColumns:
+        return generate_inventory_columns(self.catalog, days_back=days_back, seed=self.rng)
+    
     def generate_inventory_data(self, days_back: int = 30) -> List[Dict]:
-        inventory_data = []
-        for tier_name, suppliers in self.suppliers.items():
-            for supplier in suppliers:
-                production_rate = supplier["capacity"] * 0.7
-                consumption_rate = production_rate * 0.8
-                has_phantom_stock = random.random() < 0.3
-                
-                for day in range(days_back):
-                    date = datetime.now() - timedelta(days=day)
-                    expected_stock = production_rate - consumption_rate + random.randint(-100, 100)
-                    
-                    if has_phantom_stock and day < 10:
-                        reported_stock = expected_stock * random.uniform(1.3, 1.8)
-                    else:
-                        reported_stock = expected_stock * random.uniform(0.95, 1.05)
-                    
-                    inventory_data.append({
-                        "supplier_id": supplier["id"],
-                        "supplier_name": supplier["name"],
-                        "tier": supplier["tier"],
-                        "date": date.strftime("%Y-%m-%d"),
-                        "reported_stock": max(0, int(reported_stock)),
-                        "production_rate": int(production_rate),
-                        "consumption_rate": int(consumption_rate),
-                        "expected_stock": max(0, int(expected_stock)),
-                        "reliability": supplier["reliability"]
-                    })
-        
-        return inventory_data
+        return self.generate_inventory_columns(days_back).to_records(fields=RECORD_FIELDS)
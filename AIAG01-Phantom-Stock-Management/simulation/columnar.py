@@ -0,0 +1,392 @@
+"""
+Columnar Inventory Engine
+Vectorized (NumPy) generation of supplier inventory and shipment data as whole columns
+"""
+from collections.abc import Sequence as SequenceABC
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+# Field order of the legacy inventory record dicts
+INVENTORY_FIELDS = (
+    "supplier_id",
+    "supplier_name",
+    "tier",
+    "date",
+    "reported_stock",
+    "production_rate",
+    "consumption_rate",
+    "expected_stock",
+    "reliability",
+    "has_phantom_stock",
+)
+
+# Field order of the legacy shipment record dicts
+SHIPMENT_FIELDS = (
+    "supplier_id",
+    "shipment_id",
+    "quantity",
+    "scheduled_date",
+    "actual_date",
+    "delay_days",
+    "status",
+)
+
+# Rows generated per supplier block; every block has its own RNG stream so
+# any slice of the dataset can be regenerated without touching the rest
+BLOCK_ROWS = 65536
+MAX_SHIPMENTS_PER_SUPPLIER = 10
+
+SeedLike = Union[None, int, np.random.Generator, np.random.SeedSequence]
+
+
+def make_rng(seed: SeedLike = None) -> np.random.Generator:
+    """Return a NumPy generator, reusing one that is passed in"""
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def root_seed(seed: SeedLike = None) -> np.random.SeedSequence:
+    """Root seed sequence for block streams (a generator contributes a fresh draw)"""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(int(seed.integers(2 ** 63)))
+    return np.random.SeedSequence(seed)
+
+
+def block_rng(root: np.random.SeedSequence, stream: int, block_index: int) -> np.random.Generator:
+    """Independent, deterministic generator for one (stream, block) pair"""
+    return np.random.default_rng(
+        np.random.SeedSequence(root.entropy, spawn_key=tuple(root.spawn_key) + (stream, block_index))
+    )
+
+
+def date_labels(base_date: date, days: int) -> np.ndarray:
+    """'%Y-%m-%d' strings for base_date minus 0..days-1 days"""
+    return np.array(
+        [(base_date - timedelta(days=day)).strftime("%Y-%m-%d") for day in range(days)],
+        dtype=object,
+    )
+
+
+class SupplierCatalog:
+    """
+    Supplier dictionary for columnar data
+    Row i describes the supplier with integer code i
+    """
+
+    def __init__(self, ids: Sequence[str], names: Sequence[str], tiers: Sequence[int],
+                 capacity: Sequence[float], reliability: Sequence[float]):
+        # Label sequences may be lazy (see simulation.supplier_graph.TierLabels)
+        self.ids = ids if isinstance(ids, SequenceABC) else list(ids)
+        self.names = names if isinstance(names, SequenceABC) else list(names)
+        self.tiers = np.asarray(tiers, dtype=np.int8)
+        self.capacity = np.asarray(capacity, dtype=np.float64)
+        self.reliability = np.asarray(reliability, dtype=np.float64)
+        self._codes = None
+
+    @classmethod
+    def from_suppliers(cls, suppliers: List[Dict]) -> "SupplierCatalog":
+        """Build a catalog from supplier dicts ({"id", "name", "tier", "capacity", ...})"""
+        return cls(
+            ids=[s["id"] for s in suppliers],
+            names=[s["name"] for s in suppliers],
+            tiers=[s["tier"] for s in suppliers],
+            capacity=[s["capacity"] for s in suppliers],
+            reliability=[s.get("reliability", 0.0) for s in suppliers],
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def code_of(self, supplier_id: str) -> int:
+        """Integer code of a supplier id"""
+        if not isinstance(self.ids, list):
+            return self.ids.index(supplier_id)
+        if self._codes is None:
+            self._codes = {supplier_id: code for code, supplier_id in enumerate(self.ids)}
+        return self._codes[supplier_id]
+
+
+class _Columns:
+    """Shared slicing/concatenation for column sets tied to a SupplierCatalog"""
+
+    ARRAYS: tuple = ()
+    DTYPES: Dict[str, type] = {}  # array name -> dtype, for empty column sets
+
+    def __init__(self, catalog: SupplierCatalog, base_date: date, **arrays: np.ndarray):
+        self.catalog = catalog
+        self.base_date = base_date
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self) -> int:
+        return len(self.supplier_code)
+
+    def slice(self, start: int, stop: int):
+        """Row range [start, stop) as a view sharing the same buffers"""
+        return type(self)(self.catalog, self.base_date,
+                          **{name: getattr(self, name)[start:stop] for name in self.ARRAYS})
+
+    def take(self, rows: np.ndarray):
+        """Selected rows (any order) as a new column set"""
+        return type(self)(self.catalog, self.base_date,
+                          **{name: getattr(self, name)[rows] for name in self.ARRAYS})
+
+    @classmethod
+    def empty(cls, catalog: SupplierCatalog, base_date: date):
+        """Column set with no rows"""
+        return cls(catalog, base_date, **{name: np.zeros(0, dtype=cls.DTYPES[name]) for name in cls.ARRAYS})
+
+    @classmethod
+    def concat(cls, parts: Sequence["_Columns"], catalog: Optional[SupplierCatalog] = None,
+               base_date: Optional[date] = None):
+        """
+        Concatenate column sets generated from the same catalog
+        No parts give an empty column set for catalog and base_date (required then)
+        """
+        if not parts:
+            if catalog is None or base_date is None:
+                raise ValueError("concatenating no parts needs a catalog and base_date")
+            return cls.empty(catalog, base_date)
+        first = parts[0]
+        if len(parts) == 1:
+            return first
+        return cls(first.catalog, first.base_date,
+                   **{name: np.concatenate([getattr(p, name) for p in parts]) for name in cls.ARRAYS})
+
+    def _field_values(self, field: str) -> list:
+        if field in ("supplier_id", "supplier_name"):
+            labels = self.catalog.ids if field == "supplier_id" else self.catalog.names
+            return [labels[code] for code in self.supplier_code.tolist()]
+        return getattr(self, field).tolist()
+
+    def to_records(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Materialize rows as legacy record dicts"""
+        fields = tuple(fields or self.FIELDS)
+        values = [self._field_values(field) for field in fields]
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+
+class InventoryColumns(_Columns):
+    """
+    Inventory records as parallel NumPy arrays, one row per supplier-day
+    Rows are only turned into dicts when a caller asks for them
+    """
+
+    FIELDS = INVENTORY_FIELDS
+    ARRAYS = ("supplier_code", "day_offset", "reported_stock", "expected_stock",
+              "production_rate", "consumption_rate", "has_phantom_stock")
+    DTYPES = {"supplier_code": np.int32, "day_offset": np.int32, "reported_stock": np.int64,
+              "expected_stock": np.int64, "production_rate": np.int64, "consumption_rate": np.int64,
+              "has_phantom_stock": np.bool_}
+
+    @property
+    def tier(self) -> np.ndarray:
+        return self.catalog.tiers[self.supplier_code]
+
+    @property
+    def reliability(self) -> np.ndarray:
+        return self.catalog.reliability[self.supplier_code]
+
+    @property
+    def dates(self) -> np.ndarray:
+        """Record dates as datetime64[D]"""
+        return np.datetime64(self.base_date, "D") - self.day_offset.astype("timedelta64[D]")
+
+    def _field_values(self, field: str) -> list:
+        if field == "date":
+            days = int(self.day_offset.max()) + 1 if len(self) else 0
+            return date_labels(self.base_date, days)[self.day_offset].tolist()
+        return super()._field_values(field)
+
+
+class ShipmentColumns(_Columns):
+    """Shipment log as parallel NumPy arrays, one row per shipment"""
+
+    FIELDS = SHIPMENT_FIELDS
+    ARRAYS = ("supplier_code", "sequence", "quantity", "scheduled_offset", "actual_offset", "delay_days")
+    DTYPES = {"supplier_code": np.int32, "sequence": np.int32, "quantity": np.int64,
+              "scheduled_offset": np.int64, "actual_offset": np.int64, "delay_days": np.int64}
+
+    @property
+    def status(self) -> np.ndarray:
+        return np.where(self.delay_days > 0, "delayed", "on_time")
+
+    def _field_values(self, field: str) -> list:
+        if field == "shipment_id":
+            ids = super()._field_values("supplier_id")
+            return [f"SH-{sid}-{seq:03d}" for sid, seq in zip(ids, self.sequence.tolist())]
+        if field in ("scheduled_date", "actual_date"):
+            offsets = self.scheduled_offset if field == "scheduled_date" else self.actual_offset
+            if not len(self):
+                return []
+            low = int(offsets.min())
+            labels = date_labels(self.base_date + timedelta(days=-low), int(offsets.max()) - low + 1)
+            return labels[offsets - low].tolist()
+        return super()._field_values(field)
+
+
+def _inventory_block(catalog: SupplierCatalog, start: int, stop: int, days_back: int,
+                     rng: np.random.Generator, phantom_rate: float, phantom_days: Optional[int],
+                     base_date: date) -> InventoryColumns:
+    """Inventory rows for suppliers [start, stop), all drawn from one generator"""
+    n_suppliers = stop - start
+    n_rows = n_suppliers * days_back
+
+    production = catalog.capacity[start:stop] * 0.7  # 70% utilization
+    consumption = production * 0.8  # 80% gets consumed
+    supplier_phantom = rng.random(n_suppliers) < phantom_rate
+
+    local = np.repeat(np.arange(n_suppliers, dtype=np.int32), days_back)
+    day_offset = np.tile(np.arange(days_back, dtype=np.int32), n_suppliers)
+    has_phantom_stock = supplier_phantom[local]
+
+    expected = (production - consumption)[local] + rng.integers(-100, 101, size=n_rows)
+
+    phantom_rows = has_phantom_stock if phantom_days is None else has_phantom_stock & (day_offset < phantom_days)
+    low = np.where(phantom_rows, 1.3, 0.95)
+    high = np.where(phantom_rows, 1.8, 1.05)
+    reported = expected * (low + rng.random(n_rows) * (high - low))
+
+    return InventoryColumns(
+        catalog, base_date,
+        supplier_code=local + np.int32(start),
+        day_offset=day_offset,
+        reported_stock=np.maximum(reported.astype(np.int64), 0),
+        expected_stock=np.maximum(expected.astype(np.int64), 0),
+        production_rate=production.astype(np.int64)[local],
+        consumption_rate=consumption.astype(np.int64)[local],
+        has_phantom_stock=has_phantom_stock,
+    )
+
+
+def _shipment_block(catalog: SupplierCatalog, start: int, stop: int, rng: np.random.Generator,
+                    base_date: date) -> ShipmentColumns:
+    """5-10 recent shipments for each supplier in [start, stop)"""
+    counts = rng.integers(5, MAX_SHIPMENTS_PER_SUPPLIER + 1, size=stop - start)
+    n_rows = int(counts.sum())
+    local = np.repeat(np.arange(stop - start, dtype=np.int32), counts)
+    sequence = np.arange(n_rows, dtype=np.int32) - np.repeat(np.cumsum(counts) - counts, counts).astype(np.int32)
+
+    delayed = rng.random(n_rows) < 0.2
+    delay_days = np.where(delayed, rng.integers(0, 15, size=n_rows), 0)
+
+    return ShipmentColumns(
+        catalog, base_date,
+        supplier_code=local + np.int32(start),
+        sequence=sequence,
+        quantity=rng.integers(500, 2001, size=n_rows),
+        scheduled_offset=rng.integers(1, 31, size=n_rows),
+        actual_offset=rng.integers(1, 31, size=n_rows) - delay_days,
+        delay_days=delay_days,
+    )
+
+
+INVENTORY_STREAM = 0
+SHIPMENT_STREAM = 1
+
+
+def supplier_blocks(n_suppliers: int, rows_per_supplier: int) -> List[range]:
+    """Fixed supplier ranges that each hold about BLOCK_ROWS rows"""
+    size = max(1, BLOCK_ROWS // max(rows_per_supplier, 1))
+    return [range(start, min(start + size, n_suppliers)) for start in range(0, n_suppliers, size)]
+
+
+def iter_inventory_blocks(catalog: SupplierCatalog, days_back: int = 30, seed: SeedLike = None,
+                          phantom_rate: float = 0.3, phantom_days: Optional[int] = 10,
+                          base_date: Optional[date] = None, blocks: Optional[Sequence[int]] = None
+                          ) -> Iterator[InventoryColumns]:
+    """Yield inventory data one supplier block at a time (optionally only the given block indexes)"""
+    root = root_seed(seed)
+    base_date = base_date or date.today()
+    ranges = supplier_blocks(len(catalog), days_back)
+    for index in (range(len(ranges)) if blocks is None else blocks):
+        block = ranges[index]
+        rng = block_rng(root, INVENTORY_STREAM, index)
+        yield _inventory_block(catalog, block.start, block.stop, days_back, rng,
+                               phantom_rate, phantom_days, base_date)
+
+
+def iter_shipment_blocks(catalog: SupplierCatalog, seed: SeedLike = None, base_date: Optional[date] = None,
+                         blocks: Optional[Sequence[int]] = None) -> Iterator[ShipmentColumns]:
+    """Yield shipment logs one supplier block at a time (optionally only the given block indexes)"""
+    root = root_seed(seed)
+    base_date = base_date or date.today()
+    ranges = supplier_blocks(len(catalog), MAX_SHIPMENTS_PER_SUPPLIER)
+    for index in (range(len(ranges)) if blocks is None else blocks):
+        block = ranges[index]
+        rng = block_rng(root, SHIPMENT_STREAM, index)
+        yield _shipment_block(catalog, block.start, block.stop, rng, base_date)
+
+
+def rebatch(blocks: Iterator[_Columns], batch_size: int) -> Iterator[_Columns]:
+    """Re-cut a stream of column blocks into batches of exactly batch_size rows (last may be short)"""
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    return _rebatch(blocks, batch_size)
+
+
+def _rebatch(blocks: Iterator[_Columns], batch_size: int) -> Iterator[_Columns]:
+    pending = []
+    pending_rows = 0
+    for block in blocks:
+        offset = 0
+        while offset < len(block):
+            take = min(batch_size - pending_rows, len(block) - offset)
+            pending.append(block.slice(offset, offset + take))
+            pending_rows += take
+            offset += take
+            if pending_rows == batch_size:
+                yield type(block).concat(pending)
+                pending = []
+                pending_rows = 0
+    if pending_rows:
+        yield type(pending[0]).concat(pending)
+
+
+def generate_inventory_columns(catalog: SupplierCatalog, days_back: int = 30, seed: SeedLike = None,
+                               phantom_rate: float = 0.3, phantom_days: Optional[int] = 10,
+                               base_date: Optional[date] = None) -> InventoryColumns:
+    """
+    Generate inventory data for every supplier-day
+
+    Rows are ordered by supplier code, then by day (day 0 = base_date).
+    Suppliers with phantom stock over-report by 30-80% during their first
+    `phantom_days` days (all days when phantom_days is None).
+    """
+    base_date = base_date or date.today()
+    return InventoryColumns.concat(list(iter_inventory_blocks(
+        catalog, days_back, seed, phantom_rate, phantom_days, base_date
+    )), catalog, base_date)
+
+
+def generate_shipment_columns(catalog: SupplierCatalog, seed: SeedLike = None,
+                              base_date: Optional[date] = None) -> ShipmentColumns:
+    """Generate 5-10 recent shipments per supplier, 20% of them delayed by up to 14 days"""
+    base_date = base_date or date.today()
+    return ShipmentColumns.concat(list(iter_shipment_blocks(catalog, seed, base_date)), catalog, base_date)
+
+
+def iter_inventory_batches(catalog: SupplierCatalog, days_back: int = 30, batch_size: int = 50000,
+                           seed: SeedLike = None, phantom_rate: float = 0.3,
+                           phantom_days: Optional[int] = 10,
+                           base_date: Optional[date] = None) -> Iterator[InventoryColumns]:
+    """
+    Stream inventory data in fixed-size batches, in supplier/date order
+
+    Only one supplier block and one batch are held in memory at a time. The
+    rows are identical to generate_inventory_columns() for the same seed,
+    whatever the batch size.
+    """
+    return rebatch(iter_inventory_blocks(catalog, days_back, seed, phantom_rate, phantom_days, base_date),
+                   batch_size)
+
+
+def iter_shipment_batches(catalog: SupplierCatalog, batch_size: int = 50000, seed: SeedLike = None,
+                          base_date: Optional[date] = None) -> Iterator[ShipmentColumns]:
+    """Stream shipment logs in fixed-size batches, in supplier order"""
+    return rebatch(iter_shipment_blocks(catalog, seed, base_date), batch_size)
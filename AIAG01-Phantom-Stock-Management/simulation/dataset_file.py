@@ -0,0 +1,158 @@
+"""
+Recorded Dataset Files
+Compact, memory-mappable columnar files for record-and-replay of inventory and shipment data
+
+File layout:
+    preamble   b"PSDS", version (uint16), reserved (uint16), header length (uint32)
+    header     JSON: kind, rows, base_date, supplier labels, column schema
+    columns    raw little-endian arrays, each aligned to 64 bytes
+"""
+import json
+import os
+import re
+import struct
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from simulation.columnar import InventoryColumns, ShipmentColumns, SupplierCatalog
+from simulation.supplier_graph import TierLabels
+from storage.paths import DATASETS_DIR
+
+MAGIC = b"PSDS"
+VERSION = 1
+PREAMBLE = struct.Struct("<4sHHI")
+ALIGN = 64
+EXTENSION = ".psds"
+
+COLUMN_TYPES = {"inventory": InventoryColumns, "shipments": ShipmentColumns}
+CATALOG_ARRAYS = ("tiers", "capacity", "reliability")
+
+DATASET_DIR = os.environ.get("PHANTOM_DATASET_DIR", DATASETS_DIR)
+
+Columns = Union[InventoryColumns, ShipmentColumns]
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _labels_header(catalog: SupplierCatalog) -> Dict:
+    if isinstance(catalog.ids, TierLabels) and isinstance(catalog.names, TierLabels):
+        return {
+            "tier_starts": catalog.ids.tier_starts.tolist(),
+            "id_template": catalog.ids.template,
+            "name_template": catalog.names.template,
+        }
+    return {"ids": list(catalog.ids), "names": list(catalog.names)}
+
+
+def _labels_from_header(labels: Dict):
+    if "tier_starts" in labels:
+        return (TierLabels(labels["tier_starts"], labels["id_template"]),
+                TierLabels(labels["tier_starts"], labels["name_template"]))
+    return labels["ids"], labels["names"]
+
+
+def write_dataset(path: str, columns: Columns) -> int:
+    """Write columns (and their supplier dictionary) to a dataset file, returning its size in bytes"""
+    kind = "inventory" if isinstance(columns, InventoryColumns) else "shipments"
+    arrays = [(name, np.ascontiguousarray(getattr(columns, name))) for name in columns.ARRAYS]
+    arrays += [(f"catalog.{name}", np.ascontiguousarray(getattr(columns.catalog, name))) for name in CATALOG_ARRAYS]
+
+    schema = []
+    offset = 0
+    for name, array in arrays:
+        schema.append({"name": name, "dtype": array.dtype.str, "length": len(array), "offset": offset})
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps({
+        "kind": kind,
+        "rows": len(columns),
+        "base_date": columns.base_date.isoformat(),
+        "labels": _labels_header(columns.catalog),
+        "columns": schema,
+    }).encode("utf-8")
+    data_start = _align(PREAMBLE.size + len(header))
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, 0, len(header)))
+        f.write(header)
+        for (name, array), column in zip(arrays, schema):
+            f.seek(data_start + column["offset"])
+            f.write(memoryview(array).cast("B"))
+        f.truncate(data_start + offset)
+    os.replace(temp_path, path)
+    return data_start + offset
+
+
+def open_dataset(path: str) -> Columns:
+    """
+    Open a dataset file as columns backed by a read-only memory map
+
+    Only the header is parsed; column arrays are views into the mapped file,
+    so opening costs about the same whatever the number of rows.
+    """
+    with open(path, "rb") as f:
+        magic, version, _, header_length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} dataset file")
+        header = json.loads(f.read(header_length))
+
+    data_start = _align(PREAMBLE.size + header_length)
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for column in header["columns"]:
+        dtype = np.dtype(column["dtype"])
+        start = data_start + column["offset"]
+        arrays[column["name"]] = mapped[start:start + column["length"] * dtype.itemsize].view(dtype)
+
+    ids, names = _labels_from_header(header["labels"])
+    catalog = SupplierCatalog(ids, names, *(arrays.pop(f"catalog.{name}") for name in CATALOG_ARRAYS))
+    return COLUMN_TYPES[header["kind"]](catalog, date.fromisoformat(header["base_date"]), **arrays)
+
+
+def dataset_path(name: str, kind: str, directory: Optional[str] = None) -> str:
+    """Path of a named dataset file inside the dataset directory"""
+    if not re.fullmatch(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*", name):
+        raise ValueError(f"Invalid dataset name: {name!r}")
+    return os.path.join(directory or DATASET_DIR, f"{name}.{kind}{EXTENSION}")
+
+
+def record_dataset(name: str, inventory: InventoryColumns, shipments: Optional[ShipmentColumns] = None,
+                   directory: Optional[str] = None) -> Dict:
+    """Record a generated dataset under a name so later runs can replay it"""
+    os.makedirs(directory or DATASET_DIR, exist_ok=True)
+    recorded = {"name": name, "inventory_records": len(inventory)}
+    write_dataset(dataset_path(name, "inventory", directory), inventory)
+    if shipments is not None:
+        write_dataset(dataset_path(name, "shipments", directory), shipments)
+        recorded["shipment_records"] = len(shipments)
+    return recorded
+
+
+class DatasetReplay:
+    """
+    Replay source for a recorded dataset
+    Feeds the same inventory/shipment data into the agent pipeline on every run:
+    `inventory` / `shipments` are the memory-mapped columns, which the analysis
+    pipeline consumes directly; inventory_data() and shipment_data() build
+    record dicts for consumers that still need them
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.name = name
+        inventory_path = dataset_path(name, "inventory", directory)
+        if not os.path.exists(inventory_path):
+            raise FileNotFoundError(f"No recorded dataset named {name!r}")
+        self.inventory = open_dataset(inventory_path)
+        shipments_path = dataset_path(name, "shipments", directory)
+        self.shipments = open_dataset(shipments_path) if os.path.exists(shipments_path) else None
+
+    def inventory_data(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        return self.inventory.to_records(fields)
+
+    def shipment_data(self) -> List[Dict]:
+        return self.shipments.to_records() if self.shipments is not None else []
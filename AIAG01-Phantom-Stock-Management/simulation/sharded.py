@@ -0,0 +1,119 @@
+"""
+Sharded Dataset Generation
+Generates supplier blocks in parallel worker processes and merges or writes the shards
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from simulation.columnar import (
+    MAX_SHIPMENTS_PER_SUPPLIER,
+    InventoryColumns,
+    SeedLike,
+    ShipmentColumns,
+    SupplierCatalog,
+    iter_inventory_blocks,
+    iter_shipment_blocks,
+    root_seed,
+    supplier_blocks,
+)
+
+# Catalog shipped once to each worker process by the pool initializer
+_worker_catalog = None
+
+COLUMN_TYPES = {"inventory": InventoryColumns, "shipments": ShipmentColumns}
+
+
+def _init_worker(catalog: SupplierCatalog) -> None:
+    global _worker_catalog
+    _worker_catalog = catalog
+
+
+def _generate_shard(kind: str, blocks: List[int], options: Dict, output_path: Optional[str]):
+    """Worker task: generate the given supplier blocks, return or write their arrays"""
+    if kind == "inventory":
+        parts = list(iter_inventory_blocks(_worker_catalog, blocks=blocks, **options))
+    else:
+        parts = list(iter_shipment_blocks(_worker_catalog, blocks=blocks, **options))
+    shard = COLUMN_TYPES[kind].concat(parts, _worker_catalog, options["base_date"])
+    arrays = {name: getattr(shard, name) for name in shard.ARRAYS}
+    if output_path is None:
+        return arrays
+    np.savez(output_path, base_date=np.datetime64(options["base_date"], "D"), **arrays)
+    return {"path": output_path, "rows": len(shard), "blocks": [blocks[0], blocks[-1]]}
+
+
+def split_blocks(n_blocks: int, n_shards: int) -> List[List[int]]:
+    """Contiguous, near-equal runs of block indexes"""
+    bounds = np.linspace(0, n_blocks, min(n_shards, n_blocks) + 1).astype(int)
+    return [list(range(start, stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def _run_sharded(kind: str, catalog: SupplierCatalog, n_blocks: int, options: Dict,
+                 workers: Optional[int], shards: Optional[int], output_dir: Optional[str]):
+    workers = workers or os.cpu_count() or 1
+    plan = split_blocks(n_blocks, shards or workers * 4)
+    paths = [None] * len(plan)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        paths = [os.path.join(output_dir, f"{kind}-{index:05d}.npz") for index in range(len(plan))]
+
+    if workers == 1:
+        _init_worker(catalog)
+        results = [_generate_shard(kind, blocks, options, path) for blocks, path in zip(plan, paths)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(catalog,)) as pool:
+            futures = [pool.submit(_generate_shard, kind, blocks, options, path) for blocks, path in zip(plan, paths)]
+            results = [future.result() for future in futures]
+
+    if output_dir is not None:
+        return results
+    # Shards come back in block order, so the merge does not depend on the worker count
+    columns = COLUMN_TYPES[kind]
+    return columns.concat([columns(catalog, options["base_date"], **result) for result in results],
+                          catalog, options["base_date"])
+
+
+def generate_inventory_sharded(catalog: SupplierCatalog, days_back: int = 30, seed: SeedLike = None,
+                               workers: Optional[int] = None, shards: Optional[int] = None,
+                               output_dir: Optional[str] = None, phantom_rate: float = 0.3,
+                               phantom_days: Optional[int] = 10, base_date: Optional[date] = None
+                               ) -> Union[InventoryColumns, List[Dict]]:
+    """
+    Generate inventory data across worker processes
+
+    Suppliers are partitioned into shards of whole supplier blocks, and every
+    block draws from its own (seed, block) RNG stream. The result is therefore
+    bit-identical to generate_inventory_columns() for the same seed, whatever
+    the number of workers or shards. With output_dir set, each worker writes
+    its shard as .npz and a manifest of shard files is returned instead.
+    """
+    options = {
+        "days_back": days_back,
+        "seed": root_seed(seed),
+        "phantom_rate": phantom_rate,
+        "phantom_days": phantom_days,
+        "base_date": base_date or date.today(),
+    }
+    n_blocks = len(supplier_blocks(len(catalog), days_back))
+    return _run_sharded("inventory", catalog, n_blocks, options, workers, shards, output_dir)
+
+
+def generate_shipments_sharded(catalog: SupplierCatalog, seed: SeedLike = None, workers: Optional[int] = None,
+                               shards: Optional[int] = None, output_dir: Optional[str] = None,
+                               base_date: Optional[date] = None) -> Union[ShipmentColumns, List[Dict]]:
+    """Generate shipment logs across worker processes (see generate_inventory_sharded)"""
+    options = {"seed": root_seed(seed), "base_date": base_date or date.today()}
+    n_blocks = len(supplier_blocks(len(catalog), MAX_SHIPMENTS_PER_SUPPLIER))
+    return _run_sharded("shipments", catalog, n_blocks, options, workers, shards, output_dir)
+
+
+def load_shard(path: str, catalog: SupplierCatalog, kind: str = "inventory"
+               ) -> Union[InventoryColumns, ShipmentColumns]:
+    """Read one shard written by the sharded generators"""
+    with np.load(path) as arrays:
+        return COLUMN_TYPES[kind](catalog, arrays["base_date"].item(),
+                                  **{name: arrays[name] for name in COLUMN_TYPES[kind].ARRAYS})
@@ -0,0 +1,261 @@
+"""
+Multi-Tier Supplier Graph
+Compact supplier topology (integer codes + CSR adjacency) and a synthetic generator
+"""
+import re
+from collections.abc import Sequence as SequenceABC
+from string import Formatter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from simulation.columnar import SeedLike, SupplierCatalog, make_rng
+
+
+class TierLabels(SequenceABC):
+    """
+    Lazy supplier labels such as "T3-001"
+    Codes are grouped by tier, so label i is derived from its position instead of stored
+    """
+
+    def __init__(self, tier_starts: Sequence[int], template: str = "T{tier}-{index:03d}"):
+        self.tier_starts = np.asarray(tier_starts, dtype=np.int64)
+        self.template = template
+        pattern = ""
+        for literal, field, _, _ in Formatter().parse(template):
+            pattern += re.escape(literal) + (rf"(?P<{field}>\d+)" if field else "")
+        self._pattern = re.compile(pattern + "$")
+
+    def __len__(self) -> int:
+        return int(self.tier_starts[-1])
+
+    def __getitem__(self, code):
+        if isinstance(code, slice):
+            return [self[i] for i in range(*code.indices(len(self)))]
+        if code < 0:
+            code += len(self)
+        if not 0 <= code < len(self):
+            raise IndexError(code)
+        tier = int(np.searchsorted(self.tier_starts, code, side="right"))
+        return self.template.format(tier=tier, index=code - int(self.tier_starts[tier - 1]) + 1)
+
+    def index(self, label: str) -> int:
+        """Code of a label, parsed back through the template"""
+        match = self._pattern.match(label)
+        if match:
+            tier = int(match["tier"])
+            if 1 <= tier < len(self.tier_starts):
+                code = int(self.tier_starts[tier - 1]) + int(match["index"]) - 1
+                if int(self.tier_starts[tier - 1]) <= code < int(self.tier_starts[tier]) and self[code] == label:
+                    return code
+        raise ValueError(f"{label} is not a supplier label")
+
+
+class SupplierGraph:
+    """
+    Supplier catalog plus its supplies_to links
+
+    Edges point downstream (supplier -> customer) and are stored as CSR
+    arrays: the customers of supplier i are indices[indptr[i]:indptr[i + 1]],
+    with `share` holding the fraction of i's output sent along each edge.
+    """
+
+    def __init__(self, catalog: SupplierCatalog, indptr: np.ndarray, indices: np.ndarray,
+                 share: Optional[np.ndarray] = None):
+        self.catalog = catalog
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        if share is None:
+            share = np.repeat(1.0 / np.maximum(self.out_degree(), 1), self.out_degree())
+        self.share = np.asarray(share, dtype=np.float32)
+        self._upstream = None
+
+    @classmethod
+    def from_suppliers(cls, suppliers: List[Dict]) -> "SupplierGraph":
+        """Build a graph from supplier dicts whose "supplies_to" is an id or a list of ids"""
+        catalog = SupplierCatalog.from_suppliers(suppliers)
+        sources, targets = [], []
+        for code, supplier in enumerate(suppliers):
+            links = supplier.get("supplies_to") or []
+            for customer in ([links] if isinstance(links, str) else links):
+                sources.append(code)
+                targets.append(catalog.code_of(customer))
+        return cls.from_edges(catalog, np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64))
+
+    @classmethod
+    def from_edges(cls, catalog: SupplierCatalog, sources: np.ndarray, targets: np.ndarray,
+                   share: Optional[np.ndarray] = None) -> "SupplierGraph":
+        """Build CSR adjacency from (supplier, customer) edge arrays"""
+        keys = sources.astype(np.int64) * len(catalog) + targets
+        order = np.argsort(keys, kind="stable") if np.any(keys[1:] < keys[:-1]) else slice(None)
+        indptr = np.zeros(len(catalog) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(catalog)), out=indptr[1:])
+        return cls(catalog, indptr, targets[order], None if share is None else share[order])
+
+    @property
+    def n_suppliers(self) -> int:
+        return len(self.catalog)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the numeric arrays (labels are lazy or shared)"""
+        arrays = (self.indptr, self.indices, self.share, self.catalog.tiers,
+                  self.catalog.capacity, self.catalog.reliability)
+        return sum(a.nbytes for a in arrays)
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.indices, minlength=self.n_suppliers)
+
+    def edge_sources(self) -> np.ndarray:
+        """Supplier code of every edge (the row index of the CSR arrays)"""
+        return np.repeat(np.arange(self.n_suppliers, dtype=np.int32), self.out_degree())
+
+    def downstream(self, code: int) -> np.ndarray:
+        """Customer codes that supplier `code` supplies to"""
+        return self.indices[self.indptr[code]:self.indptr[code + 1]]
+
+    def upstream(self, code: int) -> np.ndarray:
+        """Supplier codes that deliver to `code` (reverse CSR, built on first use)"""
+        if self._upstream is None:
+            order = np.argsort(self.indices, kind="stable")
+            indptr = np.zeros(self.n_suppliers + 1, dtype=np.int64)
+            np.cumsum(self.in_degree(), out=indptr[1:])
+            self._upstream = (indptr, self.edge_sources()[order])
+        indptr, sources = self._upstream
+        return sources[indptr[code]:indptr[code + 1]]
+
+    def tier_range(self, tier: int) -> range:
+        """Codes of one tier (codes are grouped by tier)"""
+        codes = np.flatnonzero(self.catalog.tiers == tier)
+        return range(int(codes[0]), int(codes[-1]) + 1) if len(codes) else range(0)
+
+    def supplier_dict(self, code: int) -> Dict:
+        """Legacy supplier dict for one code"""
+        supplier = {
+            "id": self.catalog.ids[code],
+            "name": self.catalog.names[code],
+            "tier": int(self.catalog.tiers[code]),
+            "capacity": int(self.catalog.capacity[code]),
+            "reliability": float(self.catalog.reliability[code]),
+        }
+        customers = self.downstream(code)
+        if len(customers):
+            supplier["supplies_to"] = [self.catalog.ids[c] for c in customers.tolist()]
+        return supplier
+
+    def to_suppliers(self) -> List[Dict]:
+        return [self.supplier_dict(code) for code in range(self.n_suppliers)]
+
+    def suppliers_by_tier(self) -> Dict[str, List[Dict]]:
+        """Supplier dicts grouped like SupplierSimulator.suppliers ({"tier1": [...], ...})"""
+        by_tier = {}
+        for code in range(self.n_suppliers):
+            supplier = self.supplier_dict(code)
+            by_tier.setdefault(f"tier{supplier['tier']}", []).append(supplier)
+        return by_tier
+
+
+def tier_sizes(n_suppliers: int, tier_depth: int, tier_growth: float) -> np.ndarray:
+    """
+    Split n_suppliers over tiers, each deeper tier `tier_growth` times larger
+    Every tier gets at least one supplier; raises ValueError if there are fewer suppliers than tiers
+    """
+    if n_suppliers < tier_depth:
+        raise ValueError(f"{n_suppliers} suppliers cannot fill {tier_depth} tiers")
+    weights = tier_growth ** np.arange(tier_depth, dtype=np.float64)
+    sizes = np.maximum(np.floor(n_suppliers * weights / weights.sum()).astype(np.int64), 1)
+    surplus = int(sizes.sum()) - n_suppliers
+    if surplus <= 0:
+        sizes[-1] -= surplus
+    # Minimum sizes overshot: take the surplus from the largest tiers (deepest first), keeping one each
+    for tier in sorted(range(tier_depth), key=lambda tier: (-sizes[tier], -tier)):
+        if surplus <= 0:
+            break
+        taken = min(surplus, int(sizes[tier]) - 1)
+        sizes[tier] -= taken
+        surplus -= taken
+    return sizes
+
+
+def generate_supplier_graph(n_suppliers: int = 10000, tier_depth: int = 3, tier_growth: float = 2.0,
+                            fan_out_mean: float = 1.5, fan_in_skew: float = 1.2,
+                            tier1_capacity: float = 10000, capacity_decay: float = 0.55,
+                            capacity_sigma: float = 0.25, reliability_top: float = 0.95,
+                            reliability_step: float = 0.08, seed: SeedLike = None) -> SupplierGraph:
+    """
+    Generate a synthetic multi-tier supplier graph
+
+    - Tier t+1 has `tier_growth` times as many suppliers as tier t.
+    - Every supplier below tier 1 supplies 1 + Poisson(fan_out_mean - 1)
+      distinct customers in the tier above (many-to-many links).
+    - Customers are picked with Pareto(fan_in_skew) popularity, so a few
+      large customers have a high fan-in, as in real supply bases.
+    - Capacity is log-normal around tier1_capacity * capacity_decay ** (tier - 1);
+      reliability is Beta-distributed around reliability_top - step * (tier - 1).
+    """
+    rng = make_rng(seed)
+    sizes = tier_sizes(n_suppliers, tier_depth, tier_growth)
+    tier_starts = np.concatenate(([0], np.cumsum(sizes)))
+    tiers = np.repeat(np.arange(1, tier_depth + 1, dtype=np.int8), sizes)
+
+    depth = tiers.astype(np.float64) - 1
+    capacity = np.round(tier1_capacity * capacity_decay ** depth * rng.lognormal(0.0, capacity_sigma, n_suppliers))
+    mean_reliability = np.clip(reliability_top - reliability_step * depth, 0.05, 0.995)
+    reliability = np.round(rng.beta(mean_reliability * 50, (1 - mean_reliability) * 50), 3)
+
+    sources, targets = [], []
+    for tier in range(2, tier_depth + 1):
+        start, stop = int(tier_starts[tier - 1]), int(tier_starts[tier])
+        customer_start, customer_stop = int(tier_starts[tier - 2]), int(tier_starts[tier - 1])
+        n_customers = customer_stop - customer_start
+
+        fan_out = np.minimum(1 + rng.poisson(max(fan_out_mean - 1, 0.0), stop - start), n_customers)
+        popularity = np.cumsum(rng.pareto(fan_in_skew, n_customers) + 1)
+        picks = np.searchsorted(popularity, rng.random(int(fan_out.sum())) * popularity[-1], side="right")
+
+        # Drop repeated picks of the same customer by one supplier
+        src = np.repeat(np.arange(start, stop, dtype=np.int64), fan_out)
+        keys = np.unique(src * n_suppliers + picks + customer_start)
+        sources.append(keys // n_suppliers)
+        targets.append(keys % n_suppliers)
+
+    sources = np.concatenate(sources) if sources else np.zeros(0, dtype=np.int64)
+    targets = np.concatenate(targets) if targets else np.zeros(0, dtype=np.int64)
+
+    # Split each supplier's output across its customers
+    weights = rng.random(len(sources)) + 0.1
+    share = weights / np.bincount(sources, weights=weights, minlength=n_suppliers)[sources]
+
+    catalog = SupplierCatalog(
+        ids=TierLabels(tier_starts),
+        names=TierLabels(tier_starts, "Tier{tier} Supplier {index}"),
+        tiers=tiers,
+        capacity=capacity,
+        reliability=reliability,
+    )
+    return SupplierGraph.from_edges(catalog, sources, targets, share)
+
+
+def simulate_receipts(graph: SupplierGraph, outbound: np.ndarray, phantom: Optional[np.ndarray] = None,
+                      noise: float = 0.02, shortfall: tuple = (0.3, 0.6), seed: SeedLike = None) -> np.ndarray:
+    """
+    Units each customer records receiving along every edge (CSR order)
+
+    Customers receive their share of the supplier's outbound units within
+    +/- `noise`; suppliers flagged in `phantom` only deliver part of what they
+    claim to ship, losing a Uniform(shortfall) fraction.
+    """
+    rng = make_rng(seed)
+    sources = graph.edge_sources()
+    received = outbound[sources] * graph.share * (1 + rng.uniform(-noise, noise, graph.n_edges))
+    if phantom is not None:
+        lost = phantom[sources] * rng.uniform(*shortfall, graph.n_edges)
+        received *= 1 - lost
+    return np.round(received)
@@ -2,13 +2,43 @@
 Multi-Tier Supplier Simulation
 Generates realistic supplier data with phantom stock scenarios
 """
-import random
-from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from simulation.columnar import (
+    InventoryColumns,
+    ShipmentColumns,
+    generate_inventory_columns,
+    generate_shipment_columns,
+    iter_inventory_batches,
+    iter_shipment_batches,
+    make_rng,
+)
+from simulation.sharded import generate_inventory_sharded
+from simulation.supplier_graph import SupplierGraph, simulate_receipts
 
 class SupplierSimulator:
-    def __init__(self):
-        self.suppliers = self._initialize_suppliers()
+    def __init__(self, seed: Optional[int] = None, graph: Optional[SupplierGraph] = None):
+        """
+        Simulate the built-in 8-supplier network, or any SupplierGraph
+        (see simulation.supplier_graph.generate_supplier_graph for large topologies)
+        """
+        if graph is None:
+            self._suppliers = self._initialize_suppliers()
+            graph = SupplierGraph.from_suppliers(self.get_all_suppliers())
+        else:
+            self._suppliers = None
+        self.graph = graph
+        self.catalog = graph.catalog
+        self.rng = make_rng(seed)
+    
+    @property
+    def suppliers(self) -> Dict:
+        """Supplier dicts by tier (built on first use for generated graphs)"""
+        if self._suppliers is None:
+            self._suppliers = self.graph.suppliers_by_tier()
+        return self._suppliers
         
     def _initialize_suppliers(self) -> Dict:
         return {
@@ -34,65 +64,40 @@ class SupplierSimulator:
             all_suppliers.extend(tier)
         return all_suppliers
     
+    def generate_inventory_columns(self, days_back: int = 30) -> InventoryColumns:
+        """Generate inventory data as NumPy columns (vectorized engine)"""
+        return generate_inventory_columns(self.catalog, days_back=days_back, seed=self.rng)
+    
     def generate_inventory_data(self, days_back: int = 30) -> List[Dict]:
         """Generate inventory data with phantom stock scenarios"""
-        inventory_data = []
-        
-        for tier_name, suppliers in self.suppliers.items():
-            for supplier in suppliers:
-                # Calculate expected inventory based on production
-                production_rate = supplier["capacity"] * 0.7  # 70% utilization
-                consumption_rate = production_rate * 0.8  # 80% gets consumed
-                
-                # Simulate phantom stock for some suppliers
-                has_phantom_stock = random.random() < 0.3  # 30% chance
-                
-                for day in range(days_back):
-                    date = datetime.now() - timedelta(days=day)
-                    
-                    # Expected stock calculation
-                    expected_stock = production_rate - consumption_rate + random.randint(-100, 100)
-                    
-                    # Reported stock (with phantom stock scenario)
-                    if has_phantom_stock and day < 10:
-                        # Report higher than actual (phantom stock)
-                        reported_stock = expected_stock * random.uniform(1.3, 1.8)
-                    else:
-                        reported_stock = expected_stock * random.uniform(0.95, 1.05)
-                    
-                    inventory_data.append({
-                        "supplier_id": supplier["id"],
-                        "supplier_name": supplier["name"],
-                        "tier": supplier["tier"],
-                        "date": date.strftime("%Y-%m-%d"),
-                        "reported_stock": max(0, int(reported_stock)),
-                        "production_rate": int(production_rate),
-                        "consumption_rate": int(consumption_rate),
-                        "expected_stock": max(0, int(expected_stock)),
-                        "reliability": supplier["reliability"],
-                        "has_phantom_stock": has_phantom_stock
-                    })
-        
-        return inventory_data
+        return self.generate_inventory_columns(days_back).to_records()
+    
+    def generate_shipment_columns(self) -> ShipmentColumns:
+        """Generate shipment logs as NumPy columns"""
+        return generate_shipment_columns(self.catalog, seed=self.rng)
     
     def generate_shipment_data(self) -> List[Dict]:
         """Generate shipment logs"""
-        shipments = []
-        
-        for tier_name, suppliers in self.suppliers.items():
-            for supplier in suppliers:
-                # Generate 5-10 recent shipments
-                for i in range(random.randint(5, 10)):
-                    delay_days = random.randint(0, 14) if random.random() < 0.2 else 0
-                    
-                    shipments.append({
-                        "supplier_id": supplier["id"],
-                        "shipment_id": f"SH-{supplier['id']}-{i:03d}",
-                        "quantity": random.randint(500, 2000),
-                        "scheduled_date": (datetime.now() - timedelta(days=random.randint(1, 30))).strftime("%Y-%m-%d"),
-                        "actual_date": (datetime.now() - timedelta(days=random.randint(1, 30) - delay_days)).strftime("%Y-%m-%d"),
-                        "delay_days": delay_days,
-                        "status": "delayed" if delay_days > 0 else "on_time"
-                    })
-        
-        return shipments
+        return self.generate_shipment_columns().to_records()
+    
+    def generate_receipts(self, outbound: np.ndarray, phantom: Optional[np.ndarray] = None) -> np.ndarray:
+        """Units customers record receiving on each supplies_to link (see simulate_receipts)"""
+        return simulate_receipts(self.graph, outbound, phantom, seed=self.rng)
+    
+    def generate_inventory_sharded(self, days_back: int = 30, workers: Optional[int] = None,
+                                   output_dir: Optional[str] = None, seed: Optional[int] = None) -> Union[InventoryColumns, List[Dict]]:
+        """Generate inventory data in parallel worker processes (see simulation.sharded)"""
+        return generate_inventory_sharded(self.catalog, days_back=days_back, workers=workers,
+                                          output_dir=output_dir, seed=self.rng if seed is None else seed)
+    
+    def iter_inventory_batches(self, days_back: int = 30, batch_size: int = 50000,
+                               seed: Optional[int] = None) -> Iterator[InventoryColumns]:
+        """Stream inventory data in fixed-size batches with bounded memory"""
+        return iter_inventory_batches(self.catalog, days_back=days_back, batch_size=batch_size,
+                                      seed=self.rng if seed is None else seed)
+    
+    def iter_shipment_batches(self, batch_size: int = 50000,
+                              seed: Optional[int] = None) -> Iterator[ShipmentColumns]:
+        """Stream shipment logs in fixed-size batches with bounded memory"""
+        return iter_shipment_batches(self.catalog, batch_size=batch_size,
+                                     seed=self.rng if seed is None else seed)
@@ -0,0 +1,245 @@
+"""
+Alert History
+Every supervisor alert (with its recommendation) persisted to SQLite, indexed for
+supplier / severity / tier queries over time ranges with cursor pagination, plus each
+run's full alert snapshot for run-to-run diffs
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from alerting.diff import Snapshot
+from alerting.lifecycle import alert_type
+from storage.paths import data_path
+
+ALERT_HISTORY_PATH = data_path("PHANTOM_ALERT_HISTORY", "alert_history.sqlite")
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS alert_runs ("
+    "run_id INTEGER PRIMARY KEY AUTOINCREMENT, recorded_at INTEGER NOT NULL, source TEXT NOT NULL, "
+    "alert_count INTEGER NOT NULL)",
+    # id is the recording time in microseconds (unique, increasing), so rowid order is time order
+    "CREATE TABLE IF NOT EXISTS alerts ("
+    "id INTEGER PRIMARY KEY, run_id INTEGER NOT NULL, alert_id TEXT NOT NULL, supplier_id TEXT NOT NULL, "
+    "tier INTEGER, severity TEXT NOT NULL, risk_score REAL, alert TEXT NOT NULL, recommendation TEXT)",
+    # Every index ends in the implicit rowid, i.e. the timestamp
+    "CREATE INDEX IF NOT EXISTS alerts_supplier_time ON alerts (supplier_id)",
+    "CREATE INDEX IF NOT EXISTS alerts_severity_time ON alerts (severity)",
+    "CREATE INDEX IF NOT EXISTS alerts_severity_tier_time ON alerts (severity, tier)",
+    "CREATE INDEX IF NOT EXISTS alerts_tier_time ON alerts (tier)",
+    "CREATE INDEX IF NOT EXISTS alerts_run ON alerts (run_id)",
+    # Every alert and recommendation a run raised (sent or not), by canonical key hash
+    "CREATE TABLE IF NOT EXISTS alert_run_items ("
+    "run_id INTEGER NOT NULL, key_hash INTEGER NOT NULL, rank INTEGER NOT NULL, item TEXT NOT NULL, "
+    "PRIMARY KEY (run_id, key_hash)) WITHOUT ROWID",
+)
+
+
+def to_micros(moment: datetime) -> int:
+    return int(round(moment.timestamp() * 1_000_000))
+
+
+def from_micros(micros: int) -> datetime:
+    return datetime.fromtimestamp(micros / 1_000_000)
+
+
+def time_window(days: Optional[float] = None, since: Optional[str] = None,
+                until: Optional[str] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """(since, until) from API parameters: the last `days` days, or ISO timestamps; ValueError if invalid"""
+    start = None if since is None else datetime.fromisoformat(since)
+    end = None if until is None else datetime.fromisoformat(until)
+    if days is not None:
+        start = (end or datetime.now()) - timedelta(days=days)
+    return start, end
+
+
+class AlertHistory:
+    """
+    Append-only alert log in SQLite (WAL mode)
+
+    Each analysis run is one transaction: a row in alert_runs and one row per
+    alert, carrying the recommendation issued for the same supplier. An alert
+    row's key is its recording time in microseconds, so the indexes on
+    supplier_id, severity, (severity, tier) and tier are each ordered by time
+    within a value: a time-range query is one index range scan, newest first,
+    and the next page starts strictly below the last key returned (the cursor).
+
+    A run recorded with a snapshot (see alerting.diff) also keeps every item
+    it raised, clustered by run, so any two runs of a source can be diffed.
+    """
+
+    def __init__(self, path: str = ALERT_HISTORY_PATH, source: str = "flask"):
+        self.path = path
+        self.source = source
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, alerts: Sequence[Dict], recommendations: Sequence[Dict] = (),
+               now: Optional[datetime] = None, snapshot: Optional[Snapshot] = None) -> int:
+        """Store one run's alerts with their recommendations (and its snapshot); returns the run id"""
+        by_supplier = {recommendation["supplier_id"]: recommendation for recommendation in recommendations}
+        start = to_micros(now or datetime.now())
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                latest = connection.execute("SELECT MAX(id) FROM alerts").fetchone()[0]
+                start = max(start, (latest or 0) + 1)  # keys stay unique and increasing if the clock steps back
+                run_id = connection.execute(
+                    "INSERT INTO alert_runs (recorded_at, source, alert_count) VALUES (?, ?, ?)",
+                    (start, self.source, len(alerts)),
+                ).lastrowid
+                rows = []
+                for offset, alert in enumerate(alerts):
+                    recommendation = by_supplier.get(alert["supplier_id"]) \
+                        if alert_type(alert) == "phantom_stock" else None
+                    rows.append((
+                        start + offset, run_id, alert["alert_id"], alert["supplier_id"], alert.get("tier"),
+                        alert["severity"], alert.get("risk_score"), json.dumps(alert, default=str),
+                        None if recommendation is None else json.dumps(recommendation, default=str),
+                    ))
+                connection.executemany(
+                    "INSERT INTO alerts (id, run_id, alert_id, supplier_id, tier, severity, risk_score, alert, "
+                    "recommendation) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                if snapshot is not None:
+                    connection.executemany(
+                        "INSERT INTO alert_run_items (run_id, key_hash, rank, item) VALUES (?, ?, ?, ?)",
+                        [(run_id, key, rank, json.dumps(item, default=str))
+                         for key, (rank, item) in snapshot.items()],
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+        return run_id
+
+    def query(self, supplier_id: Optional[str] = None, severity: Optional[str] = None, tier: Optional[int] = None,
+              since: Optional[datetime] = None, until: Optional[datetime] = None, run_id: Optional[int] = None,
+              limit: int = PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        """
+        Alerts matching the filters, newest first, one page at a time
+        Pass the returned next_cursor to get the following page (None after the last)
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+        for column, value in (("supplier_id", supplier_id), ("severity", severity), ("tier", tier),
+                              ("run_id", run_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("id >= ?")
+            params.append(to_micros(since))
+        if until is not None:
+            clauses.append("id < ?")
+            params.append(to_micros(until))
+        if cursor is not None:
+            try:
+                after = int(cursor)
+            except ValueError:
+                raise ValueError(f"invalid cursor: {cursor!r}")
+            clauses.append("id < ?")
+            params.append(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                f"SELECT id, run_id, alert, recommendation FROM alerts {where} ORDER BY id DESC LIMIT ?",
+                params + [limit + 1],
+            ).fetchall()
+            # Keep planner statistics current (sampled, and only when missing or stale) so
+            # e.g. supplier + severity filters pick the more selective supplier index
+            connection.execute("PRAGMA analysis_limit=1000")
+            connection.execute("PRAGMA optimize")
+        finally:
+            connection.close()
+        alerts = []
+        for key, run, alert, recommendation in rows[:limit]:
+            alerts.append({
+                **json.loads(alert),
+                "run_id": run,
+                "recorded_at": from_micros(key).isoformat(),
+                "recommendation": None if recommendation is None else json.loads(recommendation),
+            })
+        return {
+            "alerts": alerts,
+            "count": len(alerts),
+            "next_cursor": str(rows[limit - 1][0]) if len(rows) > limit else None,
+        }
+
+    def runs(self, limit: int = PAGE_SIZE) -> List[Dict]:
+        """Most recent recorded runs"""
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                "SELECT run_id, recorded_at, source, alert_count FROM alert_runs ORDER BY run_id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        finally:
+            connection.close()
+        return [
+            {"run_id": run_id, "recorded_at": from_micros(recorded_at).isoformat(), "source": source,
+             "alert_count": count}
+            for run_id, recorded_at, source, count in rows
+        ]
+
+    def latest_run(self) -> Optional[int]:
+        """Id of this source's most recent run, None before the first"""
+        connection = self._connect()
+        try:
+            return connection.execute(
+                "SELECT MAX(run_id) FROM alert_runs WHERE source = ?", (self.source,)
+            ).fetchone()[0]
+        finally:
+            connection.close()
+
+    def previous_run(self, run_id: int) -> Optional[int]:
+        """Id of this source's run before run_id, None if there is none"""
+        connection = self._connect()
+        try:
+            return connection.execute(
+                "SELECT MAX(run_id) FROM alert_runs WHERE source = ? AND run_id < ?", (self.source, run_id)
+            ).fetchone()[0]
+        finally:
+            connection.close()
+
+    def snapshot(self, run_id: int) -> Optional[Snapshot]:
+        """The snapshot recorded with one of this source's runs; None if there is no such run"""
+        connection = self._connect()
+        try:
+            if connection.execute("SELECT 1 FROM alert_runs WHERE run_id = ? AND source = ?",
+                                  (run_id, self.source)).fetchone() is None:
+                return None
+            rows = connection.execute(
+                "SELECT key_hash, rank, item FROM alert_run_items WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        finally:
+            connection.close()
+        return {key: (rank, json.loads(item)) for key, rank, item in rows}
+
+    def __len__(self) -> int:
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+        finally:
+            connection.close()
@@ -0,0 +1,154 @@
+"""
+Supplier Issue History
+Per-supplier ring buffers of past CRITICAL/WARNING days, persisted to SQLite
+"""
+import os
+import sqlite3
+from typing import Optional, Sequence
+
+import numpy as np
+
+from storage.paths import data_path
+from storage.supplier_codes import SupplierCodes
+
+ISSUE_HISTORY_PATH = data_path("PHANTOM_ISSUE_HISTORY", "issue_history.sqlite")
+
+# Event weight of one day at each risk level (NORMAL clears the day)
+EVENT_WEIGHTS = {"CRITICAL": 1.0, "WARNING": 0.5, "NORMAL": 0.0}
+HORIZON_DAYS = 64
+HALF_LIFE_DAYS = 14.0
+LOOKUP_CHUNK = 65536  # rows per vectorized lookup block
+
+_EMPTY_DAY = -2 ** 30  # far enough back that every age stays within int32
+
+
+class IssueHistory:
+    """
+    Decayed count of a supplier's issue days before a given day
+
+    Each supplier has a ring of `horizon` daily slots holding the day number
+    and the event weight recorded for that day. Lookups for a whole batch are
+    one gather from the ring arrays: issue days older than the horizon drop
+    out and the rest decay with the given half-life. Recording a day again
+    overwrites its slot, so re-running an analysis on the same dates does not
+    inflate the history.
+
+    With a path the rings are loaded from SQLite (one row per supplier) and
+    every record() writes the suppliers it touched in a single transaction.
+    """
+
+    def __init__(self, path: Optional[str] = None, horizon: int = HORIZON_DAYS,
+                 half_life: float = HALF_LIFE_DAYS, capacity: int = 16):
+        self.path = path
+        self.horizon = horizon
+        self.half_life = half_life
+        self.registry = SupplierCodes()
+        self.supplier_ids = self.registry.ids  # supplier id of each internal code
+        self.days = np.full((capacity, horizon), _EMPTY_DAY, dtype=np.int32)
+        self.weights = np.zeros((capacity, horizon), dtype=np.float32)
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.supplier_ids)
+
+    def supplier_codes(self, supplier_ids: Sequence[str], register: bool = True) -> np.ndarray:
+        """Internal codes for supplier ids; unknown ids get -1 unless registered"""
+        codes = self.registry.codes(supplier_ids, register)
+        capacity = len(self.days)
+        if len(self.supplier_ids) > capacity:
+            grown = max(len(self.supplier_ids), capacity * 2)
+            days = np.full((grown, self.horizon), _EMPTY_DAY, dtype=np.int32)
+            weights = np.zeros((grown, self.horizon), dtype=np.float32)
+            days[:capacity], weights[:capacity] = self.days, self.weights
+            self.days, self.weights = days, weights
+        return codes
+
+    def lookup(self, codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """
+        Decayed issue count for each (supplier code, day): the sum of event
+        weights on the supplier's days strictly before `day` within the horizon
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int32)
+        history = np.zeros(len(codes))
+        # Decay by age in days; ages outside (0, horizon] map to the zero entries at both ends
+        decay = np.zeros(self.horizon + 2, dtype=np.float32)
+        decay[1:-1] = np.exp2(-np.arange(1, self.horizon + 1) / self.half_life)
+        known = np.flatnonzero(codes >= 0)
+        for start in range(0, len(known), LOOKUP_CHUNK):
+            rows = known[start:start + LOOKUP_CHUNK]
+            age = days[rows, None] - self.days[codes[rows]]
+            np.clip(age, 0, self.horizon + 1, out=age)
+            history[rows] = np.einsum("ij,ij->i", decay.take(age), self.weights[codes[rows]])
+        return history
+
+    def lookup_ids(self, supplier_ids: Sequence[str], days: np.ndarray) -> np.ndarray:
+        return self.lookup(self.supplier_codes(supplier_ids, register=False), days)
+
+    def record(self, codes: np.ndarray, days: np.ndarray, weights: np.ndarray, persist: bool = True) -> None:
+        """
+        Record one event weight per (supplier code, day); repeats keep the largest
+        With persist=False the touched suppliers are only written by a later save()
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+        if not len(codes):
+            return
+        order = np.lexsort((weights, days, codes))
+        codes, days, weights = codes[order], days[order], weights[order]
+        # Last entry of each (code, day) run holds the largest weight
+        last = np.r_[(codes[1:] != codes[:-1]) | (days[1:] != days[:-1]), True]
+        codes, days, weights = codes[last], days[last], weights[last]
+
+        slots = days % self.horizon
+        newer = days >= self.days[codes, slots]
+        codes, slots = codes[newer], slots[newer]
+        self.days[codes, slots] = days[newer]
+        self.weights[codes, slots] = weights[newer]
+        if persist:
+            self.save(np.unique(codes))
+
+    def record_ids(self, supplier_ids: Sequence[str], days: np.ndarray, weights: np.ndarray) -> None:
+        self.record(self.supplier_codes(supplier_ids), days, weights)
+
+    def save(self, codes: Optional[np.ndarray] = None) -> None:
+        """Write the given suppliers' rings (default: all) to SQLite; no-op without a path"""
+        if self.path is None or (codes is not None and not len(codes)):
+            return
+        self._store(np.arange(len(self.supplier_ids)) if codes is None else np.asarray(codes, dtype=np.int64))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS issue_history ("
+            "supplier_id TEXT PRIMARY KEY, horizon INTEGER NOT NULL, days BLOB NOT NULL, weights BLOB NOT NULL)"
+        )
+        return connection
+
+    def _load(self) -> None:
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT supplier_id, horizon, days, weights FROM issue_history").fetchall()
+        finally:
+            connection.close()
+        codes = self.supplier_codes([row[0] for row in rows])
+        for code, (supplier_id, horizon, days, weights) in zip(codes.tolist(), rows):
+            if horizon != self.horizon:
+                raise ValueError(f"{self.path} stores a {horizon}-day horizon, expected {self.horizon}")
+            self.days[code] = np.frombuffer(days, dtype=np.int32)
+            self.weights[code] = np.frombuffer(weights, dtype=np.float32)
+
+    def _store(self, codes: np.ndarray) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO issue_history (supplier_id, horizon, days, weights) VALUES (?, ?, ?, ?)",
+                    [(self.supplier_ids[code], self.horizon, self.days[code].tobytes(), self.weights[code].tobytes())
+                     for code in codes.tolist()],
+                )
+        finally:
+            connection.close()
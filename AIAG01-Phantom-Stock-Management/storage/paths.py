@@ -0,0 +1,12 @@
+"""
+Data Paths
+Where persistent state lives: under datasets/ unless a PHANTOM_* environment variable points elsewhere
+"""
+import os
+
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "datasets")
+
+
+def data_path(env: str, name: str) -> str:
+    """The path set in environment variable env, else datasets/<name>"""
+    return os.environ.get(env, os.path.join(DATASETS_DIR, name))
@@ -0,0 +1,40 @@
+"""
+Supplier Codes
+Dense integer codes for supplier ids, used to index per-supplier arrays
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class SupplierCodes:
+    """
+    Supplier id -> code registry; codes are assigned 0, 1, 2, ... in first-seen order
+
+    `ids` lists the registered suppliers by code. Owners alias it as their
+    `supplier_ids` and grow their per-supplier arrays after registering.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, supplier_id: str) -> Optional[int]:
+        return self._codes.get(supplier_id)
+
+    def codes(self, supplier_ids: Sequence[str], register: bool = True) -> np.ndarray:
+        """Codes for supplier ids; unknown ids get -1 unless registered"""
+        codes = np.empty(len(supplier_ids), dtype=np.int64)
+        for index, supplier_id in enumerate(supplier_ids):
+            code = self._codes.get(supplier_id)
+            if code is None:
+                if not register:
+                    codes[index] = -1
+                    continue
+                code = self._codes[supplier_id] = len(self.ids)
+                self.ids.append(supplier_id)
+            codes[index] = code
+        return codes
@@ -0,0 +1,456 @@
+"""
+Tests for alert lifecycle tracking
+Run directly or with pytest
+"""
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from alerting.diff import diff, snapshot
+from alerting.dispatch import DROP_NEWEST, DROP_OLDEST, SPILL, AlertDispatcher, FileSink, Sink, WebhookSink
+from alerting.lifecycle import ACKNOWLEDGED, OPEN, RESOLVED, AlertLifecycle
+from agents.risk_analysis_agent import RiskAnalysisAgent
+from agents.supervisor_agent import SupervisorAgent
+from storage.alert_history import AlertHistory, to_micros
+from test_risk import make_validations
+
+START = datetime(2024, 1, 15, 12, 0, 0)
+
+def alert(supplier_id, severity="CRITICAL", data_quality=False, at=START):
+    prefix = "ALERT-DQ-" if data_quality else "ALERT-"
+    return {
+        "alert_id": f"{prefix}{supplier_id}-{at.strftime('%Y%m%d%H%M%S')}",
+        "severity": severity,
+        "supplier_id": supplier_id,
+        "message": f"{severity}: {supplier_id}",
+        "timestamp": at.isoformat()
+    }
+
+def events(result):
+    return {(a["supplier_id"], a["lifecycle"]["event"]) for a in result["alerts"]}
+
+def test_lifecycle_suppresses_repeats():
+    print("✓ Alert lifecycle: new alerts sent once, repeats suppressed, reminders back off")
+    lifecycle = AlertLifecycle()
+    first = lifecycle.observe([alert("T3-001"), alert("T3-001", data_quality=True), alert("T2-001", "WARNING")],
+                              START)
+    assert events(first) == {("T3-001", "new"), ("T2-001", "new")} and len(first["alerts"]) == 3
+    alert_id = first["alerts"][0]["alert_id"]
+
+    # Same alerts a minute later: nothing to send
+    later = START + timedelta(minutes=1)
+    repeat = lifecycle.observe([alert("T3-001", at=later), alert("T3-001", data_quality=True, at=later),
+                                alert("T2-001", "WARNING", at=later)], later)
+    assert repeat["alerts"] == [] and repeat["suppressed"] == 3
+    assert lifecycle.get(alert_id).status == OPEN  # the original alert id is kept
+
+    # Reminders after 1h, then 2h, then 4h
+    sent = []
+    for minutes in range(0, 8 * 60, 10):
+        now = START + timedelta(minutes=minutes)
+        result = lifecycle.observe([alert("T3-001", at=now)], now)
+        sent.extend(minutes for a in result["alerts"] if a["lifecycle"]["event"] == "reminder")
+    assert sent == [60, 180, 420]
+    assert lifecycle.counts() == {OPEN: 1, ACKNOWLEDGED: 0, RESOLVED: 2}
+
+def test_lifecycle_transitions():
+    print("✓ Alert lifecycle: acknowledge, escalate, resolve and reopen")
+    lifecycle = AlertLifecycle()
+    alert_id = lifecycle.observe([alert("T3-001", "WARNING")], START)["alerts"][0]["alert_id"]
+    assert lifecycle.acknowledge("missing") is None
+    assert lifecycle.acknowledge(alert_id, START).status == ACKNOWLEDGED
+
+    # Acknowledged: no reminders until the acknowledgement expires
+    now = START + timedelta(hours=12)
+    assert lifecycle.observe([alert("T3-001", "WARNING", at=now)], now)["alerts"] == []
+    now = START + timedelta(hours=25)
+    reminded = lifecycle.observe([alert("T3-001", "WARNING", at=now)], now)
+    assert events(reminded) == {("T3-001", "reminder")} and lifecycle.get(alert_id).status == OPEN
+
+    # An escalation notifies even when acknowledged
+    lifecycle.acknowledge(alert_id, now)
+    now += timedelta(minutes=5)
+    escalated = lifecycle.observe([alert("T3-001", "CRITICAL", at=now)], now)
+    assert events(escalated) == {("T3-001", "escalated")}
+    assert lifecycle.get(alert_id).severity == "CRITICAL" and lifecycle.get(alert_id).status == OPEN
+
+    # Missing from a run: resolved; raised again: reopened under a new id
+    now += timedelta(minutes=5)
+    assert lifecycle.observe([], now)["resolved"] == [alert_id]
+    assert lifecycle.active() == []
+    now += timedelta(minutes=5)
+    reopened = lifecycle.observe([alert("T3-001", at=now)], now)
+    assert events(reopened) == {("T3-001", "reopened")}
+    assert reopened["alerts"][0]["alert_id"] != alert_id and lifecycle.get(alert_id) is None
+
+    # Resolved by hand, then forgotten once resolved_ttl passes
+    lifecycle.resolve(reopened["alerts"][0]["alert_id"], now)
+    assert lifecycle.active() == []
+    lifecycle.observe([], now + timedelta(days=8))
+    assert len(lifecycle) == 0
+
+def test_lifecycle_persistence():
+    print("✓ Alert lifecycle: SQLite round trip")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "alerts", "state.sqlite")
+        lifecycle = AlertLifecycle(path)
+        first = lifecycle.observe([alert("T3-001"), alert("T2-001", "WARNING")], START)
+        lifecycle.acknowledge(first["alerts"][1]["alert_id"], START)
+        # Within the persist interval the acknowledgement is only written by flush()
+        lifecycle.observe([alert("T3-001"), alert("T2-001", "WARNING")], START + timedelta(seconds=10))
+        lifecycle.flush()
+
+        restored = AlertLifecycle(path)
+        assert {key: s.to_dict() for key, s in restored.states.items()} == \
+            {key: s.to_dict() for key, s in lifecycle.states.items()}
+        assert restored.get(first["alerts"][1]["alert_id"]).status == ACKNOWLEDGED
+        later = START + timedelta(minutes=1)
+        assert restored.observe([alert("T3-001", at=later), alert("T2-001", "WARNING", at=later)],
+                                later)["alerts"] == []
+
+        # Forgotten keys are deleted from the table
+        restored.observe([], later)
+        restored.observe([], later + timedelta(days=8))
+        restored.flush()
+        assert len(AlertLifecycle(path)) == 0
+
+def test_supervisor_steady_state():
+    print("✓ Supervisor: an unchanged re-run sends no alerts but keeps them active")
+    validations = make_validations(seed=5)
+    output = RiskAnalysisAgent().analyze_risks(validations)
+    supervisor = SupervisorAgent()
+    first = supervisor.verify_and_decide(output, {})
+    assert first["total_alerts"] > 0 and first["recommendations"]
+    assert all(a["lifecycle"]["event"] == "new" for a in first["alerts"])
+
+    second = supervisor.verify_and_decide(output, {})
+    assert second["alerts"] == [] and second["recommendations"] == []
+    assert second["suppressed_alerts"] == first["total_alerts"]
+    assert second["active_alerts"] == first["total_alerts"]
+    assert second["active_critical_alerts"] == first["critical_alerts"]
+    assert {a["alert_id"] for a in supervisor.lifecycle.active()} == {a["alert_id"] for a in first["alerts"]}
+
+class StandInWebhook:
+    """Local HTTP server standing in for a webhook sink: fails the first `failures` requests, sleeps `delay`"""
+
+    def __init__(self, failures=0, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.batches = []
+        self.requests = 0
+        self.lock = threading.Lock()
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(webhook.delay)
+                with webhook.lock:
+                    webhook.requests += 1
+                    failed = webhook.requests <= webhook.failures
+                    if not failed:
+                        webhook.batches.append(body["alerts"])
+                self.send_response(500 if failed else 200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/alerts"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def delivered(self):
+        return [alert["alert_id"] for batch in self.batches for alert in batch]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def numbered(count, start=0):
+    return [alert(f"T3-{i:04d}", at=START + timedelta(seconds=i)) for i in range(start, start + count)]
+
+def test_dispatch_batches_and_retries():
+    print("✓ Alert dispatch: batched fan-out to file and webhook sinks, retried with back-off")
+    webhook = StandInWebhook(failures=2)
+    dispatcher = AlertDispatcher()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "alerts.jsonl")
+        try:
+            dispatcher.add_sink(FileSink(path), batch_size=10, linger=0.05)
+            dispatcher.add_sink(WebhookSink(webhook.url), batch_size=10, linger=0.05, workers=1,
+                                retry_base=0.01)
+            alerts = numbered(25)
+            dispatcher.submit(alerts)
+            assert dispatcher.flush(timeout=10)
+            with open(path) as f:
+                written = [json.loads(line)["alert_id"] for line in f]
+            assert sorted(written) == sorted(a["alert_id"] for a in alerts)
+            assert sorted(webhook.delivered()) == sorted(a["alert_id"] for a in alerts)
+            assert all(len(batch) <= 10 for batch in webhook.batches)
+
+            file_metrics, webhook_metrics = dispatcher.metrics()
+            assert file_metrics["sent"] == 25 and file_metrics["batches"] == 3 and file_metrics["retries"] == 0
+            assert webhook_metrics["sent"] == 25 and webhook_metrics["retries"] == 2
+            assert webhook_metrics["failed"] == 0 and "HTTPError" in webhook_metrics["last_error"]
+            assert webhook_metrics["mean_latency"] > 0 and webhook_metrics["buffered"] == 0
+        finally:
+            dispatcher.close(timeout=5)
+            webhook.close()
+
+def test_dispatch_gives_up():
+    print("✓ Alert dispatch: a batch that keeps failing is counted after max_retries")
+    try:
+        Sink()
+        assert False, "a sink without send() was created"
+    except TypeError:
+        pass
+    webhook = StandInWebhook(failures=100)
+    dispatcher = AlertDispatcher()
+    try:
+        dispatcher.add_sink(WebhookSink(webhook.url), workers=1, max_retries=3, retry_base=0.001, linger=0)
+        dispatcher.submit(numbered(4))
+        assert dispatcher.flush(timeout=10)
+        metrics = dispatcher.metrics()[0]
+        assert metrics["failed"] == 4 and metrics["sent"] == 0 and metrics["retries"] == 3
+        assert webhook.requests == 4
+    finally:
+        dispatcher.close(timeout=5)
+        webhook.close()
+
+def test_dispatch_backpressure():
+    print("✓ Alert dispatch: a slow sink never blocks submit; full buffers drop or spill to disk")
+    webhook, spill_webhook = StandInWebhook(delay=0.2), StandInWebhook(delay=0.2)
+    dispatcher = AlertDispatcher()
+    with tempfile.TemporaryDirectory() as directory:
+        spill_path = os.path.join(directory, "spill", "webhook.jsonl")
+        try:
+            options = {"workers": 1, "batch_size": 5, "capacity": 10, "linger": 0}
+            dispatcher.add_sink(WebhookSink(webhook.url, name="oldest"), overflow=DROP_OLDEST, **options)
+            dispatcher.add_sink(WebhookSink(webhook.url, name="newest"), overflow=DROP_NEWEST, **options)
+            dispatcher.add_sink(WebhookSink(spill_webhook.url, name="spill"), overflow=SPILL, spill_path=spill_path,
+                                **options)
+            started = time.perf_counter()
+            for start in range(0, 60, 10):
+                dispatcher.submit(numbered(10, start))
+            elapsed = time.perf_counter() - started
+            assert elapsed < 0.05, f"submit blocked for {elapsed * 1000:.0f} ms"
+
+            time.sleep(0.05)
+            spilling = dispatcher.metrics()[2]
+            assert spilling["spill_pending"] > 0 and os.path.getsize(spill_path) > 0
+            assert dispatcher.flush(timeout=30)
+            oldest, newest, spill = dispatcher.metrics()
+            for metrics in (oldest, newest):
+                assert metrics["dropped"] > 0 and metrics["sent"] + metrics["dropped"] == 60
+            assert spill["dropped"] == 0 and spill["sent"] == 60 and spill["spilled"] > 0
+            assert spill["spill_pending"] == 0 and os.path.getsize(spill_path) == 0
+            # With one worker, spilled alerts are delivered in submission order
+            assert spill_webhook.delivered() == [a["alert_id"] for a in numbered(60)]
+        finally:
+            dispatcher.close(timeout=5)
+            webhook.close()
+            spill_webhook.close()
+
+def test_spill_survives_restart():
+    print("✓ Alert dispatch: alerts queued at shutdown are spilled and delivered after a restart")
+    with tempfile.TemporaryDirectory() as directory:
+        spill_path = os.path.join(directory, "webhook.jsonl")
+        slow = StandInWebhook(delay=0.5)
+        dispatcher = AlertDispatcher()
+        try:
+            dispatcher.add_sink(WebhookSink(slow.url), overflow=SPILL, spill_path=spill_path, linger=0,
+                                workers=1, batch_size=2, capacity=4)
+            dispatcher.submit(numbered(10))
+            time.sleep(0.1)
+            assert not dispatcher.close(timeout=0)
+        finally:
+            slow.close()
+
+        webhook = StandInWebhook()
+        dispatcher = AlertDispatcher()
+        try:
+            dispatcher.add_sink(WebhookSink(webhook.url), overflow=SPILL, spill_path=spill_path, linger=0,
+                                workers=1)
+            assert dispatcher.flush(timeout=10)
+            # The batch in flight at shutdown is re-queued, so all ten arrive in order
+            expected = [a["alert_id"] for a in numbered(10)]
+            assert webhook.delivered() == expected
+        finally:
+            dispatcher.close(timeout=5)
+            webhook.close()
+
+def test_alert_history_queries():
+    print("✓ Alert history: filters, recommendations and cursor pagination")
+    with tempfile.TemporaryDirectory() as directory:
+        history = AlertHistory(os.path.join(directory, "history", "alerts.sqlite"))
+        runs = []
+        for day in range(10):
+            at = START + timedelta(days=day)
+            alerts = [dict(alert(f"T{tier}-00{i}", "CRITICAL" if i % 2 else "WARNING", at=at), tier=tier)
+                      for tier in (1, 2, 3) for i in range(4)]
+            alerts.append(alert("T3-001", "HIGH", data_quality=True, at=at))
+            recommendations = [{"supplier_id": a["supplier_id"], "action": "IMMEDIATE_AUDIT"} for a in alerts]
+            runs.append(history.record(alerts, recommendations, now=at))
+        assert len(history) == 130 and [run["run_id"] for run in history.runs()] == runs[::-1]
+
+        until = START + timedelta(days=9)
+        critical = history.query(severity="CRITICAL", tier=3, since=START + timedelta(days=5), until=until)
+        assert critical["count"] == 8 and critical["next_cursor"] is None
+        assert all(a["severity"] == "CRITICAL" and a["tier"] == 3 for a in critical["alerts"])
+        assert all(a["recommendation"]["supplier_id"] == a["supplier_id"] for a in critical["alerts"])
+        recorded = [a["recorded_at"] for a in critical["alerts"]]
+        assert recorded == sorted(recorded, reverse=True)
+
+        supplier = history.query(supplier_id="T3-001")
+        assert supplier["count"] == 20
+        assert sum(a["recommendation"] is None for a in supplier["alerts"]) == 10  # data quality alerts
+        assert history.query(run_id=runs[3])["count"] == 13
+
+        # Pages of 7 cover every alert once, newest first
+        seen, cursor = [], None
+        while True:
+            page = history.query(limit=7, cursor=cursor)
+            seen.extend((a["run_id"], a["alert_id"]) for a in page["alerts"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert len(seen) == len(set(seen)) == 130 and seen[0][0] == runs[-1]
+
+        # A clock stepping back still records after everything else
+        late = history.record([alert("T1-009", at=START)], now=START)
+        assert history.query(limit=1)["alerts"][0]["run_id"] == late
+        try:
+            history.query(cursor="not-a-cursor")
+            assert False, "invalid cursor accepted"
+        except ValueError:
+            pass
+
+def test_alert_history_scale():
+    print("✓ Alert history: time-range queries stay on covering indexes over a large table")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "alerts.sqlite")
+        history = AlertHistory(path)
+        n = 500_000
+        start = to_micros(START - timedelta(days=365))
+        step = (to_micros(START) - start) // n
+        connection = sqlite3.connect(path)
+        connection.execute(
+            f"WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {n - 1}) "
+            "INSERT INTO alerts (id, run_id, alert_id, supplier_id, tier, severity, risk_score, alert) "
+            f"SELECT {start} + i * {step}, 1, 'ALERT-' || i, 'T' || (1 + i % 3) || '-' || (i % 500), 1 + i % 3, "
+            "CASE WHEN i % 7 = 0 THEN 'CRITICAL' WHEN i % 7 < 3 THEN 'HIGH' ELSE 'WARNING' END, i % 100, "
+            "'{\"severity\": \"x\"}' FROM n"
+        )
+        connection.commit()
+        plan = connection.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM alerts WHERE severity = 'CRITICAL' AND tier = 3 AND id >= 0 "
+            "ORDER BY id DESC LIMIT 101"
+        ).fetchall()
+        connection.close()
+        assert "COVERING INDEX alerts_severity_tier_time" in plan[0][-1]
+
+        since = START - timedelta(days=90)
+        history.query(severity="CRITICAL", tier=3, since=since)  # warm up
+        started = time.perf_counter()
+        page = history.query(severity="CRITICAL", tier=3, since=since)
+        second = history.query(severity="CRITICAL", tier=3, since=since, cursor=page["next_cursor"])
+        supplier = history.query(supplier_id="T3-2", since=since)
+        elapsed = (time.perf_counter() - started) / 3
+        print(f"  {elapsed * 1000:.2f} ms per page over {n} alerts")
+        assert page["count"] == second["count"] == 100 and supplier["count"] > 0
+        assert elapsed < 0.05
+
+def recommendation(supplier_id, priority="P0"):
+    return {"supplier_id": supplier_id, "action": "IMMEDIATE_AUDIT" if priority == "P0" else "INCREASE_MONITORING",
+            "priority": priority}
+
+def test_alert_diff():
+    print("✓ Alert diff: new, resolved and escalated alerts and recommendations between runs")
+    later = START + timedelta(hours=1)
+    previous = snapshot([alert("T1-001"), alert("T2-001", "WARNING"), alert("T3-001", "HIGH", data_quality=True)],
+                        [recommendation("T1-001"), recommendation("T2-001", "P1")])
+    # Same keys under new alert ids and timestamps are not changes
+    assert diff(previous, snapshot([alert("T1-001", at=later), alert("T2-001", "WARNING", at=later),
+                                    alert("T3-001", "HIGH", data_quality=True, at=later)],
+                                   [recommendation("T1-001"), recommendation("T2-001", "P1")]))["counts"] == \
+        {"new": 0, "resolved": 0, "escalated": 0}
+
+    current = snapshot([alert("T2-001", at=later), alert("T3-001", "HIGH", data_quality=True, at=later),
+                        alert("T3-001", "WARNING", at=later), alert("T3-002", "WARNING", at=later)],
+                       [recommendation("T2-001"), recommendation("T3-001", "P1"), recommendation("T3-002", "P1")])
+    changes = diff(previous, current)
+    assert sorted((c["kind"], c["supplier_id"]) for c in changes["new"]) == [
+        ("alert", "T3-001"), ("alert", "T3-002"), ("recommendation", "T3-001"), ("recommendation", "T3-002")]
+    assert sorted((c["kind"], c["supplier_id"]) for c in changes["resolved"]) == [
+        ("alert", "T1-001"), ("recommendation", "T1-001")]
+    assert {(c["kind"], c["supplier_id"], c["escalated_from"]) for c in changes["escalated"]} == {
+        ("alert", "T2-001", "WARNING"), ("recommendation", "T2-001", "P1")}
+    assert changes["counts"] == {"new": 4, "resolved": 2, "escalated": 2}
+    # A downgrade is neither new nor escalated
+    assert diff(current, previous)["counts"]["escalated"] == 0
+
+def test_supervisor_diff_and_history():
+    print("✓ Alert diff: supervisor diffs each run, history diffs any two recorded runs")
+    output = RiskAnalysisAgent().analyze_risks(make_validations(seed=5))
+    quiet = RiskAnalysisAgent().analyze_risks(make_validations(seed=6))
+    supervisor = SupervisorAgent()
+    first = supervisor.verify_and_decide(output, {})
+    raised = first["total_alerts"] + len(first["recommendations"])
+    assert first["changes"] == {"new": raised, "resolved": 0, "escalated": 0}
+    assert supervisor.verify_and_decide(output, {})["changes"] == {"new": 0, "resolved": 0, "escalated": 0}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "alerts.sqlite")
+        history = AlertHistory(path)
+        AlertHistory(path, source="fastapi").record([alert("T1-001")], now=START)
+        runs = [history.record([], snapshot=snapshot([], []), now=START)]
+        snapshots = []
+        for at, risks in ((1, output), (2, quiet), (3, output)):
+            supervisor.verify_and_decide(risks, {})
+            snapshots.append(supervisor.snapshot)
+            runs.append(history.record([], snapshot=supervisor.snapshot, now=START + timedelta(hours=at)))
+        assert history.latest_run() == runs[-1] and history.previous_run(runs[1]) == runs[0]
+        assert history.snapshot(runs[0]) == {} and history.snapshot(runs[-1] + 1) is None
+        assert history.snapshot(1) is None  # recorded by another source
+        assert history.snapshot(runs[3]) == snapshots[2]
+        # Changes since any run, without replaying the runs in between
+        assert diff(history.snapshot(runs[1]), history.snapshot(runs[3]))["counts"] == \
+            {"new": 0, "resolved": 0, "escalated": 0}
+        assert diff(history.snapshot(runs[2]), history.snapshot(runs[3])) == diff(snapshots[1], snapshots[2])
+
+def test_alert_diff_scale():
+    print("✓ Alert diff: linear in the number of alerts")
+    timings = []
+    for n in (20_000, 200_000):
+        previous = snapshot([alert(f"S{i}", "WARNING") for i in range(n)])
+        current = snapshot([alert(f"S{i}", "CRITICAL" if i % 10 == 0 else "WARNING") for i in range(n // 2, 3 * n // 2)])
+        started = time.perf_counter()
+        counts = diff(previous, current)["counts"]
+        timings.append(time.perf_counter() - started)
+        assert counts == {"new": n // 2, "resolved": n // 2, "escalated": n // 20}
+    print(f"  {timings[0] * 1000:.1f} ms for 20k alerts, {timings[1] * 1000:.1f} ms for 200k")
+    assert timings[1] < 1.0 and timings[1] < timings[0] * 30
+
+if __name__ == "__main__":
+    test_lifecycle_suppresses_repeats()
+    test_lifecycle_transitions()
+    test_lifecycle_persistence()
+    test_supervisor_steady_state()
+    test_dispatch_batches_and_retries()
+    test_dispatch_gives_up()
+    test_dispatch_backpressure()
+    test_spill_survives_restart()
+    test_alert_history_queries()
+    test_alert_history_scale()
+    test_alert_diff()
+    test_supervisor_diff_and_history()
+    test_alert_diff_scale()
+    print("\n✅ Alerting tests passed")
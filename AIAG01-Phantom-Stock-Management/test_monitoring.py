@@ -0,0 +1,327 @@
+"""
+Tests for the Supply Monitoring Agent batch paths
+Run directly or with pytest
+"""
+import sys
+import os
+import time
+import tracemalloc
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from simulation.supplier_simulator import SupplierSimulator
+from simulation.columnar import ShipmentColumns, SupplierCatalog, generate_inventory_columns
+from agents.supply_monitoring_agent import SupplyMonitoringAgent
+from agents.supervisor_agent import SupervisorAgent
+from analytics.quality import (
+    EXTENDED_QUALITY_RULES, NEGATIVE_STOCK, INVALID_PRODUCTION_RATE, check_inventory_columns, check_inventory_records
+)
+from analytics.rules import MonitoredRecords, compile_rules, parse_dates
+from analytics.validation import validate_records
+from analytics.logistics import ShipmentWindows
+from datetime import date, timedelta
+
+def make_catalog(n_suppliers):
+    return SupplierCatalog(
+        ids=[f"S-{i:05d}" for i in range(n_suppliers)],
+        names=[f"Supplier {i}" for i in range(n_suppliers)],
+        tiers=[1 + i % 3 for i in range(n_suppliers)],
+        capacity=[3000 + i % 7000 for i in range(n_suppliers)],
+        reliability=[0.8] * n_suppliers,
+    )
+
+def test_quality_flags_match_rules():
+    print("✓ Monitoring: quality rules over legacy records")
+    records = SupplierSimulator(seed=1).generate_inventory_data(days_back=3)
+    records[0]["reported_stock"] = -5
+    records[1]["production_rate"] = 0
+    del records[2]["production_rate"]
+    output = SupplyMonitoringAgent().process_inventory_data(records)
+
+    processed = output["processed_data"]
+    assert processed[0]["quality_issues"] == ["negative_stock"]
+    assert processed[1]["quality_issues"] == ["invalid_production_rate"]
+    assert processed[2]["quality_issues"] == ["invalid_production_rate", "missing_fields"]
+    assert processed[3]["data_quality"] == "good" and processed[3]["quality_issues"] == []
+    assert len({r["monitored_at"] for r in processed}) == 1
+    assert output["anomaly_count"] == 3
+    assert output["anomalies"][0] == {
+        "supplier_id": "T1-001", "issue": "negative_stock", "count": 1,
+        "first_seen": records[0]["date"], "last_seen": records[0]["date"], "sample_records": [0],
+        "severity": "high", "escalate": True
+    }
+    assert [a["issue"] for a in output["anomalies"]] == ["negative_stock", "invalid_production_rate", "missing_fields"]
+
+def test_batch_quality_path():
+    print("✓ Monitoring: batch path keeps flags as a bitmask column")
+    columns = generate_inventory_columns(make_catalog(20000), days_back=50, seed=4)
+    reported = columns.reported_stock.copy()
+    reported[::1000] = -1
+    columns.reported_stock = reported
+    columns.production_rate = columns.production_rate.copy()
+    columns.production_rate[5] = 0
+
+    agent = SupplyMonitoringAgent()
+    started = time.perf_counter()
+    output = agent.process_inventory_batch(columns)
+    batch_ms = (time.perf_counter() - started) * 1000
+    quality = output["quality"]
+    assert quality.flags.dtype == np.uint8 and len(quality) == len(columns)
+    assert output["quality_counts"]["negative_stock"] == 1000
+    assert output["quality_counts"]["invalid_production_rate"] == 1
+    assert quality.flags[0] & NEGATIVE_STOCK and quality.flags[5] & INVALID_PRODUCTION_RATE
+    assert output["anomaly_count"] == 1001
+    assert output["anomalies"][0]["supplier_id"] == "S-00000"
+
+    # Legacy dict path on a slice, extrapolated to the full batch
+    sample = columns.slice(0, 100000).to_records()
+    started = time.perf_counter()
+    agent.process_inventory_data(sample)
+    legacy_ms = (time.perf_counter() - started) * 1000 * len(columns) / len(sample)
+    print(f"  1M records: batch {batch_ms:.0f} ms vs legacy ~{legacy_ms:.0f} ms")
+    assert batch_ms * 10 < legacy_ms
+
+    tracemalloc.start()
+    check_inventory_columns(columns)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  Batch quality check peak memory: {peak / 1e6:.1f} MB")
+    # Derived columns (capacity per row, record age, supplier-day keys) are shared by all rules
+    assert peak < 40 * len(columns)
+
+def test_monitored_records_view():
+    print("✓ Monitoring: processed records are a view, checked and validated without copying")
+    columns = generate_inventory_columns(make_catalog(2000), days_back=100, seed=5)
+    columns.reported_stock = columns.reported_stock.copy()
+    columns.reported_stock[::997] = -1
+    records = columns.to_records()
+    agent = SupplyMonitoringAgent()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    from_records = agent.process_inventory_data(records)
+    records_ms = (time.perf_counter() - started) * 1000
+    records_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    processed = from_records["processed_data"]
+    assert isinstance(processed, MonitoredRecords) and processed._materialized is None
+    eager = [
+        {**record, "monitored_at": from_records["monitored_at"], "data_quality": "poor" if issues else "good",
+         "quality_issues": issues}
+        for record, issues in zip(records, processed.quality.issues())
+    ]
+    assert processed[1994] == eager[1994] and processed[:3] == eager[:3]
+
+    # The same batch as columns: checked as columns, records built only when read
+    started = time.perf_counter()
+    from_columns = agent.process_inventory_data(columns=columns)
+    columns_ms = (time.perf_counter() - started) * 1000
+    print(f"  {len(records)} records: check from dicts {records_ms:.0f} ms ({records_peak / 1e6:.1f} MB peak), "
+          f"from columns {columns_ms:.1f} ms")
+    assert from_columns["anomalies"] == from_records["anomalies"]
+    assert [dict(r, monitored_at=None) for r in from_columns["processed_data"][:500]] == \
+        [dict(r, monitored_at=None) for r in eager[:500]]
+    # Validation reads the flag column and the input directly
+    by_records, by_columns = validate_records(processed), validate_records(from_columns["processed_data"])
+    assert processed._materialized is None
+    assert np.array_equal(by_records.rows, by_columns.rows) and np.array_equal(by_records.deviation, by_columns.deviation)
+    assert records_peak < 200 * len(records)  # copying every record dict alone takes ~500 bytes each
+    assert columns_ms * 10 < records_ms
+    assert processed.to_list() == eager  # what the JSON encoders serialize
+
+def test_declarative_rules():
+    print("✓ Monitoring: declarative rules (capacity, dates, duplicates, rates)")
+    records = SupplierSimulator(seed=2).generate_inventory_data(days_back=3)
+    records[0]["reported_stock"] = 10 ** 9
+    records[1]["consumption_rate"] = records[1]["production_rate"] + 1
+    records[2]["date"] = "2000-01-01"
+    records[4] = dict(records[3])
+    extended = compile_rules(EXTENDED_QUALITY_RULES)
+    # The extra checks are opt-in: the default rule set leaves these records alone
+    assert check_inventory_records(records).anomaly_count == 0
+    report = check_inventory_records(records, rules=extended)
+    counts = report.counts()
+    assert counts["consumption_above_production"] == 1 and counts["stale_date"] == 1
+    assert counts["duplicate_supplier_day"] == 1 and report.issues()[4] == ["duplicate_supplier_day"]
+    # Legacy dicts carry no capacity: the bound applies once supplier capacities are joined in
+    assert counts["stock_above_capacity"] == 0
+    capacities = {supplier["id"]: supplier["capacity"] for supplier in SupplierSimulator(seed=2).get_all_suppliers()}
+    joined = check_inventory_records(records, rules=extended, capacities=capacities)
+    assert joined.issues()[0] == ["stock_above_capacity"] and joined.counts()["stock_above_capacity"] == 1
+    assert set(report.rule_stats["stale_date"]) == {"hits", "seconds"}
+
+    columns = generate_inventory_columns(make_catalog(50), days_back=3, seed=2)
+    columns.reported_stock = columns.reported_stock.copy()
+    columns.reported_stock[7] = 10 ** 9
+    duplicated = columns.concat([columns, columns.slice(0, 10)])
+    report = check_inventory_columns(duplicated, rules=extended)
+    assert report.issues()[7] == ["stock_above_capacity"]
+    assert report.counts()["duplicate_supplier_day"] == 10
+    assert np.flatnonzero(report.flags[:len(columns)]).tolist() == [7]
+
+    # Custom rule sets: bit i is rule i, and the flag column widens with the rule count
+    specs = [{"name": f"stock_over_{i}", "field": "reported_stock", "op": "gt", "value": i * 100} for i in range(50)]
+    specs.append({"name": "rate_out_of_range", "field": "production_rate", "op": "outside", "min": 1, "max": 10 ** 5})
+    assert compile_rules(specs).dtype == np.uint64
+    agent = SupplyMonitoringAgent(rules=specs)
+    output = agent.process_inventory_batch(generate_inventory_columns(make_catalog(2000), days_back=30, seed=3))
+    quality = output["quality"]
+    assert quality.flags.dtype == np.uint64 and len(output["rule_stats"]) == 51
+    assert output["quality_counts"]["stock_over_0"] >= output["quality_counts"]["stock_over_49"]
+    total_seconds = sum(stat["seconds"] for stat in output["rule_stats"].values())
+    print(f"  51 rules over {len(quality)} records: {total_seconds * 1000:.1f} ms")
+
+    try:
+        compile_rules([{"name": "bad", "field": "reported_stock", "op": "approx", "value": 1}])
+        assert False, "unknown operator should be rejected"
+    except ValueError:
+        pass
+
+def test_malformed_dates():
+    print("✓ Monitoring: undated and unparsable dates are flagged, not fatal")
+    dates, invalid = parse_dates(["2026-10-01", None, "10/01/2026", date(2026, 10, 2), "2026-10-03T08:00:00", ""])
+    assert dates.astype(str).tolist() == ["2026-10-01", "NaT", "NaT", "2026-10-02", "2026-10-03", "NaT"]
+    assert invalid.tolist() == [False, False, True, False, False, False]
+
+    records = SupplierSimulator(seed=3).generate_inventory_data(days_back=3)
+    undated = dict(records[0])
+    del undated["date"]
+    records.append(undated)
+    records.append({**records[1], "date": "10/01/2026"})
+    records.append({**records[2], "date": "10/01/2026"})
+    for rules in (None, EXTENDED_QUALITY_RULES):
+        output = SupplyMonitoringAgent(rules=rules).process_inventory_data(records)
+        issues = [record["quality_issues"] for record in output["processed_data"]]
+        assert issues[-3] == [] and issues[-2] == issues[-1] == ["invalid_date"]
+        # Records without a usable date never count as duplicates of each other or of dated records
+        assert all("duplicate_supplier_day" not in found for found in issues)
+        # The roll-up reports them with unknown first/last seen dates
+        invalid = [a for a in output["anomalies"] if a["issue"] == "invalid_date"]
+        assert sum(a["count"] for a in invalid) == 2 and invalid[0]["first_seen"] is None
+        decision = SupervisorAgent().verify_and_decide({}, output)
+        assert sum(a["alert_id"].startswith("ALERT-DQ-") for a in decision["alerts"]) == len(invalid)
+
+def test_anomaly_rollup():
+    print("✓ Monitoring: anomalies roll up per (supplier, issue)")
+    columns = generate_inventory_columns(make_catalog(2000), days_back=365, seed=6)
+    bad_suppliers = np.arange(0, 2000, 200)
+    bad_rows = np.isin(columns.supplier_code, bad_suppliers)
+    columns.reported_stock = np.where(bad_rows, -1, columns.reported_stock)
+    columns.production_rate = columns.production_rate.copy()
+    columns.production_rate[np.flatnonzero(bad_rows)[::2]] = 0
+
+    agent = SupplyMonitoringAgent(rules=EXTENDED_QUALITY_RULES)
+    output = agent.process_inventory_batch(columns)
+    assert output["anomaly_count"] == 10 * 365
+    assert len(output["anomalies"]) == 10 * 3  # negative stock, invalid rate, consumption above production
+    first = output["anomalies"][0]
+    assert (first["supplier_id"], first["issue"], first["count"]) == ("S-00000", "negative_stock", 365)
+    assert first["first_seen"] == str(columns.dates[364]) and first["last_seen"] == str(columns.dates[0])
+    assert first["sample_records"] == [0, 1, 2]
+
+    # Supervisor: one data-quality alert per supplier, whatever the number of bad records
+    decision = SupervisorAgent().verify_and_decide({}, output)
+    dq_alerts = [a for a in decision["alerts"] if a["alert_id"].startswith("ALERT-DQ-")]
+    assert len(dq_alerts) == 10 and dq_alerts[0]["record_count"] == 365 + 183 + 183
+    assert [issue["issue"] for issue in dq_alerts[0]["issues"]] == [
+        "negative_stock", "invalid_production_rate", "consumption_above_production"
+    ]
+
+    # Legacy per-record path: the same roll-up from record dicts
+    records = columns.slice(0, 365 * 3).to_records()
+    legacy = agent.process_inventory_data(records)
+    assert legacy["anomalies"][0]["count"] == 365 and legacy["anomalies"][0]["first_seen"] == first["first_seen"]
+
+def brute_force_window(history, supplier_id, today, window):
+    delays = np.array([d for s, day, d in history if s == supplier_id and 0 <= (today - day).days < window], float)
+    if not len(delays):
+        return None
+    ranked = np.sort(np.clip(delays, 0, 15))
+    p95 = ranked[int(np.ceil(0.95 * len(ranked))) - 1]
+    return {"shipments": len(delays), "on_time_rate": np.mean(delays <= 0),
+            "mean_delay": delays.mean(), "p95_delay": p95}
+
+def test_shipment_windows():
+    print("✓ Monitoring: rolling shipment windows match a full rescan")
+    rng = np.random.default_rng(8)
+    start = date(2024, 1, 1)
+    history = []
+    windows = ShipmentWindows()
+    for step in range(3000):
+        supplier_id = f"S-{rng.integers(0, 12)}"
+        day = start + timedelta(days=int(step // 20 - rng.integers(0, 3)))  # some arrive late
+        delay = int(rng.integers(0, 20)) if rng.random() < 0.3 else 0
+        windows.add(supplier_id, day, delay)
+        history.append((supplier_id, day, delay))
+
+    today = start + timedelta(days=int(windows.day - np.datetime64(start, "D").astype(np.int64)))
+    stats = windows.stats()
+    for supplier_id in ["S-0", "S-5", "S-11"]:
+        code = windows.supplier_ids.index(supplier_id)
+        for w, window in enumerate(windows.windows):
+            expected = brute_force_window(history, supplier_id, today, window)
+            assert stats["shipments"][code, w] == expected["shipments"]
+            for name in ("on_time_rate", "mean_delay", "p95_delay"):
+                assert abs(stats[name][code, w] - expected[name]) < 1e-9, (supplier_id, window, name)
+
+    # Trend: delays growing by 0.5 days per day give a slope of 0.5
+    trending = ShipmentWindows(windows=(30,))
+    for offset in range(30):
+        trending.add("S-T", start + timedelta(days=offset), offset / 2)
+    assert abs(trending.stats()["delay_trend"][0, 0] - 0.5) < 1e-9
+
+    # One batch and one-shipment-at-a-time streaming give the same aggregates
+    shipments = SupplierSimulator(seed=3).generate_shipment_columns()
+    batch = ShipmentWindows()
+    batch.add_shipments(shipments)
+    streamed = ShipmentWindows()
+    for record in sorted(shipments.to_records(), key=lambda r: r["actual_date"]):
+        streamed.add(record["supplier_id"], date.fromisoformat(record["actual_date"]), record["delay_days"])
+    assert batch.summary() == sorted(streamed.summary(), key=lambda s: batch.supplier_ids.index(s["supplier_id"]))
+
+    output = SupplyMonitoringAgent().process_shipment_data(shipments.to_records())
+    assert "shipment_data" not in output and len(output["supplier_stats"]) == 8
+    assert set(output["supplier_stats"][0]["windows"]) == {"7d", "30d", "90d"}
+    assert output["delayed_shipments"] == int((shipments.delay_days > 7).sum())
+
+    # Malformed or missing arrival dates are skipped and counted, not fatal
+    records = shipments.to_records()
+    broken = [dict(records[0], actual_date="2024-13-45"), {k: v for k, v in records[1].items() if k != "actual_date"}]
+    tolerant = SupplyMonitoringAgent().process_shipment_data(records + broken)
+    assert tolerant["undated_shipments"] == 2 and output["undated_shipments"] == 0
+    assert tolerant["supplier_stats"] == output["supplier_stats"]
+    # The columnar path gives the same output without building every record
+    assert SupplyMonitoringAgent().process_shipment_data(columns=shipments) == output
+
+    # Continuous feed: 1M shipments over 100 days, folded in one daily batch at a time
+    catalog = make_catalog(10000)
+    agent = SupplyMonitoringAgent()
+    n = 10000
+    feed = []
+    for day in range(100):
+        delays = np.where(rng.random(n) < 0.2, rng.integers(0, 15, n), 0)
+        offsets = np.full(n, -day)
+        feed.append(ShipmentColumns(
+            catalog, start, supplier_code=rng.integers(0, len(catalog), n).astype(np.int32),
+            sequence=np.arange(n), quantity=np.ones(n), scheduled_offset=offsets + delays,
+            actual_offset=offsets, delay_days=delays,
+        ))
+    started = time.perf_counter()
+    for batch in feed[:-1]:
+        agent.shipment_windows.add_shipments(batch)
+    ingest = time.perf_counter() - started
+    output = agent.process_shipment_stream(feed[-1])
+    print(f"  1M streamed shipments across 10k suppliers: ingest {ingest:.2f} s, "
+          f"{len(output['supplier_stats'])} supplier aggregates returned")
+    assert agent.shipment_windows.stats()["shipments"][:, -1].sum() == 90 * n
+    assert output["as_of"] == str(start + timedelta(days=99))
+
+if __name__ == "__main__":
+    test_quality_flags_match_rules()
+    test_batch_quality_path()
+    test_monitored_records_view()
+    test_declarative_rules()
+    test_malformed_dates()
+    test_anomaly_rollup()
+    test_shipment_windows()
+    print("\n✅ Monitoring tests passed")
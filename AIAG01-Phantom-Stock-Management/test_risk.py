@@ -0,0 +1,684 @@
+"""
+Tests for the Risk Analysis Agent batch paths
+Run directly or with pytest
+"""
+import sys
+import os
+import tempfile
+import time
+from datetime import date
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from simulation.supplier_simulator import SupplierSimulator
+from agents.supply_monitoring_agent import SupplyMonitoringAgent
+from agents.validation_agent import ValidationAgent
+from agents.risk_analysis_agent import RiskAnalysisAgent
+from analytics.forecast import day_numbers
+from analytics.audit_planner import ACTION_PRIORITY, AUDIT_SLOTS, AuditPlanner, audit_values
+from analytics.propagation import RiskPropagator
+from analytics.reachability import ReachabilityIndex
+from analytics.records import LazyRecords, materialize
+from analytics.risk import score_risks, simulated_history, validation_arrays
+from analytics.risk_index import RiskIndex
+from analytics.risk_rollup import RiskWindows
+from analytics.threshold_sweep import ThresholdSweep
+from analytics.validation import validate_records
+from agents.supervisor_agent import SupervisorAgent
+from simulation.supplier_graph import generate_supplier_graph
+from storage.issue_history import EVENT_WEIGHTS, IssueHistory
+
+def make_validations(seed=1, days_back=30):
+    records = SupplierSimulator(seed=seed).generate_inventory_data(days_back=days_back)
+    processed = SupplyMonitoringAgent().process_inventory_data(records)["processed_data"]
+    return ValidationAgent().validate_inventory(processed)["validations"]
+
+def legacy_assessment(validation, historical_issues):
+    """The original per-record scoring, kept as the reference"""
+    deviation = validation.get("deviation", 0)
+    tier = validation.get("tier", 1)
+    deviation_score = min(deviation * 50, 50)
+    tier_score = tier * 6.67
+    history_score = min(historical_issues * 10, 30)
+    total_risk_score = deviation_score + tier_score + history_score
+    if total_risk_score > 70:
+        risk_level, classification, escalate = "CRITICAL", "phantom_stock_likely", True
+    elif total_risk_score > 40:
+        risk_level, classification, escalate = "WARNING", "monitor_closely", True
+    else:
+        risk_level, classification, escalate = "NORMAL", "normal", False
+    return {
+        "supplier_id": validation["supplier_id"],
+        "supplier_name": validation["supplier_name"],
+        "tier": tier,
+        "risk_score": round(total_risk_score, 2),
+        "risk_level": risk_level,
+        "classification": classification,
+        "deviation_percentage": validation.get("deviation_percentage", 0),
+        "reported_stock": validation.get("reported_stock", 0),
+        "expected_stock": validation.get("expected_stock", 0),
+        "escalate": escalate,
+        "components": {
+            "deviation_score": round(deviation_score, 2),
+            "tier_score": round(tier_score, 2),
+            "history_score": round(history_score, 2)
+        }
+    }
+
+def test_issue_history_ring():
+    print("✓ Issue history: decayed counts of earlier days, idempotent re-recording")
+    history = IssueHistory(horizon=8, half_life=2.0)
+    history.record_ids(["A", "A", "A", "B"], np.array([10, 12, 12, 12]), np.array([1.0, 0.5, 1.0, 0.5]))
+
+    counts = history.lookup_ids(["A", "A", "A", "B", "C"], np.array([10, 12, 14, 13, 14]))
+    assert counts[0] == 0  # nothing before day 10
+    assert np.isclose(counts[1], 0.5)  # day 10 at age 2
+    assert np.isclose(counts[2], 0.25 + 1.0 * 0.5)  # day 10 at age 4, day 12 (max weight) at age 2
+    assert np.isclose(counts[3], 0.5 * 2 ** -0.5)
+    assert counts[4] == 0
+    # Lookups do not register unknown suppliers; codes follow first-seen order
+    assert history.supplier_ids == ["A", "B"] and history.supplier_codes(["B", "C"], register=False).tolist() == [1, -1]
+
+    # Re-recording a day replaces it instead of adding to it
+    history.record_ids(["A"], np.array([12]), np.array([0.0]))
+    assert np.isclose(history.lookup_ids(["A"], np.array([14]))[0], 0.25)
+    # Days beyond the horizon drop out, and a newer day reuses the slot
+    assert history.lookup_ids(["A"], np.array([19]))[0] == 0
+    history.record_ids(["A"], np.array([18]), np.array([1.0]))
+    history.record_ids(["A"], np.array([10]), np.array([1.0]))
+    assert np.isclose(history.lookup_ids(["A"], np.array([19]))[0], 2 ** -0.5)
+
+def test_issue_history_persistence():
+    print("✓ Issue history: SQLite round trip")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history", "issues.sqlite")
+        history = IssueHistory(path)
+        history.record_ids(["T3-001", "T2-001"], np.array([19000, 19001]), np.array([1.0, 0.5]))
+        history.record_ids(["T3-001"], np.array([19002]), np.array([0.5]))
+
+        restored = IssueHistory(path)
+        probe = np.array([19005, 19005])
+        assert sorted(restored.supplier_ids) == ["T2-001", "T3-001"]
+        assert np.array_equal(restored.lookup_ids(["T3-001", "T2-001"], probe),
+                              history.lookup_ids(["T3-001", "T2-001"], probe))
+        try:
+            IssueHistory(path, horizon=32)
+            assert False, "horizon mismatch not detected"
+        except ValueError:
+            pass
+
+def test_history_feeds_risk_scores():
+    print("✓ Risk: history comes from earlier days, in earlier runs or the same batch, and re-runs score the same")
+    validations = make_validations(seed=2)
+    agent = RiskAnalysisAgent()
+    first = agent.analyze_risks(validations)
+    assessments = first["risk_assessments"]
+    
+    # Each record only sees issue days before its own date, from this batch
+    reference = IssueHistory()
+    by_date = sorted(range(len(validations)), key=lambda row: validations[row]["date"])
+    for date in sorted({validation["date"] for validation in validations}):
+        rows = [row for row in by_date if validations[row]["date"] == date]
+        days = day_numbers([date] * len(rows))
+        expected = reference.lookup_ids([validations[row]["supplier_id"] for row in rows], days)
+        assert np.allclose([min(value * 10, 30) for value in expected],
+                           [assessments[row]["components"]["history_score"] for row in rows], atol=0.01)
+        reference.record_ids([validations[row]["supplier_id"] for row in rows], days,
+                             [EVENT_WEIGHTS[assessments[row]["risk_level"]] for row in rows])
+    first_day = min(validation["date"] for validation in validations)
+    assert all(r["components"]["history_score"] == 0
+               for r, validation in zip(assessments, validations) if validation["date"] == first_day)
+    assert max(r["components"]["history_score"] for r in assessments) > 10
+    
+    # Re-running the same dates overwrites their history: identical input scores identically
+    second = agent.analyze_risks(validations)
+    assert second["risk_assessments"] == assessments
+    assert second["critical_count"] == first["critical_count"]
+    
+    # Splitting the window across two runs gives the same scores: the later days
+    # see the earlier ones through the history recorded by the first run
+    middle = sorted({validation["date"] for validation in validations})[15]
+    split = RiskAnalysisAgent()
+    split.analyze_risks([v for v in validations if v["date"] < middle])
+    later = split.analyze_risks([v for v in validations if v["date"] >= middle])["risk_assessments"]
+    assert later == [r for r, validation in zip(assessments, validations) if validation["date"] >= middle]
+    
+    
+    # Undated or unparsable dates score without history instead of failing the batch
+    odd = [{**validations[0], "date": "10/01/2026"}, {key: value for key, value in validations[1].items() if key != "date"}]
+    scored = agent.analyze_risks(odd)["risk_assessments"]
+    assert [r["components"]["history_score"] for r in scored] == [0, 0]
+
+def test_bulk_history_lookup():
+    print("✓ Issue history: 1M lookups as one batch")
+    rng = np.random.default_rng(4)
+    history = IssueHistory()
+    codes = history.supplier_codes([f"S-{i:05d}" for i in range(20000)])
+    history.record(np.repeat(codes, 20), np.tile(np.arange(19000, 19040, 2), len(codes)),
+                   rng.choice([0.0, 0.5, 1.0], len(codes) * 20))
+    lookup_codes = np.repeat(codes, 50)
+    lookup_days = np.tile(np.arange(19000, 19050), len(codes))
+    started = time.perf_counter()
+    counts = history.lookup(lookup_codes, lookup_days)
+    elapsed = time.perf_counter() - started
+    print(f"  {len(counts)} lookups: {elapsed * 1000:.0f} ms")
+    assert elapsed < 3.0
+
+    for row in rng.integers(0, len(counts), 20).tolist():
+        code, day = lookup_codes[row], lookup_days[row]
+        age = day - history.days[code].astype(np.int64)
+        inside = (age > 0) & (age <= history.horizon)
+        expected = float((history.weights[code][inside] * 2.0 ** (-age[inside] / history.half_life)).sum())
+        assert np.isclose(counts[row], expected)
+
+def test_batch_scoring_matches_legacy():
+    print("✓ Risk: batch kernel matches the per-record scoring, dicts built lazily")
+    validations = make_validations(seed=3)
+    validations[0]["deviation"] = 1.7  # capped deviation score
+    validations[1]["deviation"] = 0.85
+    validations[1]["tier"] = 3
+    deviation, tier = validation_arrays(validations)
+    history = simulated_history(deviation)
+    scores = score_risks(deviation, tier, history)
+    expected = [legacy_assessment(v, h) for v, h in zip(validations, history.tolist())]
+
+    assessments = scores.lazy(validations)
+    assert isinstance(assessments, LazyRecords) and assessments._materialized is None
+    assert assessments[5] == expected[5] and assessments[-1] == expected[-1]
+    assert assessments[2:4] == expected[2:4]
+    assert list(assessments) == expected and assessments == expected
+    critical = scores.lazy(validations, scores.critical_indices)
+    assert list(critical) == [a for a in expected if a["risk_level"] == "CRITICAL"] and len(critical) >= 1
+    assert list(scores.lazy(validations, scores.warning_indices)) == [a for a in expected if a["risk_level"] == "WARNING"]
+    assert materialize({"risks": {"all": assessments}})["risks"]["all"] == expected
+
+    # The per-record API agrees with the kernel
+    agent = RiskAnalysisAgent()
+    assert agent.calculate_risk_score(validations[1], 1) == expected[1]
+
+def test_batch_scoring_scale():
+    print("✓ Risk: 1M validations scored as arrays")
+    rng = np.random.default_rng(8)
+    n = 1000000
+    deviation = rng.exponential(0.1, n)
+    tier = rng.integers(1, 4, n)
+    history = rng.random(n) * 3
+    started = time.perf_counter()
+    scores = score_risks(deviation, tier, history)
+    critical, warning = scores.critical_indices, scores.warning_indices
+    elapsed = time.perf_counter() - started
+    print(f"  {n} validations: {elapsed * 1000:.0f} ms, {len(critical)} critical, {len(warning)} warnings")
+    assert elapsed < 0.2
+    assert scores.counts()["CRITICAL"] == len(critical)
+
+def brute_force_windows(assessments, supplier_id, latest_day, window):
+    """Window statistics recomputed from the latest assessment per supplier-day"""
+    days = {}
+    for supplier, day, risk, level in assessments:
+        if supplier == supplier_id and latest_day - window < day <= latest_day:
+            days[day] = (risk, level)
+    if not days:
+        return None
+    t = np.array(sorted(days), dtype=np.float64)
+    risk = np.array([days[day][0] for day in sorted(days)])
+    levels = [days[day][1] for day in sorted(days)]
+    return {
+        "assessments": len(days),
+        "max_risk": risk.max(),
+        "mean_risk": risk.mean(),
+        "risk_trend": np.polyfit(t, risk, 1)[0] if len(days) > 1 else np.nan,
+        "critical_count": levels.count(2),
+        "warning_count": levels.count(1),
+    }
+
+def test_rolling_risk_windows():
+    print("✓ Risk roll-up: incremental windows match a recomputation, re-runs replace days")
+    rng = np.random.default_rng(6)
+    windows = RiskWindows((3, 10))
+    ids = [f"S-{i}" for i in range(6)]
+    assessments = []
+    for start in range(0, 40, 5):
+        # Batches overlap the previous one, so some supplier-days are assessed twice
+        n = 25
+        supplier = rng.integers(0, len(ids), n)
+        day = 19000 + start + rng.integers(-3, 5, n)
+        keep = np.unique(supplier * 100000 + day, return_index=True)[1]
+        supplier, day = supplier[keep], day[keep]
+        risk = rng.random(len(day)) * 100
+        level = np.where(risk > 70, 2, np.where(risk > 40, 1, 0))
+        windows.add_batch(windows.supplier_codes([ids[i] for i in supplier.tolist()]), day, risk, level)
+        assessments += [(ids[s], d, r, l) for s, d, r, l in zip(supplier.tolist(), day.tolist(), risk, level.tolist())
+                        if d > windows.day - windows.horizon]
+
+        stats = windows.stats()
+        for code, supplier_id in enumerate(windows.supplier_ids):
+            for w, window in enumerate(windows.windows):
+                expected = brute_force_windows(assessments, supplier_id, windows.day, window)
+                if expected is None:
+                    assert stats["assessments"][code, w] == 0 and np.isnan(stats["max_risk"][code, w])
+                    continue
+                for name, value in expected.items():
+                    assert np.isclose(stats[name][code, w], value, equal_nan=True), (name, supplier_id, window)
+
+def test_supplier_rollup_alerts():
+    print("✓ Risk roll-up: one row and at most one alert per supplier")
+    validations = make_validations(seed=5)
+    agent = RiskAnalysisAgent()
+    output = agent.analyze_risks(validations)
+    supplier_ids = {v["supplier_id"] for v in validations}
+    rows = list(output["supplier_risks"])
+    assert len(rows) == output["suppliers_assessed"] == len(supplier_ids)
+    assert {row["supplier_id"] for row in rows} == supplier_ids
+
+    peaks = {}
+    for assessment in output["risk_assessments"]:
+        best = peaks.get(assessment["supplier_id"])
+        if best is None or assessment["risk_score"] > best["risk_score"]:
+            peaks[assessment["supplier_id"]] = assessment
+    for row in rows:
+        assert row["peak_assessment"] == peaks[row["supplier_id"]]
+        assert row["risk_level"] == row["peak_assessment"]["risk_level"]  # a single run: the batch peak
+        assert row["windows"]["90d"]["assessments"] == sum(
+            1 for v in validations if v["supplier_id"] == row["supplier_id"])
+    max_risk = [row["windows"]["90d"]["max_risk"] for row in rows]
+    assert max_risk == sorted(max_risk, reverse=True)
+
+    flagged = {a["supplier_id"] for a in output["critical_risks"] + output["warnings"]}
+    decision = SupervisorAgent().verify_and_decide(output, {})
+    alerted = [alert["supplier_id"] for alert in decision["alerts"]]
+    assert sorted(alerted) == sorted(flagged) and len(alerted) == len(set(alerted))
+    assert decision["critical_alerts"] == output["supplier_critical_count"]
+    assert all("windows" in alert for alert in decision["alerts"])
+    assert len(decision["alerts"]) <= output["critical_count"] + output["warning_count"]
+
+def test_threshold_sweep_matches_rescoring():
+    print("✓ Threshold sweep: counts and suppliers match re-running the pipeline")
+    records = SupplierSimulator(seed=7).generate_inventory_data(days_back=30)
+    processed = SupplyMonitoringAgent().process_inventory_data(records)["processed_data"]
+    validation_output = ValidationAgent().validate_inventory(processed)
+    validations = validation_output["validations"]
+    output = RiskAnalysisAgent().analyze_risks(validations)
+    sweep = output["threshold_sweep"]
+    deviation, tier = validation_arrays(validations)
+    history = output["scores"].history_score / 10  # the sweep keeps the run's history component
+
+    critical_values, warning_values = [45, 60, 70, 75.5, 90], [20, 40, 55, 70, 80]
+    table = sweep.level_records(critical_values, warning_values, suppliers=True)
+    assert len(table) == len(critical_values) * len(warning_values)
+    for row in table:
+        rescored = score_risks(deviation, tier, history, row["critical_threshold"], row["warning_threshold"])
+        assert row["critical_count"] == len(rescored.critical_indices)
+        assert row["warning_count"] == len(rescored.warning_indices)
+        # A supplier counts at its worst level
+        worst = {}
+        for validation, level in zip(validations, rescored.level.tolist()):
+            worst[validation["supplier_id"]] = max(level, worst.get(validation["supplier_id"], 0))
+        assert sorted(row["critical_suppliers"]) == sorted(s for s, level in worst.items() if level == 2)
+        assert sorted(row["warning_suppliers"]) == sorted(s for s, level in worst.items() if level == 1)
+        assert row["supplier_critical_count"] == len(row["critical_suppliers"])
+    assert sweep.levels(70, 40)["critical_count"] == output["critical_count"]
+
+    deviation_sweep = validation_output["deviation_sweep"]
+    for row in deviation_sweep.threshold_records([0.0, 0.1, 0.2, 0.35, 1.0], suppliers=True):
+        result = validate_records(processed, row["threshold"])
+        flagged = {validations[i]["supplier_id"] for i in result.high_indices.tolist()}
+        assert row["count"] == result.high_count and sorted(row["suppliers"]) == sorted(flagged)
+
+def test_threshold_sweep_scale():
+    print("✓ Threshold sweep: 10,000 threshold pairs over 1M scores")
+    rng = np.random.default_rng(9)
+    n = 1000000
+    scores = score_risks(rng.exponential(0.3, n), rng.integers(1, 4, n), rng.random(n) * 3)
+    codes = rng.integers(0, 20000, n)
+    sweep = ThresholdSweep(scores.risk_score, codes, [f"S-{i:05d}" for i in range(20000)])
+    started = time.perf_counter()
+    sweep.count_above([0.0])  # the one-off sort
+    prepared = time.perf_counter()
+    grid = np.arange(0, 100, 1.0)
+    table = sweep.level_table(grid, grid)
+    elapsed = time.perf_counter() - prepared
+    print(f"  sort {(prepared - started) * 1000:.0f} ms, {grid.size ** 2} pairs {elapsed * 1000:.1f} ms")
+    assert elapsed < 0.05
+    assert table["critical_count"][70, 40] == len(scores.critical_indices)
+    assert table["warning_count"][70, 40] == len(scores.warning_indices)
+
+def test_risk_index_queries():
+    print("✓ Risk index: top-N, tier/level and score queries match a full sort, updates replace entries")
+    validations = make_validations(seed=11)
+    agent = RiskAnalysisAgent()
+    output = agent.analyze_risks(validations)
+    assessments = list(output["risk_assessments"])
+    ranked = sorted(range(len(assessments)), key=lambda i: -output["scores"].risk_score[i])
+
+    def expected(limit=None, tier=None, level=None, min_score=None, distinct=False):
+        rows, seen = [], set()
+        for i in ranked:
+            a = assessments[i]
+            if tier is not None and a["tier"] != tier or level is not None and a["risk_level"] != level:
+                continue
+            if min_score is not None and not output["scores"].risk_score[i] > min_score:
+                continue
+            if distinct and a["supplier_id"] in seen:
+                continue
+            seen.add(a["supplier_id"])
+            rows.append(a)
+        return rows[:limit]
+
+    for query in ({"limit": 5}, {"tier": 3, "level": "WARNING"}, {"min_score": 45.0}, {"limit": 3, "distinct": True},
+                  {"tier": 2, "min_score": 30.0, "distinct": True}, {"level": "CRITICAL"}):
+        result = agent.query_risks(**query)
+        assert [a["risk_score"] for a in result["risk_assessments"]] == [a["risk_score"] for a in expected(**query)]
+        if not query.get("distinct"):
+            # Equal scores may come in either order
+            assert sorted(map(str, result["risk_assessments"])) == sorted(map(str, expected(**query)))
+        unlimited = {key: value for key, value in query.items() if key not in ("limit", "distinct")}
+        assert result["matching"] == len(expected(**unlimited))
+
+    # Re-assessing a supplier-day in a later batch replaces its entry instead of adding one
+    validations[0] = dict(validations[0], deviation=5.0)
+    deviation, tier = validation_arrays(validations[:10])
+    days = np.array([v["date"] for v in validations[:10]], dtype="datetime64[D]")
+    agent.index.add(score_risks(deviation, tier, np.zeros(10)), validations[:10],
+                    [v["supplier_id"] for v in validations[:10]], days, tier)
+    assert len(agent.index) == len(validations)
+    top = agent.query_risks(limit=1)["risk_assessments"][0]
+    assert (top["supplier_id"], top["components"]["deviation_score"]) == (validations[0]["supplier_id"], 50.0)
+    assert agent.query_risks(distinct=True)["returned"] == len({v["supplier_id"] for v in validations})
+
+def test_risk_index_latest_run():
+    print("✓ Risk index: holds only the latest run, without keeping earlier batches alive")
+    validations = make_validations(seed=13, days_back=7)
+    agent = RiskAnalysisAgent()
+    base = np.array([v["date"] for v in validations], dtype="datetime64[D]")
+    for shift in range(20):
+        run = [dict(v, date=str(day)) for v, day in zip(validations, base + shift)]
+        output = agent.analyze_risks(run)
+    # Same size as one run, and top-N agrees with the unfiltered latest assessments
+    assert len(agent.index) == len(validations)
+    top = agent.query_risks(limit=20)["risk_assessments"]
+    best = sorted(output["risk_assessments"], key=lambda a: -a["risk_score"])[:20]
+    assert [a["risk_score"] for a in top] == [a["risk_score"] for a in best]
+    assert agent.query_risks()["matching"] == len(output["risk_assessments"])
+    # Entries carry copies of the few fields they need, not the scored batches
+    assert not hasattr(agent.index, "_batches")
+    assert all(set(inputs) < set(run[0]) for inputs in agent.index._inputs[:len(agent.index)])
+
+def test_risk_index_scale():
+    print("✓ Risk index: top-K queries over 1M indexed scores")
+    rng = np.random.default_rng(12)
+    n = 1000000
+    deviation, tier = rng.exponential(0.3, n), rng.integers(1, 4, n)
+    scores = score_risks(deviation, tier, rng.random(n) * 3)
+    suppliers, offsets = rng.integers(0, 20000, n), rng.integers(0, 1000, n)
+    supplier_ids = [f"S-{i:05d}" for i in suppliers.tolist()]
+    days = (np.datetime64("2024-01-01") + offsets).astype("datetime64[D]")
+    index = RiskIndex()
+    started = time.perf_counter()
+    index.add(scores, None, supplier_ids, days, tier)
+    built = time.perf_counter()
+    top = index.query(100)
+    critical = index.query(50, tier=3, level="CRITICAL")
+    above = index.query(20, min_score=60.0, distinct=True)
+    queried = time.perf_counter()
+    assert np.array_equal(index.score[top], np.sort(index.score[:len(index)])[::-1][:100])
+    assert (index.tier[critical] == 3).all() and (index.level[critical] == 2).all()
+    assert len(set(index.supplier[above].tolist())) == len(above) and (index.score[above] > 60).all()
+    # An incremental batch re-assessing 10,000 supplier-days
+    update = score_risks(rng.exponential(0.3, 10000), tier[:10000], np.zeros(10000))
+    update_started = time.perf_counter()
+    index.add(update, None, supplier_ids[:10000], days[:10000], tier[:10000])
+    updated = time.perf_counter()
+    print(f"  build {(built - started) * 1000:.0f} ms, 3 queries {(queried - built) * 1000:.1f} ms, "
+          f"update {(updated - update_started) * 1000:.0f} ms")
+    assert queried - built < 0.05
+    assert len(index) == len(np.unique(suppliers * 1000 + offsets))
+
+def test_risk_propagation():
+    print("✓ Risk propagation: matches a dense solve, incremental updates match a full re-propagation")
+    simulator = SupplierSimulator(seed=1)
+    graph = simulator.graph
+    propagator = RiskPropagator(graph)
+    risk = np.zeros(graph.n_suppliers)
+    risk[graph.catalog.code_of("T3-001")] = 80.0
+    propagated = propagator.propagate(risk)
+    # T3-001 -> T2-001 -> T1-001: each hop passes on half of the volume-weighted risk
+    t2, t1 = graph.catalog.code_of("T2-001"), graph.catalog.code_of("T1-001")
+    assert propagated[t2] > 0 and 0 < propagated[t1] < propagated[t2] < 80.0
+    assert propagated[graph.catalog.code_of("T3-002")] == 0
+
+    # Dense reference: p = (I - d W)^-1 r
+    dense = np.zeros((graph.n_suppliers, graph.n_suppliers))
+    np.add.at(dense, (graph.indices, propagator.sources), propagator.weight)
+    risk = np.random.default_rng(13).random(graph.n_suppliers) * 100
+    expected = np.linalg.solve(np.eye(graph.n_suppliers) - dense, risk)
+    assert np.allclose(propagator.propagate(risk), expected, atol=1e-5)
+
+    big = generate_supplier_graph(20000, seed=14)
+    incremental, full = RiskPropagator(big), RiskPropagator(big)
+    risk = np.random.default_rng(15).random(big.n_suppliers) * 100
+    incremental.propagate(risk)
+    for step in range(3):
+        codes = np.random.default_rng(step).choice(big.n_suppliers, 25, replace=False)
+        risk[codes] = np.random.default_rng(step + 10).random(25) * 100
+        moved = incremental.update(codes, risk[codes])
+        assert np.allclose(incremental.propagated, full.propagate(risk), atol=1e-4)
+        assert incremental.touched == len(moved) < big.n_suppliers // 10
+
+def test_risk_propagation_scale():
+    print("✓ Risk propagation: 1M-supplier graph")
+    graph = generate_supplier_graph(1000000, seed=16)
+    risk = np.random.default_rng(17).random(graph.n_suppliers) * 100
+    started = time.perf_counter()
+    propagator = RiskPropagator(graph)
+    propagator.propagate(risk)
+    solved = time.perf_counter()
+    codes = np.arange(graph.n_suppliers - 100, graph.n_suppliers)  # deepest-tier suppliers
+    propagator.update(codes, risk[codes] + 20)
+    updated = time.perf_counter()
+    print(f"  {graph.n_edges} edges: full {(solved - started) * 1000:.0f} ms "
+          f"({propagator.iterations} hops in the last update), "
+          f"100-node update {(updated - solved) * 1000:.1f} ms touching {propagator.touched} suppliers")
+    assert solved - started < 5.0 and updated - solved < 0.5
+
+def test_agent_propagation_is_incremental():
+    print("✓ Risk propagation: agent solves once per graph, then pushes changes")
+    simulator = SupplierSimulator(seed=18)
+    agent = RiskAnalysisAgent()
+    records = simulator.generate_inventory_data(days_back=30)
+    processed = SupplyMonitoringAgent().process_inventory_data(records)["processed_data"]
+    validations = ValidationAgent().validate_inventory(processed)["validations"]
+    first = agent.propagate_risk(simulator.graph, agent.analyze_risks(validations)["supplier_rollup"])
+    second = agent.propagate_risk(simulator.graph, agent.analyze_risks(validations)["supplier_rollup"])
+    assert first["mode"] == "full" and second["mode"] == "incremental"
+    reference = RiskPropagator(simulator.graph)
+    reference.propagate(agent.propagator.risk)
+    assert np.allclose(agent.propagator.propagated, reference.propagated, atol=1e-4)
+    for row in second["propagated_risks"]:
+        assert row["propagated_risk"] > agent.warning_threshold
+        assert np.isclose(row["propagated_risk"], row["node_risk"] + row["inherited_risk"], atol=0.02)
+
+def walk(links, start):
+    """Suppliers reachable from start by following links (reference BFS)"""
+    seen, stack = set(), [start]
+    while stack:
+        for nxt in links.get(stack.pop(), ()):
+            if nxt not in seen:
+                seen.add(nxt)
+                stack.append(nxt)
+    return seen
+
+def test_reachability_index():
+    print("✓ Reachability: closure matches graph walks, links and suppliers added incrementally")
+    graph = generate_supplier_graph(2000, seed=19)
+    index = ReachabilityIndex(graph)
+    ids = graph.catalog.ids
+    down, up = {}, {}
+    for source, target in zip(graph.edge_sources().tolist(), graph.indices.tolist()):
+        down.setdefault(ids[source], []).append(ids[target])
+        up.setdefault(ids[target], []).append(ids[source])
+
+    def check(sample):
+        for supplier_id in sample:
+            assert set(index.downstream_of(supplier_id)) == walk(down, supplier_id)
+            assert set(index.upstream_of(supplier_id)) == walk(up, supplier_id)
+
+    rng = np.random.default_rng(20)
+    check([ids[code] for code in rng.choice(graph.n_suppliers, 200, replace=False).tolist()])
+    a, b = ids[0], ids[1]
+    assert set(index.common_upstream([a, b])) == walk(up, a) & walk(up, b)
+    radius = index.blast_radius(ids[graph.n_suppliers - 1])
+    assert set(radius["tier1_affected"]) == {s for s in walk(down, ids[graph.n_suppliers - 1]) if s.startswith("T1-")}
+
+    # A new deep supplier feeding an existing tier-3 supplier, plus a new cross link
+    index.add_supplier("T4-001", 4)
+    for supplier_id, customer_id in (("T4-001", ids[graph.n_suppliers - 1]), (ids[graph.n_suppliers - 2], ids[5])):
+        index.add_link(supplier_id, customer_id)
+        down.setdefault(supplier_id, []).append(customer_id)
+        up.setdefault(customer_id, []).append(supplier_id)
+    check(["T4-001", ids[graph.n_suppliers - 2], ids[5]] + [ids[code] for code in rng.choice(graph.n_suppliers, 100).tolist()])
+    assert index.reaches("T4-001", radius["tier1_affected"][0]) and not index.reaches(ids[0], "T4-001")
+    for code in range(70):  # grows past the initial capacity
+        index.add_supplier(f"T5-{code:03d}", 5)
+        index.add_link(f"T5-{code:03d}", "T4-001")
+    assert "T5-069" in index.upstream_of(ids[graph.n_suppliers - 1]) and len(index) == graph.n_suppliers + 71
+    assert index.reaches("T5-069", radius["tier1_affected"][0])
+
+def test_reachability_queries_are_fast():
+    print("✓ Reachability: blast-radius and common-upstream queries in microseconds")
+    graph = generate_supplier_graph(10000, seed=21)
+    started = time.perf_counter()
+    index = ReachabilityIndex(graph)
+    built = time.perf_counter()
+    ids = [graph.catalog.ids[code] for code in range(graph.n_suppliers - 1000, graph.n_suppliers)]
+    for supplier_id in ids:
+        index.blast_radius(supplier_id)
+    blasted = time.perf_counter()
+    for supplier_id in ids:
+        index.common_upstream([supplier_id, "T1-001"])
+    common = time.perf_counter()
+    print(f"  build {(built - started) * 1000:.0f} ms ({index.nbytes / 1e6:.0f} MB), "
+          f"blast radius {(blasted - built) / len(ids) * 1e6:.0f} us, "
+          f"common upstream {(common - blasted) / len(ids) * 1e6:.0f} us per query")
+    assert (blasted - built) / len(ids) < 0.001 and (common - blasted) / len(ids) < 0.001
+
+def random_audits(rng, n, prefix="S", regions=3):
+    supplier_ids = [f"{prefix}{i}" for i in range(n)]
+    actions = np.where(rng.random(n) < 0.3, "IMMEDIATE_AUDIT", "INCREASE_MONITORING").tolist()
+    return (supplier_ids, actions, rng.uniform(40, 100, n).round(2), rng.integers(0, 50, n),
+            [f"R{i}" for i in rng.integers(0, regions, n)])
+
+def greedy_schedule(candidates, auditors, days, slots_per_auditor=4):
+    """Reference: all candidates sorted by action priority then value per slot, each on the earliest day with room"""
+    plans = {}
+    for supplier_id, (action, risk, reach, region) in sorted(
+            candidates.items(), key=lambda item: (ACTION_PRIORITY[item[1][0]], -audit_values(
+                [item[1][0]], [item[1][1]], [item[1][2]])[0] / AUDIT_SLOTS[item[1][0]])):
+        remaining = plans.setdefault(region, ([auditors[region] * slots_per_auditor] * days, []))
+        cost = AUDIT_SLOTS[action]
+        for day in range(days):
+            if remaining[0][day] >= cost:
+                remaining[0][day] -= cost
+                remaining[1].append((day, supplier_id))
+                break
+    return sorted((day, supplier_id) for _, planned in plans.values() for day, supplier_id in planned)
+
+def test_audit_planner_matches_greedy():
+    print("✓ Audit planner: heap plan matches a full greedy pass, also after incremental updates")
+    rng = np.random.default_rng(11)
+    auditors = {"R0": 1, "R1": 2, "R2": 3}
+    planner = AuditPlanner(auditors, days=5)
+    candidates = {}
+
+    def add(supplier_ids, actions, risk, downstream, regions):
+        planner.add(supplier_ids, actions, risk, downstream, regions)
+        for entry in zip(supplier_ids, actions, risk.tolist(), downstream.tolist(), regions):
+            candidates[entry[0]] = entry[1:]
+
+    def check():
+        schedule = planner.schedule()
+        assert sorted((int((np.datetime64(r["date"]) - np.datetime64(schedule[0]["date"])).astype(int)),
+                       r["supplier_id"]) for r in schedule) == greedy_schedule(candidates, auditors, 5)
+        for region, slots in planner.summary()["slots_per_day"].items():
+            used = {}
+            for r in schedule:
+                if r["region"] == region:
+                    used[r["date"]] = used.get(r["date"], 0) + r["auditor_slots"]
+            assert all(total <= slots for total in used.values())
+        ranked = [(r["date"], ACTION_PRIORITY[r["action"]], -r["value"] / r["auditor_slots"]) for r in schedule]
+        assert ranked == sorted(ranked)
+
+    add(*random_audits(rng, 2000))
+    check()
+    # New risks in one region re-plan only that region
+    add(*random_audits(rng, 20, prefix="N", regions=1))
+    assert planner.schedule() and planner.replanned == ["R0"]
+    check()
+    # Re-scored and removed suppliers
+    supplier_ids, actions, risk, downstream, regions = random_audits(rng, 500)
+    add(supplier_ids, actions, risk + 10, downstream, regions)
+    removed = [f"S{i}" for i in range(0, 2000, 3)]
+    planner.remove(removed)
+    for supplier_id in removed:
+        candidates.pop(supplier_id)
+    check()
+    assert planner.summary()["candidates"] == len(candidates)
+
+def test_audit_planner_priority():
+    print("✓ Audit planner: immediate audits are scheduled before any increased monitoring")
+    planner = AuditPlanner(default_auditors=1, days=2)
+    critical = ["P0-85", "P0-80", "P0-75"]
+    monitored = [f"P1-{i}" for i in range(8)]
+    planner.add(critical + monitored, ["IMMEDIATE_AUDIT"] * 3 + ["INCREASE_MONITORING"] * 8,
+                [85, 80, 75] + [45] * 8, [0] * 11)
+    schedule = planner.schedule(date(2024, 1, 15))
+    # One auditor-day each: the two riskiest audits take both days, monitoring waits
+    assert [r["supplier_id"] for r in schedule] == ["P0-85", "P0-80"]
+    assert [r["date"] for r in schedule] == ["2024-01-15", "2024-01-16"]
+    assert planner.summary()["unscheduled"] == 9
+
+    # Monitoring fills what the audits leave over
+    planner = AuditPlanner(default_auditors=2, days=2)
+    planner.add(critical + monitored, ["IMMEDIATE_AUDIT"] * 3 + ["INCREASE_MONITORING"] * 8,
+                [85, 80, 75] + [45] * 8, [0] * 11)
+    schedule = planner.schedule(date(2024, 1, 15))
+    assert {r["supplier_id"] for r in schedule if r["action"] == "IMMEDIATE_AUDIT"} == set(critical)
+    assert sum(r["action"] == "INCREASE_MONITORING" for r in schedule) == 4
+
+def test_audit_planner_scale():
+    print("✓ Audit planner: 100k candidates planned in under a second, re-planned incrementally")
+    rng = np.random.default_rng(12)
+    started = time.perf_counter()
+    planner = AuditPlanner({f"R{i}": 1 + i % 4 for i in range(20)}, days=14)
+    planner.add(*random_audits(rng, 100_000, regions=20))
+    schedule = planner.schedule()
+    planned = time.perf_counter()
+    planner.add(*random_audits(rng, 100, prefix="N", regions=1))
+    replanned_schedule = planner.schedule()
+    replanned = time.perf_counter()
+    print(f"  plan {(planned - started) * 1000:.0f} ms, re-plan one region {(replanned - planned) * 1000:.1f} ms")
+    assert len(schedule) == len(replanned_schedule) > 0 and planner.replanned == ["R0"]
+    assert planned - started < 1.0 and replanned - planned < 0.1
+
+if __name__ == "__main__":
+    test_issue_history_ring()
+    test_issue_history_persistence()
+    test_history_feeds_risk_scores()
+    test_bulk_history_lookup()
+    test_batch_scoring_matches_legacy()
+    test_batch_scoring_scale()
+    test_rolling_risk_windows()
+    test_supplier_rollup_alerts()
+    test_threshold_sweep_matches_rescoring()
+    test_threshold_sweep_scale()
+    test_risk_index_queries()
+    test_risk_index_latest_run()
+    test_risk_index_scale()
+    test_risk_propagation()
+    test_risk_propagation_scale()
+    test_agent_propagation_is_incremental()
+    test_reachability_index()
+    test_reachability_queries_are_fast()
+    test_audit_planner_matches_greedy()
+    test_audit_planner_priority()
+    test_audit_planner_scale()
+    print("\n✅ Risk tests passed")
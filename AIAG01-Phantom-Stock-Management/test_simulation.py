@@ -0,0 +1,238 @@
+"""
+Tests for the vectorized simulation engine
+Run directly or with pytest
+"""
+import sys
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.supply_monitoring_agent import SupplyMonitoringAgent
+from analytics.validation import validate_records
+from simulation.supplier_simulator import SupplierSimulator
+from simulation.columnar import (
+    INVENTORY_FIELDS,
+    SupplierCatalog,
+    generate_inventory_columns,
+    generate_shipment_columns,
+    iter_inventory_batches,
+    iter_shipment_batches,
+)
+from simulation.dataset_file import DatasetReplay, open_dataset, record_dataset, write_dataset
+from simulation.sharded import generate_inventory_sharded, generate_shipments_sharded, load_shard
+from simulation.supplier_graph import generate_supplier_graph, tier_sizes
+
+def make_catalog(n_suppliers):
+    return SupplierCatalog(
+        ids=[f"S-{i:05d}" for i in range(n_suppliers)],
+        names=[f"Supplier {i}" for i in range(n_suppliers)],
+        tiers=[1 + i % 3 for i in range(n_suppliers)],
+        capacity=[3000 + i % 7000 for i in range(n_suppliers)],
+        reliability=[0.8] * n_suppliers,
+    )
+
+def test_columnar_matches_legacy_records():
+    print("✓ Columnar engine: legacy record shape")
+    simulator = SupplierSimulator(seed=7)
+    records = simulator.generate_inventory_data(days_back=30)
+    assert len(records) == 8 * 30
+    assert tuple(records[0].keys()) == INVENTORY_FIELDS
+    assert records[0]["supplier_id"] == "T1-001"
+    assert records[30]["supplier_id"] == "T1-002"
+    assert all(r["reported_stock"] >= 0 and r["expected_stock"] >= 0 for r in records)
+
+    # Phantom suppliers over-report during the first 10 days only
+    for i, r in enumerate(records):
+        ratio = r["reported_stock"] / max(r["expected_stock"], 1)
+        day = i % 30
+        if r["has_phantom_stock"] and day < 10:
+            assert ratio > 1.25
+        else:
+            assert ratio < 1.1
+
+def test_columnar_is_seedable():
+    print("✓ Columnar engine: seeded generation is reproducible")
+    a = SupplierSimulator(seed=42).generate_inventory_data(days_back=5)
+    b = SupplierSimulator(seed=42).generate_inventory_data(days_back=5)
+    c = SupplierSimulator(seed=43).generate_inventory_data(days_back=5)
+    assert a == b
+    assert a != c
+
+def test_columnar_stress_generation():
+    print("✓ Columnar engine: 1M-row stress dataset")
+    catalog = make_catalog(10000)
+    started = time.perf_counter()
+    columns = generate_inventory_columns(catalog, days_back=100, seed=1)
+    elapsed = time.perf_counter() - started
+    print(f"  Generated {len(columns):,} rows in {elapsed * 1000:.0f} ms")
+    assert len(columns) == 1_000_000
+    assert columns.dates[0] > columns.dates[99]
+    assert (columns.reported_stock >= 0).all()
+    assert len(columns.slice(0, 10).to_records()) == 10
+
+def test_streaming_batches_match_full_generation():
+    print("✓ Streaming: batches are stable and independent of batch size")
+    catalog = make_catalog(3000)
+    full = generate_inventory_columns(catalog, days_back=60, seed=5)
+    for batch_size in (50000, 12345):
+        batches = list(iter_inventory_batches(catalog, days_back=60, batch_size=batch_size, seed=5))
+        assert all(len(b) == batch_size for b in batches[:-1])
+        assert sum(len(b) for b in batches) == len(full)
+        assert np.array_equal(np.concatenate([b.reported_stock for b in batches]), full.reported_stock)
+        assert np.array_equal(np.concatenate([b.supplier_code for b in batches]), full.supplier_code)
+
+    shipments = generate_shipment_columns(catalog, seed=5)
+    streamed = list(iter_shipment_batches(catalog, batch_size=1000, seed=5))
+    assert np.array_equal(np.concatenate([b.quantity for b in streamed]), shipments.quantity)
+    assert streamed[0].to_records()[0]["shipment_id"] == "SH-S-00000-000"
+
+    # An empty catalog generates empty column sets; a batch size must be positive
+    empty = make_catalog(0)
+    assert len(generate_inventory_columns(empty)) == 0 and generate_shipment_columns(empty).to_records() == []
+    assert list(iter_inventory_batches(empty, batch_size=10)) == []
+    try:
+        iter_inventory_batches(catalog, batch_size=0)
+        assert False, "batch_size 0 accepted"
+    except ValueError:
+        pass
+    assert all(getattr(full, name).dtype == full.DTYPES[name] for name in full.ARRAYS)
+    assert all(getattr(shipments, name).dtype == shipments.DTYPES[name] for name in shipments.ARRAYS)
+
+def test_streaming_memory_is_bounded():
+    print("✓ Streaming: peak memory stays flat as the dataset grows")
+    peaks = []
+    for n_suppliers in (1000, 10000):
+        catalog = make_catalog(n_suppliers)
+        tracemalloc.start()
+        rows = 0
+        for batch in iter_inventory_batches(catalog, days_back=365, batch_size=50000, seed=3):
+            rows += len(batch)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        print(f"  {rows:,} rows streamed, peak {peaks[-1] / 1e6:.1f} MB")
+    assert peaks[1] < peaks[0] * 1.5
+
+def test_supplier_graph_from_builtin_catalog():
+    print("✓ Supplier graph: built-in supplies_to links")
+    simulator = SupplierSimulator()
+    graph = simulator.graph
+    assert graph.n_suppliers == 8 and graph.n_edges == 6
+    t3 = graph.catalog.code_of("T3-001")
+    t2 = graph.catalog.code_of("T2-001")
+    assert graph.downstream(t3).tolist() == [t2]
+    assert sorted(graph.upstream(graph.catalog.code_of("T1-001")).tolist()) == [
+        graph.catalog.code_of("T2-001"), graph.catalog.code_of("T2-003")
+    ]
+
+def test_generated_supplier_graph():
+    print("✓ Supplier graph: synthetic multi-tier topology")
+    graph = generate_supplier_graph(50000, tier_depth=4, fan_out_mean=2.0, seed=11)
+    tiers = graph.catalog.tiers
+    assert graph.n_suppliers == 50000
+    assert [int((tiers == t).sum()) for t in (1, 2, 3, 4)] == sorted(int((tiers == t).sum()) for t in (1, 2, 3, 4))
+    sources = graph.edge_sources()
+    assert (tiers[sources] == tiers[graph.indices] + 1).all()
+    assert (graph.out_degree()[tiers > 1] >= 1).all()
+    assert graph.out_degree().max() > 1  # many-to-many links
+    assert np.allclose(np.bincount(sources, weights=graph.share, minlength=graph.n_suppliers)[tiers > 1], 1.0, atol=1e-5)
+    assert graph.nbytes < 50000 * 40
+    assert graph.catalog.code_of(graph.catalog.ids[42000]) == 42000
+
+    # Tiny catalogs keep one supplier per tier; fewer suppliers than tiers is an error
+    assert tier_sizes(3, 3, 2.0).tolist() == [1, 1, 1]
+    assert tier_sizes(5, 4, 0.01).tolist() == [2, 1, 1, 1]
+    assert all(tier_sizes(n, 5, growth).sum() == n and tier_sizes(n, 5, growth).min() >= 1
+               for n in range(5, 40) for growth in (0.1, 1.0, 3.0))
+    try:
+        tier_sizes(1, 3, 2.0)
+        assert False, "more tiers than suppliers accepted"
+    except ValueError:
+        pass
+
+    same = generate_supplier_graph(50000, tier_depth=4, fan_out_mean=2.0, seed=11)
+    assert np.array_equal(same.indices, graph.indices)
+
+    simulator = SupplierSimulator(seed=1, graph=graph)
+    batch = next(simulator.iter_inventory_batches(days_back=30, batch_size=1000))
+    assert batch.to_records()[0]["supplier_id"] == "T1-001"
+    assert len(simulator.suppliers["tier4"]) == int((tiers == 4).sum())
+
+def test_sharded_generation_is_worker_independent():
+    print("✓ Sharded generation: identical output for any worker count")
+    catalog = make_catalog(20000)
+    reference = generate_inventory_columns(catalog, days_back=30, seed=99)
+    for workers in (1, 3):
+        started = time.perf_counter()
+        sharded = generate_inventory_sharded(catalog, days_back=30, seed=99, workers=workers)
+        print(f"  {workers} worker(s): {len(sharded):,} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+        for name in sharded.ARRAYS:
+            assert np.array_equal(getattr(sharded, name), getattr(reference, name))
+
+    # No supplier blocks, no shards: an empty result rather than a failed merge
+    assert len(generate_inventory_sharded(make_catalog(0), workers=1)) == 0
+    assert len(generate_shipments_sharded(make_catalog(0), workers=2)) == 0
+
+    shipments = generate_shipments_sharded(catalog, seed=4, workers=1)
+    assert np.array_equal(generate_shipments_sharded(catalog, seed=4, workers=2).quantity, shipments.quantity)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        manifest = generate_inventory_sharded(catalog, days_back=30, seed=99, workers=2, output_dir=output_dir)
+        assert sum(shard["rows"] for shard in manifest) == len(reference)
+        first = load_shard(manifest[0]["path"], catalog)
+        assert np.array_equal(first.reported_stock, reference.reported_stock[:len(first)])
+        assert first.base_date == reference.base_date
+
+def test_dataset_file_round_trip():
+    print("✓ Dataset files: record, memory-map and replay")
+    graph = generate_supplier_graph(20000, seed=2)
+    columns = generate_inventory_columns(graph.catalog, days_back=50, seed=8)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stress.inventory.psds")
+        size = write_dataset(path, columns)
+        started = time.perf_counter()
+        replayed = open_dataset(path)
+        print(f"  Opened {len(replayed):,} rows ({size / 1e6:.0f} MB) in {(time.perf_counter() - started) * 1000:.1f} ms")
+        assert isinstance(replayed.reported_stock, np.memmap)
+        for name in columns.ARRAYS:
+            assert np.array_equal(getattr(replayed, name), getattr(columns, name))
+        assert replayed.slice(0, 5).to_records() == columns.slice(0, 5).to_records()
+        assert replayed.catalog.code_of("T3-100") == graph.catalog.code_of("T3-100")
+
+        # The mapped columns feed monitoring and validation without building record dicts
+        started = time.perf_counter()
+        monitored = SupplyMonitoringAgent().process_inventory_data(columns=replayed)
+        validation = validate_records(monitored["processed_data"])
+        print(f"  Monitored and validated the replay in {(time.perf_counter() - started) * 1000:.0f} ms")
+        assert monitored["processed_data"]._materialized is None and len(validation) == len(replayed)
+        assert monitored["anomaly_count"] == SupplyMonitoringAgent().process_inventory_data(columns=columns)["anomaly_count"]
+
+        simulator = SupplierSimulator(seed=3)
+        inventory = simulator.generate_inventory_columns(days_back=30)
+        shipments = simulator.generate_shipment_columns()
+        record_dataset("baseline", inventory, shipments, directory=directory)
+        first = DatasetReplay("baseline", directory=directory)
+        second = DatasetReplay("baseline", directory=directory)
+        assert first.inventory_data() == second.inventory_data() == inventory.to_records()
+        assert first.shipment_data() == shipments.to_records()
+
+        for bad_name in ("../escape", "a/b", ""):
+            try:
+                DatasetReplay(bad_name, directory=directory)
+                assert False, "invalid dataset name accepted"
+            except ValueError:
+                pass
+
+if __name__ == "__main__":
+    test_columnar_matches_legacy_records()
+    test_columnar_is_seedable()
+    test_columnar_stress_generation()
+    test_streaming_batches_match_full_generation()
+    test_streaming_memory_is_bounded()
+    test_supplier_graph_from_builtin_catalog()
+    test_generated_supplier_graph()
+    test_sharded_generation_is_worker_independent()
+    test_dataset_file_round_trip()
+    print("\n✅ Simulation tests passed")
@@ -0,0 +1,324 @@
+"""
+Tests for the Validation Agent batch kernel
+Run directly or with pytest
+"""
+import sys
+import os
+import tempfile
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from simulation.supplier_simulator import SupplierSimulator
+from simulation.columnar import SupplierCatalog, generate_inventory_columns
+from agents.supply_monitoring_agent import SupplyMonitoringAgent
+from agents.validation_agent import ValidationAgent
+from analytics.forecast import SupplierForecaster, day_numbers
+from analytics.quality import check_inventory_columns
+from analytics.reconciliation import SupplierFlows, reconcile, topological_levels
+from analytics.validation import validate_columns
+from simulation.supplier_graph import SupplierGraph, generate_supplier_graph, simulate_receipts
+
+def make_catalog(n_suppliers):
+    return SupplierCatalog(
+        ids=[f"S-{i:05d}" for i in range(n_suppliers)],
+        names=[f"Supplier {i}" for i in range(n_suppliers)],
+        tiers=[1 + i % 3 for i in range(n_suppliers)],
+        capacity=[3000 + i % 7000 for i in range(n_suppliers)],
+        reliability=[0.8] * n_suppliers,
+    )
+
+def legacy_validate(processed_data, threshold=0.20):
+    """The original per-record validation loop, kept as the reference"""
+    validations = []
+    for record in processed_data:
+        if record.get("data_quality") == "poor":
+            continue
+        reported = record["reported_stock"]
+        expected = record.get("expected_stock", 0)
+        deviation = abs(reported - expected) / expected if expected > 0 else 0
+        validations.append({
+            "supplier_id": record["supplier_id"],
+            "supplier_name": record["supplier_name"],
+            "tier": record["tier"],
+            "date": record.get("date"),
+            "reported_stock": reported,
+            "expected_stock": expected,
+            "deviation": round(deviation, 3),
+            "deviation_percentage": round(deviation * 100, 2),
+            "flag": "high_deviation" if deviation > threshold else "normal",
+            "escalate": deviation > threshold
+        })
+    return validations
+
+def test_matches_legacy_validation():
+    print("✓ Validation: batch kernel matches the per-record loop")
+    records = SupplierSimulator(seed=5).generate_inventory_data(days_back=30)
+    records[0]["expected_stock"] = 0
+    records[1]["reported_stock"] = -3
+    processed = SupplyMonitoringAgent().process_inventory_data(records)["processed_data"]
+
+    output = ValidationAgent().validate_inventory(processed)
+    expected = legacy_validate(processed)
+    assert output["validations"] == expected
+    assert output["high_deviations"] == [v for v in expected if v["escalate"]]
+    assert output["total_validated"] == len(records) - 1
+    assert output["validations"][0]["deviation"] == 0 and output["validations"][0]["flag"] == "normal"
+
+def test_batch_validation():
+    print("✓ Validation: 1M records validated as arrays")
+    columns = generate_inventory_columns(make_catalog(20000), days_back=50, seed=9)
+    quality = check_inventory_columns(columns)
+    agent = ValidationAgent()
+
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        result = validate_columns(columns, quality)
+        timings.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    output = agent.validate_batch(columns, quality)
+    agent_ms = (time.perf_counter() - started) * 1000
+    print(f"  1M records: kernel {min(timings) * 1000:.0f} ms, "
+          f"agent with {output['high_deviation_count']} escalated dicts {agent_ms:.0f} ms")
+    assert min(timings) < 0.1
+
+    # Dicts only for escalated records, and they agree with the per-record loop
+    assert len(output["high_deviations"]) == result.high_count == output["high_deviation_count"]
+    sample = columns.slice(0, 3000)
+    legacy = [v for v in legacy_validate(sample.to_records()) if v["escalate"]]
+    assert output["high_deviations"][:len(legacy)] == legacy
+    assert np.array_equal(result.rows[result.high_indices][:len(legacy)],
+                          np.flatnonzero(result.deviation[:3000] > 0.2))
+
+def seasonal_series(days):
+    """Linear trend plus a weekly pattern"""
+    weekly = np.array([40.0, -10.0, -20.0, 0.0, 15.0, 5.0, -30.0])
+    weekly -= weekly.mean()
+    return 1000.0 + 3.0 * days + weekly[days % 7]
+
+def test_holt_forecaster():
+    print("✓ Forecast: Holt models track trend and weekly season, idempotent re-ingest")
+    forecaster = SupplierForecaster(alpha=0.3, beta=0.1, gamma=0.3)
+    codes = forecaster.supplier_codes(["S-A", "S-B"])
+    days = np.arange(20000, 20000 + 120)
+    for day in days:
+        forecaster.update(codes, np.array([day, day]), np.array([seasonal_series(day), 500.0]))
+
+    future = np.arange(days[-1] + 1, days[-1] + 15)
+    predicted = forecaster.forecast(np.full(len(future), codes[0]), future)
+    assert np.abs(predicted - seasonal_series(future)).max() < 5
+    assert abs(forecaster.forecast(codes[1:], future[:1])[0] - 500.0) < 1e-6
+    assert np.isnan(forecaster.forecast(np.array([-1]), future[:1])[0])
+
+    # Days before the fitted window are not back-extrapolated along the trend
+    past = days[:7] - 365
+    level = forecaster.level[codes[0]] + forecaster.season[codes[0], past % 7]
+    assert np.allclose(forecaster.forecast(np.full(7, codes[0]), past), level)
+
+    # Replaying days already seen leaves the state untouched
+    level, season = forecaster.level.copy(), forecaster.season.copy()
+    forecaster.update(np.repeat(codes[:1], 30), days[-30:], np.zeros(30))
+    assert np.array_equal(forecaster.level, level) and np.array_equal(forecaster.season, season)
+    assert forecaster.observations[codes[0]] == len(days)
+
+def test_forecaster_checkpoint():
+    print("✓ Forecast: checkpoint round trip and agent predictions")
+    records = SupplierSimulator(seed=3).generate_inventory_data(days_back=30)
+    agent = ValidationAgent()
+    assert agent.predict_expected_inventory(records[0])["model"] == "baseline"
+    # Records with malformed or missing dates are skipped instead of failing the update
+    broken = [dict(records[0], date="10/01/2026"), dict(records[1], date=None), dict(records[2], date="2024-13-45")]
+    suppliers = agent.update_forecasts(records + broken)
+    assert suppliers == len({record["supplier_id"] for record in records})
+    assert agent.forecaster.observations[:suppliers].sum() == len(records)
+    assert agent.predict_expected_inventory(broken[0])["model"] == "baseline"
+    prediction = agent.predict_expected_inventory(records[0])
+    assert prediction["model"] == "holt_weekly" and prediction["predicted_stock"] >= 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state", "forecaster.npz")
+        agent.forecaster.save(path)
+        restored = SupplierForecaster.load(path)
+    codes = restored.supplier_codes([record["supplier_id"] for record in records], register=False)
+    target = day_numbers([record["date"] for record in records]) + 7
+    assert restored.supplier_ids == agent.forecaster.supplier_ids
+    assert np.array_equal(restored.forecast(codes, target), agent.forecaster.forecast(codes, target))
+
+def test_batch_forecast_update():
+    print("✓ Forecast: 1M supplier-days folded in incrementally")
+    columns = generate_inventory_columns(make_catalog(20000), days_back=50, seed=4)
+    forecaster = SupplierForecaster()
+    started = time.perf_counter()
+    forecaster.update_columns(columns)
+    elapsed = time.perf_counter() - started
+    print(f"  1M supplier-days: {elapsed * 1000:.0f} ms for {len(forecaster)} suppliers")
+    assert len(forecaster) == 20000 and forecaster.observations[:len(forecaster)].sum() == len(columns)
+
+    # A second pass over the same days is a no-op
+    level = forecaster.level.copy()
+    forecaster.update_columns(columns)
+    assert np.array_equal(forecaster.level, level)
+
+def brute_force_inherited(graph, shipped, received):
+    """Upstream shortfall by recursion over the supplier lists, as a reference"""
+    sources = graph.edge_sources()
+    memo = {}
+    def inherited(code):
+        if code not in memo:
+            memo[code] = 0.0
+            for edge in np.flatnonzero(graph.indices == code).tolist():
+                supplier = int(sources[edge])
+                memo[code] += max(shipped[edge] - received[edge], 0) + inherited(supplier) * float(graph.share[edge])
+        return memo[code]
+    return np.array([inherited(code) for code in range(graph.n_suppliers)])
+
+def test_mass_balance_reconciliation():
+    print("✓ Reconciliation: phantom stock at tier 3 shows up downstream")
+    simulator = SupplierSimulator(seed=12)
+    inventory = simulator.generate_inventory_columns(days_back=30)
+    shipments = simulator.generate_shipment_columns()
+    flows = SupplierFlows.from_columns(inventory, shipments)
+    phantom = np.zeros(simulator.graph.n_suppliers, dtype=bool)
+    phantom[simulator.catalog.code_of("T3-002")] = True
+    received = simulator.generate_receipts(flows.outbound, phantom)
+
+    agent = ValidationAgent()
+    output = agent.reconcile_network(simulator.graph, flows, received)
+    assert [m["supplier_id"] for m in output["mismatches"]] == ["T3-002"]
+    result = output["result"]
+    t2, t1 = simulator.catalog.code_of("T2-002"), simulator.catalog.code_of("T1-002")
+    assert result.inherited_shortfall[t2] > 0.25 * flows.outbound[simulator.catalog.code_of("T3-002")]
+    assert result.inherited_shortfall[t1] >= result.inherited_shortfall[t2]
+    assert result.inherited_shortfall[simulator.catalog.code_of("T1-001")] < 0.05 * flows.outbound.sum()
+
+    # Same totals from the legacy record dicts
+    from_records = SupplierFlows.from_records(simulator.catalog, inventory.to_records(), shipments.to_records())
+    assert np.array_equal(from_records.reported_stock, flows.reported_stock)
+    assert np.array_equal(from_records.outbound, flows.outbound)
+    # Columns recorded against another catalog are mapped by supplier id
+    other = generate_inventory_columns(generate_supplier_graph(20, tier_depth=3, seed=1).catalog, days_back=5, seed=1)
+    remapped = SupplierFlows.from_columns(other, None, simulator.catalog)
+    own = SupplierFlows.from_columns(other)
+    assert len(remapped.reported_stock) == len(simulator.catalog) and not remapped.outbound.any()
+    for code, supplier_id in enumerate(simulator.catalog.ids):
+        assert remapped.reported_stock[code] == own.reported_stock[other.catalog.code_of(supplier_id)]
+
+    # An undated or malformed record neither corrupts the offsets nor becomes a supplier's latest stock
+    records = inventory.to_records()
+    extra = [dict(records[0], date=None, reported_stock=10 ** 9), dict(records[1], date="15/01/2024", reported_stock=-1)]
+    undated = SupplierFlows.from_records(simulator.catalog, records + extra, shipments.to_records())
+    assert np.array_equal(undated.reported_stock, flows.reported_stock)
+
+    cyclic = SupplierGraph.from_edges(simulator.catalog, np.array([0, 2]), np.array([2, 0]))
+    try:
+        topological_levels(cyclic)
+        assert False, "cycle not detected"
+    except ValueError:
+        pass
+
+def test_reconciliation_scale():
+    print("✓ Reconciliation: matches recursion on a many-to-many graph, scales to 1M suppliers")
+    rng = np.random.default_rng(6)
+    graph = generate_supplier_graph(3000, tier_depth=4, seed=6)
+    flows = SupplierFlows(rng.integers(0, 2000, 3000).astype(float), rng.integers(5000, 20000, 3000).astype(float),
+                          rng.random(3000) < 0.1)
+    received = simulate_receipts(graph, flows.outbound, flows.phantom, seed=7)
+    result = reconcile(graph, flows, received)
+    levels = topological_levels(graph)
+    depth = np.empty(graph.n_suppliers, dtype=int)
+    for index, level in enumerate(levels):
+        depth[level] = index
+    assert np.all(depth[graph.edge_sources()] < depth[graph.indices])
+    assert np.allclose(result.inherited_shortfall, brute_force_inherited(graph, result.shipped, received))
+    assert set(result.flagged_indices.tolist()) <= set(np.flatnonzero(flows.phantom).tolist())
+
+    graph = generate_supplier_graph(1000000, tier_depth=4, seed=8)
+    n = graph.n_suppliers
+    flows = SupplierFlows(rng.integers(0, 2000, n).astype(float), rng.integers(5000, 20000, n).astype(float),
+                          rng.random(n) < 0.05)
+    received = simulate_receipts(graph, flows.outbound, flows.phantom, seed=9)
+    started = time.perf_counter()
+    result = reconcile(graph, flows, received)
+    elapsed = time.perf_counter() - started
+    print(f"  {n} suppliers, {graph.n_edges} links: {elapsed * 1000:.0f} ms, {result.flagged_count} mismatches")
+    assert elapsed < 2.0
+
+def test_batch_predictions():
+    print("✓ Prediction: batch API matches per-record predictions, memoized until ingest")
+    simulator = SupplierSimulator(seed=21)
+    records = simulator.generate_inventory_data(days_back=14)
+    agent = ValidationAgent()
+    # Malformed or missing dates are skipped, not fatal
+    agent.ingest_inventory(records + [dict(records[0], date="10/01/2026"), dict(records[1], date=None)])
+    baseline = agent.predict_batch()["predictions"]
+    assert len(baseline) == len(records)
+    assert all(p["model"] == "baseline" for p in baseline)
+    assert sorted(p["predicted_stock"] for p in baseline) == sorted(r["expected_stock"] for r in records)
+    # Columnar ingest and forecast updates index the same batch as the records
+    columnar = ValidationAgent()
+    columnar.ingest_inventory(columns=SupplierSimulator(seed=21).generate_inventory_columns(days_back=14))
+    assert columnar.predict_batch()["predictions"] == baseline
+    assert columnar.predictor.fingerprint == agent.predictor.fingerprint
+    agent.update_forecasts(records[::2])
+
+    misses = agent.predictor.misses
+    output = agent.predict_batch()
+    assert output["total"] == len(records)
+    by_key = {(p["supplier_id"], p["date"]): p for p in output["predictions"]}
+    for record in records:
+        expected = agent.predict_expected_inventory(record)
+        prediction = by_key[(record["supplier_id"], record["date"])]
+        assert {key: prediction[key] for key in expected} == expected
+
+    # Second read is served from the memo
+    assert agent.predict_batch()["predictions"] == output["predictions"]
+    cache = agent.predictor.cache_info()
+    assert cache["hits"] == len(records) and cache["misses"] == misses + len(records)
+
+    # A subset and a range past the data: forecasts only, for suppliers with history
+    last = max(record["date"] for record in records)
+    future = str(np.datetime64(last) + 3)
+    subset = agent.predict_batch(["T1-001", "T9-999"], last, future)["predictions"]
+    assert [p["date"] for p in subset] == [str(np.datetime64(last) + i) for i in range(4)]
+    assert all(p["supplier_id"] == "T1-001" and p["model"] == "holt_weekly" for p in subset)
+    # Dates past the data are marked forecast-only instead of reporting zero rates
+    assert "production_rate" in subset[0] and "forecast_only" not in subset[0]
+    assert all(p["forecast_only"] and "production_rate" not in p for p in subset[1:])
+
+    # Ranges are capped before anything is expanded
+    try:
+        agent.predict_batch(None, "2000-01-01", "2999-12-31")
+        assert False, "unbounded range accepted"
+    except ValueError:
+        pass
+
+    # Refitting the same days with new values changes the fingerprint, not just new days
+    fingerprint = agent.predictor.fingerprint
+    agent.forecaster.level[:len(agent.forecaster)] += 100
+    agent.predictor.refresh()
+    assert agent.predictor.fingerprint != fingerprint
+
+    # New inventory changes the fingerprint and empties the memo
+    fingerprint = agent.predictor.fingerprint
+    agent.ingest_inventory(simulator.generate_inventory_data(days_back=14))
+    assert agent.predictor.fingerprint != fingerprint and agent.predictor.cache_info()["size"] == 0
+
+    started = time.perf_counter()
+    agent.predict_batch()
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    agent.predict_batch()
+    warm = time.perf_counter() - started
+    print(f"  {len(records)} predictions: cold {cold * 1000:.2f} ms, memoized {warm * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    test_matches_legacy_validation()
+    test_batch_validation()
+    test_holt_forecaster()
+    test_forecaster_checkpoint()
+    test_batch_forecast_update()
+    test_mass_balance_reconciliation()
+    test_reconciliation_scale()
+    test_batch_predictions()
+    print("\n✅ Validation tests passed")